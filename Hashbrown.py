@@ -1,26 +1,96 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import os
 import sys
-import re
-import tempfile
-try:
-    # Try newer moviepy import structure (v2.x)
-    from moviepy import VideoFileClip, CompositeVideoClip, ImageClip, AudioClip
-except ImportError:
-    # Fall back to older import structure (v1.x)
-    from moviepy.editor import VideoFileClip, CompositeVideoClip, ImageClip
-    from moviepy.audio.AudioClip import AudioClip
-import numpy as np
-import subprocess
-from PIL import Image
+import queue
+import threading
+import multiprocessing
+from hashbrown_engine import (
+    JobControl,
+    RedactionCancelled,
+    RedactionError,
+    default_mute_icon_path,
+    default_output_path,
+    find_ffmpeg,
+    format_time,
+    load_env_settings,
+    probe_media,
+    redact_video,
+    validate_segments,
+)
+from hashbrown_probe import ProbeError
+from hashbrown_profiles import DEFAULT_PROFILE, PROFILES
+from hashbrown_queue import BatchScheduler, JobQueue
+from hashbrown_regions import validate_regions
+from hashbrown_segments import merge_segments
+from hashbrown_speech import SpeechError, parse_keywords, propose_segments
+from hashbrown_timeline import TimelineError, load_peaks, load_thumbnails
+from hashbrown_trace import TRACE_ENABLED, format_trace, job_trace, span
+
+
+# How often the Tk thread picks up progress from the worker thread
+PROGRESS_POLL_MS = 200
+
+# Processing modes offered in the GUI, keyed by the mode name redact_video takes
+MODE_LABELS = {
+    'full': "Full re-encode",
+    'smart': "Smart render (re-encode only the redacted GOPs)",
+    'audio': "Audio only (mute speech, copy video untouched)",
+    'chunked': "Parallel chunked encode (all CPU cores)",
+}
+
+# Output codecs offered in the GUI, keyed by the codec name redact_video takes
+CODEC_LABELS = {
+    'h264': "H.264 (plays everywhere)",
+    'hevc': "HEVC / H.265 (smaller files)",
+    'av1': "AV1 (smallest files, slowest)",
+}
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv')
+
+# Videos encoding at once; the scheduler still caps them by cores and NVENC sessions
+PARALLEL_JOBS = 2
+
+# Timeline layout (pixels): time ruler, thumbnail row, waveform
+TIMELINE_RULER_HEIGHT = 18
+TIMELINE_THUMB_HEIGHT = 54
+TIMELINE_WAVE_HEIGHT = 70
+# Zoom per mouse wheel notch, and the closest zoom (seconds across the whole timeline)
+TIMELINE_ZOOM_STEP = 1.25
+TIMELINE_MIN_SPAN = 1.0
+# Segment time edits within this long of each other share one timeline overlay redraw
+TIMELINE_REDRAW_MS = 150
+# Ruler tick spacings to choose from, in seconds
+TIMELINE_TICKS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Region redaction choices in each segment row, keyed by the style redact_video takes
+REGION_LABELS = {
+    None: "None",
+    'blur': "Blur",
+    'pixelate': "Pixelate",
+    'box': "Black box",
+}
+
+# How each queue status reads in the Videos list
+STATUS_LABELS = {
+    'pending': "waiting",
+    'probing': "reading",
+    'queued': "ready",
+    'running': "processing",
+    'done': "done",
+    'failed': "failed",
+    'cancelled': "cancelled",
+}
 
 
 class TimeInputField(ttk.Frame):
-    """Custom time input field with HH:MM:SS format and auto-navigation"""
+    """Custom time input field with HH:MM:SS.mmm format and auto-navigation"""
+    
+    # Digits per field: hours, minutes, seconds, milliseconds
+    FIELD_DIGITS = (2, 2, 2, 3)
     
-    def __init__(self, parent, **kwargs):
+    def __init__(self, parent, on_change=None, **kwargs):
         super().__init__(parent, **kwargs)
         
         self.entries = []
@@ -48,6 +118,19 @@ class TimeInputField(ttk.Frame):
         self.sec_entry.pack(side=tk.LEFT)
         self.entries.append(self.sec_entry)
         
+        ttk.Label(self, text=".").pack(side=tk.LEFT)
+        
+        # Millisecond field (optional, read as a decimal fraction)
+        self.ms_var = tk.StringVar()
+        self.ms_entry = ttk.Entry(self, textvariable=self.ms_var, width=4, justify='center')
+        self.ms_entry.pack(side=tk.LEFT)
+        self.entries.append(self.ms_entry)
+        
+        # Tell the owner when the value changes, whether typed or set
+        if on_change:
+            for var in (self.hour_var, self.min_var, self.sec_var, self.ms_var):
+                var.trace_add('write', lambda *_: on_change())
+        
         # Bind events for auto-navigation
         self._setup_bindings()
     
@@ -72,9 +155,9 @@ class TimeInputField(ttk.Frame):
         entry = self.entries[index]
         current_value = entry.get()
         
-        # Limit to 2 digits
-        if len(current_value) >= 2:
-            # If we already have 2 digits, move to next field and prevent this digit
+        # Limit to the field's digit count
+        if len(current_value) >= self.FIELD_DIGITS[index]:
+            # If the field is full, move to next field and prevent this digit
             if index < len(self.entries) - 1:
                 self.entries[index + 1].focus()
                 self.entries[index + 1].icursor(0)
@@ -92,14 +175,14 @@ class TimeInputField(ttk.Frame):
         entry = self.entries[index]
         current_value = entry.get()
         
-        # If we just filled this field with 2 digits, move to next
-        if len(current_value) == 2:
+        # If we just filled this field, move to next
+        if len(current_value) == self.FIELD_DIGITS[index]:
             if index < len(self.entries) - 1:
                 # Move to next field within this TimeInputField
                 self.entries[index + 1].focus()
                 self.entries[index + 1].icursor(0)
             elif self.next_external_field:
-                # Move to external field (e.g., from Start SS to End HH)
+                # Move to external field (e.g., from Start mmm to End HH)
                 self.next_external_field.focus()
                 self.next_external_field.icursor(0)
     
@@ -122,52 +205,77 @@ class TimeInputField(ttk.Frame):
             hours = int(self.hour_var.get() or 0)
             minutes = int(self.min_var.get() or 0)
             seconds = int(self.sec_var.get() or 0)
-            return hours * 3600 + minutes * 60 + seconds
+            # ".5" means half a second, like in any decimal time
+            fraction = float('0.' + self.ms_var.get()) if self.ms_var.get() else 0.0
+            return round(hours * 3600 + minutes * 60 + seconds + fraction, 3)
         except ValueError:
             return None
     
     def get_formatted_value(self):
-        """Get the time value formatted as HH:MM:SS"""
+        """Get the time value formatted as HH:MM:SS.mmm"""
         hours = self.hour_var.get().zfill(2)
         minutes = self.min_var.get().zfill(2)
         seconds = self.sec_var.get().zfill(2)
-        return f"{hours}:{minutes}:{seconds}"
+        millis = self.ms_var.get().ljust(3, '0')
+        return f"{hours}:{minutes}:{seconds}.{millis}"
     
-    def set_value(self, hours=0, minutes=0, seconds=0):
+    def set_value(self, hours=0, minutes=0, seconds=0, milliseconds=0):
         """Set the time value"""
         self.hour_var.set(str(hours).zfill(2))
         self.min_var.set(str(minutes).zfill(2))
         self.sec_var.set(str(seconds).zfill(2))
+        self.ms_var.set(str(milliseconds).zfill(3))
+    
+    def set_seconds(self, seconds):
+        """Set the time value from a number of seconds"""
+        millis = int(round(seconds * 1000))
+        self.set_value(millis // 3600000, millis // 60000 % 60, millis // 1000 % 60, millis % 1000)
 
 
 class SegmentRow(ttk.Frame):
-    """A single segment row with start/end times and delete button"""
+    """A single segment row with start/end times, an optional region to blur and a delete button"""
     
-    def __init__(self, parent, segment_num, on_delete, **kwargs):
+    def __init__(self, parent, segment_num, on_delete, on_change=None, **kwargs):
         super().__init__(parent, **kwargs)
         
         self.segment_num = segment_num
         self.on_delete = on_delete
+        times_row = ttk.Frame(self)
+        times_row.pack(fill=tk.X)
         
         # Segment label
-        ttk.Label(self, text=f"Segment {segment_num}:").pack(side=tk.LEFT, padx=5)
+        self.label = ttk.Label(times_row, text=f"Segment {segment_num}:")
+        self.label.pack(side=tk.LEFT, padx=5)
         
         # Start time
-        ttk.Label(self, text="Start:").pack(side=tk.LEFT, padx=5)
-        self.start_time = TimeInputField(self)
+        ttk.Label(times_row, text="Start:").pack(side=tk.LEFT, padx=5)
+        self.start_time = TimeInputField(times_row, on_change=on_change)
         self.start_time.pack(side=tk.LEFT, padx=5)
         
         # End time
-        ttk.Label(self, text="End:").pack(side=tk.LEFT, padx=5)
-        self.end_time = TimeInputField(self)
+        ttk.Label(times_row, text="End:").pack(side=tk.LEFT, padx=5)
+        self.end_time = TimeInputField(times_row, on_change=on_change)
         self.end_time.pack(side=tk.LEFT, padx=5)
         
         # Link the start and end time fields for navigation
         self.start_time.set_next_field(self.end_time.entries[0])
         
         # Delete button
-        self.delete_btn = ttk.Button(self, text="✕", width=3, command=self._on_delete_click)
+        self.delete_btn = ttk.Button(times_row, text="✕", width=3, command=self._on_delete_click)
         self.delete_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Rectangle (in pixels of the video) blurred during the segment, in the same encode
+        region_row = ttk.Frame(self)
+        region_row.pack(fill=tk.X, padx=(80, 0))
+        ttk.Label(region_row, text="Region:").pack(side=tk.LEFT, padx=5)
+        self.style_var = tk.StringVar(value=REGION_LABELS[None])
+        ttk.Combobox(region_row, textvariable=self.style_var, state='readonly',
+                     values=list(REGION_LABELS.values()), width=10).pack(side=tk.LEFT, padx=5)
+        self.region_vars = {}
+        for name in ('x', 'y', 'w', 'h'):
+            ttk.Label(region_row, text=f"{name}:").pack(side=tk.LEFT, padx=(5, 0))
+            self.region_vars[name] = tk.StringVar()
+            ttk.Entry(region_row, textvariable=self.region_vars[name], width=5).pack(side=tk.LEFT, padx=(2, 5))
     
     def _on_delete_click(self):
         """Handle delete button click"""
@@ -180,13 +288,240 @@ class SegmentRow(ttk.Frame):
         end = self.end_time.get_value()
         return (start, end) if start is not None and end is not None else None
     
+    def get_region(self):
+        """The region as {'style', 'x', 'y', 'w', 'h'}, or None; raises ValueError if its fields aren't numbers"""
+        style = next(key for key, label in REGION_LABELS.items() if label == self.style_var.get())
+        if style is None:
+            return None
+        region = {'style': style}
+        for name, var in self.region_vars.items():
+            region[name] = int(var.get().strip())
+        return region
+    
+    def set_region(self, region):
+        """Show a region (a dict as from get_region), or clear it with None"""
+        self.style_var.set(REGION_LABELS[region['style'] if region else None])
+        for name, var in self.region_vars.items():
+            var.set(str(region[name]) if region else "")
+    
     def update_label(self, num):
         """Update segment number label"""
         self.segment_num = num
-        for widget in self.winfo_children():
-            if isinstance(widget, ttk.Label) and widget.cget('text').startswith('Segment'):
-                widget.config(text=f"Segment {num}:")
-                break
+        self.label.config(text=f"Segment {num}:")
+
+
+class TimelineView(ttk.Frame):
+    """Zoomable timeline with keyframe thumbnails, the audio waveform and the segments.
+    
+    Drag with the left button to select a new segment, turn the mouse wheel
+    to zoom around the pointer, and drag with the right button (or use the
+    scrollbar) to pan. Waveform and thumbnails come from hashbrown_timeline.
+    """
+    
+    def __init__(self, parent, get_segments, on_select, **kwargs):
+        super().__init__(parent, **kwargs)
+        
+        self.get_segments = get_segments
+        self.on_select = on_select
+        self.duration = None
+        self.peaks = None
+        self.thumbnails = None
+        self.thumbnail_images = {}
+        self.message = "No video selected"
+        self.view_start = 0.0
+        self.view_end = 1.0
+        self._select_from = None
+        self._pan_from = None
+        
+        height = TIMELINE_RULER_HEIGHT + TIMELINE_THUMB_HEIGHT + TIMELINE_WAVE_HEIGHT
+        self.canvas = tk.Canvas(self, height=height, background='#202020', highlightthickness=0)
+        self.canvas.pack(fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(self, orient='horizontal', command=self._on_scroll)
+        self.scrollbar.pack(fill=tk.X)
+        
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<MouseWheel>', lambda e: self._zoom(e.x, e.delta > 0))
+        self.canvas.bind('<Button-4>', lambda e: self._zoom(e.x, True))  # X11 wheel
+        self.canvas.bind('<Button-5>', lambda e: self._zoom(e.x, False))
+        self.canvas.bind('<ButtonPress-1>', self._on_select_start)
+        self.canvas.bind('<B1-Motion>', self._on_select_drag)
+        self.canvas.bind('<ButtonRelease-1>', self._on_select_end)
+        self.canvas.bind('<ButtonPress-3>', self._on_pan_start)
+        self.canvas.bind('<B3-Motion>', self._on_pan_drag)
+    
+    def set_video(self, duration, message=""):
+        """Show a new video: whole file in view, waveform and thumbnails still to come"""
+        self.duration = duration
+        self.peaks = None
+        self.thumbnails = None
+        self.thumbnail_images = {}
+        self.message = message
+        self.view_start = 0.0
+        self.view_end = duration or 1.0
+        self.redraw()
+    
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self.redraw()
+    
+    def set_thumbnails(self, thumbnails):
+        self.thumbnails = thumbnails
+        self.thumbnail_images = {}
+        self.redraw()
+    
+    def set_message(self, message):
+        self.message = message
+        self.redraw()
+    
+    def _time_at(self, x):
+        width = max(self.canvas.winfo_width(), 1)
+        return self.view_start + (self.view_end - self.view_start) * x / width
+    
+    def _x_at(self, seconds):
+        width = max(self.canvas.winfo_width(), 1)
+        return (seconds - self.view_start) * width / (self.view_end - self.view_start)
+    
+    def _set_view(self, start, end):
+        """Move the view, keeping its length, inside the file"""
+        span = min(end - start, self.duration or 1.0)
+        start = min(max(start, 0.0), (self.duration or 1.0) - span)
+        self.view_start, self.view_end = start, start + span
+        self.redraw()
+    
+    def _zoom(self, x, zoom_in):
+        if not self.duration:
+            return
+        anchor = self._time_at(x)
+        factor = 1 / TIMELINE_ZOOM_STEP if zoom_in else TIMELINE_ZOOM_STEP
+        span = min(max((self.view_end - self.view_start) * factor, TIMELINE_MIN_SPAN), self.duration)
+        # Keep the time under the pointer where it is
+        start = anchor - (anchor - self.view_start) * span / (self.view_end - self.view_start)
+        self._set_view(start, start + span)
+    
+    def _on_scroll(self, *args):
+        if not self.duration:
+            return
+        span = self.view_end - self.view_start
+        if args[0] == 'moveto':
+            start = float(args[1]) * self.duration
+        else:
+            step = span if args[2] == 'pages' else span / 10
+            start = self.view_start + int(args[1]) * step
+        self._set_view(start, start + span)
+    
+    def _on_pan_start(self, event):
+        self._pan_from = (event.x, self.view_start)
+    
+    def _on_pan_drag(self, event):
+        if self._pan_from is None or not self.duration:
+            return
+        x, start = self._pan_from
+        shift = (x - event.x) * (self.view_end - self.view_start) / max(self.canvas.winfo_width(), 1)
+        self._set_view(start + shift, start + shift + self.view_end - self.view_start)
+    
+    def _on_select_start(self, event):
+        if self.duration:
+            self._select_from = event.x
+    
+    def _on_select_drag(self, event):
+        if self._select_from is None:
+            return
+        self.canvas.delete('selection')
+        self.canvas.create_rectangle(self._select_from, TIMELINE_RULER_HEIGHT, event.x,
+                                     int(self.canvas.cget('height')), outline='#4da6ff', width=2, tags='selection')
+    
+    def _on_select_end(self, event):
+        if self._select_from is None:
+            return
+        self.canvas.delete('selection')
+        left, right = sorted((self._select_from, event.x))
+        self._select_from = None
+        if right - left < 3:
+            return  # A click, not a drag
+        start = max(self._time_at(left), 0.0)
+        end = min(self._time_at(right), self.duration)
+        self.on_select(round(start, 3), round(end, 3))
+    
+    def redraw(self):
+        """Draw everything for the current view"""
+        canvas = self.canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        height = int(canvas.cget('height'))
+        if self.duration:
+            self.scrollbar.set(self.view_start / self.duration, self.view_end / self.duration)
+        if width <= 1 or not self.duration:
+            canvas.create_text(width // 2, height // 2, text=self.message, fill='gray')
+            return
+        
+        self._draw_ruler(width)
+        self._draw_thumbnails(width)
+        self._draw_waveform(width)
+        self.draw_segments()
+        if self.message:
+            canvas.create_text(width // 2, TIMELINE_RULER_HEIGHT + TIMELINE_THUMB_HEIGHT // 2,
+                               text=self.message, fill='white')
+    
+    def _draw_ruler(self, width):
+        span = self.view_end - self.view_start
+        step = next((tick for tick in TIMELINE_TICKS if tick * width / span >= 90), TIMELINE_TICKS[-1])
+        tick = int(self.view_start / step) * step
+        while tick <= self.view_end:
+            x = self._x_at(tick)
+            if x >= 0:
+                self.canvas.create_line(x, 0, x, TIMELINE_RULER_HEIGHT, fill='gray')
+                self.canvas.create_text(x + 3, 2, text=format_time(tick, millis=step < 1), anchor='nw',
+                                        fill='lightgray', font=('Arial', 7))
+            tick += step
+    
+    def _draw_thumbnails(self, width):
+        if self.thumbnails is None:
+            return
+        strip = self.thumbnails
+        top = TIMELINE_RULER_HEIGHT
+        # Before the first visible time too, so a thumbnail straddling the left edge is drawn
+        last_right = None
+        for index in strip.visible(self.view_start - strip.width * (self.view_end - self.view_start) / width,
+                                   self.view_end):
+            x = self._x_at(strip.times[index])
+            if last_right is not None and x < last_right:
+                continue  # Zoomed out: skip thumbnails that would overlap the previous one
+            if index not in self.thumbnail_images:
+                self.thumbnail_images[index] = tk.PhotoImage(data=strip.ppm(index), format='PPM')
+            self.canvas.create_image(x, top, image=self.thumbnail_images[index], anchor='nw')
+            last_right = x + strip.width
+    
+    def _draw_waveform(self, width):
+        if self.peaks is None:
+            return
+        top = TIMELINE_RULER_HEIGHT + TIMELINE_THUMB_HEIGHT
+        middle = top + TIMELINE_WAVE_HEIGHT / 2
+        scale = TIMELINE_WAVE_HEIGHT / 2 - 2
+        columns = self.peaks.columns(self.view_start, self.view_end, width)
+        # One polygon (top edge there, bottom edge back) is far cheaper than a line per column
+        upper = []
+        lower = []
+        for x, column in enumerate(columns):
+            low, high = column or (0.0, 0.0)
+            upper.extend((x, middle - high * scale))
+            lower.extend((x, middle - low * scale))
+        points = upper
+        for i in range(len(lower) - 2, -1, -2):
+            points.extend(lower[i:i + 2])
+        self.canvas.create_polygon(points, fill='#3fa34d', outline='#3fa34d')
+    
+    def draw_segments(self):
+        """Redraw just the segment overlay, e.g. after a segment was typed in"""
+        self.canvas.delete('segment')
+        if not self.duration:
+            return
+        height = int(self.canvas.cget('height'))
+        for segment in self.get_segments():
+            start, end = segment
+            if end <= self.view_start or start >= self.view_end or end <= start:
+                continue
+            self.canvas.create_rectangle(self._x_at(start), TIMELINE_RULER_HEIGHT, self._x_at(end), height,
+                                         fill='#e04040', outline='#ff6060', stipple='gray25', tags='segment')
 
 
 class HashbrownApp(TkinterDnD.Tk):
@@ -195,11 +530,12 @@ class HashbrownApp(TkinterDnD.Tk):
     def __init__(self):
         super().__init__()
         
-        # Configure ffmpeg path for moviepy
+        # Locate the ffmpeg executable every job runs
         self._configure_ffmpeg()
+        self._load_settings()
         
         self.title("Hashbrown")
-        self.geometry("700x600")
+        self.geometry("780x980")
         
         # Set window icon
         logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.png')
@@ -212,21 +548,50 @@ class HashbrownApp(TkinterDnD.Tk):
         self.video_path = None
         self.video_duration = None
         self.segment_rows = []
+        # Pending after() id of a timeline redraw for edited segment times
+        self.timeline_redraw = None
+        
+        # Videos to process; saved on every change so a crash doesn't lose the queue
+        self.job_queue = JobQueue()
+        self.selected_job_id = None
+        
+        # Background job state; the worker thread only talks to us through job_events
+        self.scheduler = None
+        self.job_thread = None
+        self.job_events = queue.Queue()
+        # Ids of the jobs submitted in the current run, which its summary counts
+        self.run_job_ids = []
+        # Stage timings of the jobs in the current run (only with HASHBROWN_TRACE set)
+        self.job_traces = []
+        
+        # Keyword detection runs in its own thread and reports through detect_events
+        self.detect_thread = None
+        self.detect_control = None
+        self.detect_events = queue.Queue()
+        self.last_keywords = ""
+        
+        # The timeline of the selected video loads in the background, reporting through timeline_events
+        self.timeline_thread = None
+        self.timeline_control = None
+        self.timeline_events = queue.Queue()
         
         self._create_widgets()
         self._setup_drag_drop()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._restore_queue()
     
     def _configure_ffmpeg(self):
-        """Configure ffmpeg path - use imageio_ffmpeg which is bundled with moviepy"""
-        try:
-            import imageio_ffmpeg
-            self.ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-            os.environ['IMAGEIO_FFMPEG_EXE'] = self.ffmpeg_path
-        except Exception as e:
-            # Fallback to system ffmpeg if imageio_ffmpeg fails
-            self.ffmpeg_path = 'ffmpeg'
-            import warnings
-            warnings.warn(f"Could not load imageio_ffmpeg ({e}). Using system FFmpeg if available.")
+        """Use the ffmpeg bundled with imageio_ffmpeg, or the system one"""
+        self.ffmpeg_path = find_ffmpeg()
+    
+    def _load_settings(self):
+        """Read the processing settings from the environment"""
+        settings = load_env_settings()
+        self.legacy_audio_pass = settings['legacy_audio']
+        self.workers = settings['workers']
+        self.chunk_seconds = settings['chunk_seconds']
+        self.default_profile = settings['profile'] if settings['profile'] in PROFILES else DEFAULT_PROFILE
+        self.default_codec = settings['codec'] if settings['codec'] in CODEC_LABELS else 'h264'
     
     def _create_widgets(self):
         """Create all GUI widgets"""
@@ -238,8 +603,7 @@ class HashbrownApp(TkinterDnD.Tk):
         logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.png')
         if os.path.exists(logo_path):
             try:
-                logo_img = Image.open(logo_path)
-                # Keep original size (64x43)
+                # Keep original size (64x43); Tk reads PNGs itself, no PIL needed
                 self.logo_photo = tk.PhotoImage(file=logo_path)
                 logo_label = ttk.Label(title_frame, image=self.logo_photo)
                 logo_label.pack(side=tk.LEFT, padx=10)
@@ -249,21 +613,41 @@ class HashbrownApp(TkinterDnD.Tk):
         title_label = ttk.Label(title_frame, text="Hashbrown", font=('Arial', 16, 'bold'))
         title_label.pack(side=tk.LEFT)
         
-        # File upload section
-        upload_frame = ttk.LabelFrame(self, text="Video File", padding=10)
+        # Video queue section
+        upload_frame = ttk.LabelFrame(self, text="Videos (drop several files to queue them)", padding=10)
         upload_frame.pack(fill=tk.X, padx=20, pady=10)
         
-        self.file_label = ttk.Label(upload_frame, text="No file selected", foreground='gray')
+        list_frame = ttk.Frame(upload_frame)
+        list_frame.pack(fill=tk.X)
+        self.queue_list = tk.Listbox(list_frame, height=5, activestyle='none', exportselection=False)
+        queue_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.queue_list.yview)
+        self.queue_list.configure(yscrollcommand=queue_scrollbar.set)
+        self.queue_list.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_list.bind('<<ListboxSelect>>', self._on_queue_select)
+        
+        file_row = ttk.Frame(upload_frame)
+        file_row.pack(fill=tk.X, pady=(5, 0))
+        
+        self.file_label = ttk.Label(file_row, text="No file selected", foreground='gray')
         self.file_label.pack(side=tk.LEFT, padx=5)
         
-        ttk.Button(upload_frame, text="Browse...", command=self._browse_file).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(file_row, text="Remove", command=self._remove_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(file_row, text="Browse...", command=self._browse_file).pack(side=tk.RIGHT, padx=5)
+        
+        # Timeline: drag across it to add a segment
+        timeline_frame = ttk.LabelFrame(self, text="Timeline (drag to add a segment, wheel to zoom, right-drag to pan)",
+                                        padding=5)
+        timeline_frame.pack(fill=tk.X, padx=20, pady=(0, 5))
+        self.timeline = TimelineView(timeline_frame, self._current_segments, self._add_timeline_segment)
+        self.timeline.pack(fill=tk.X)
         
         # Segments section
         segments_frame = ttk.LabelFrame(self, text="Redact Segments", padding=10)
         segments_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
         # Scrollable frame for segments
-        canvas = tk.Canvas(segments_frame, height=300)
+        canvas = tk.Canvas(segments_frame, height=180)
         scrollbar = ttk.Scrollbar(segments_frame, orient="vertical", command=canvas.yview)
         self.segments_container = ttk.Frame(canvas)
         
@@ -285,16 +669,59 @@ class HashbrownApp(TkinterDnD.Tk):
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # Add segment button
-        ttk.Button(segments_frame, text="+ Redact Additional Segment", command=self._add_segment).pack(pady=10)
+        # Add segment and keyword detection buttons
+        segment_buttons = ttk.Frame(segments_frame)
+        segment_buttons.pack(pady=10)
+        ttk.Button(segment_buttons, text="+ Redact Additional Segment", command=self._add_segment).pack(side=tk.LEFT, padx=5)
+        self.detect_btn = ttk.Button(segment_buttons, text="Find Spoken Keywords...", command=self._find_keywords)
+        self.detect_btn.pack(side=tk.LEFT, padx=5)
         
         # Add first segment by default
         self._add_segment()
         
-        # Process button
-        process_btn = ttk.Button(self, text="Process Video", command=self._process_video, 
-                                 style='Accent.TButton')
-        process_btn.pack(pady=20)
+        # Processing options
+        options_frame = ttk.LabelFrame(self, text="Options", padding=10)
+        options_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        mode_row = ttk.Frame(options_frame)
+        mode_row.pack(fill=tk.X)
+        ttk.Label(mode_row, text="Mode:").pack(side=tk.LEFT, padx=5)
+        self.mode_var = tk.StringVar(value=MODE_LABELS['full'])
+        mode_combo = ttk.Combobox(mode_row, textvariable=self.mode_var, state='readonly',
+                                  values=list(MODE_LABELS.values()), width=45)
+        mode_combo.pack(side=tk.LEFT, padx=5)
+        
+        # Encoding profile and output codec, stamped on each job when processing starts
+        encoding_frame = ttk.Frame(options_frame)
+        encoding_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(encoding_frame, text="Quality:").pack(side=tk.LEFT, padx=5)
+        self.profile_var = tk.StringVar(value=PROFILES[self.default_profile]['label'])
+        ttk.Combobox(encoding_frame, textvariable=self.profile_var, state='readonly',
+                     values=[profile['label'] for profile in PROFILES.values()], width=28).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(encoding_frame, text="Codec:").pack(side=tk.LEFT, padx=5)
+        self.codec_var = tk.StringVar(value=CODEC_LABELS[self.default_codec])
+        ttk.Combobox(encoding_frame, textvariable=self.codec_var, state='readonly',
+                     values=list(CODEC_LABELS.values()), width=28).pack(side=tk.LEFT, padx=5)
+        
+        # Process and cancel buttons
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=(10, 5))
+        
+        self.process_btn = ttk.Button(buttons_frame, text="Process Video", command=self._process_video,
+                                      style='Accent.TButton')
+        self.process_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_btn = ttk.Button(buttons_frame, text="Cancel", command=self._cancel_job, state='disabled')
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Progress bar with stage, fps/speed and ETA readout
+        self.progress_bar = ttk.Progressbar(self, orient='horizontal', mode='determinate', maximum=100)
+        self.progress_bar.pack(fill=tk.X, padx=20, pady=5)
+        
+        self.progress_label = ttk.Label(self, text="", foreground='gray')
+        self.progress_label.pack()
         
         # Status label
         self.status_label = ttk.Label(self, text="", foreground='blue')
@@ -306,63 +733,246 @@ class HashbrownApp(TkinterDnD.Tk):
         self.dnd_bind('<<Drop>>', self._on_drop)
     
     def _on_drop(self, event):
-        """Handle file drop"""
-        # Get the file path from drop event
-        file_path = event.data
-        # Remove curly braces if present
-        file_path = file_path.strip('{}')
+        """Handle file drop (one or several files)"""
+        # Tk hands over a list, with braces around paths that contain spaces
+        file_paths = self.tk.splitlist(event.data)
         
-        if file_path.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv')):
-            self._load_video(file_path)
-        else:
-            messagebox.showerror("Invalid File", "Please select a valid video file.")
+        rejected = [path for path in file_paths if not path.lower().endswith(VIDEO_EXTENSIONS)]
+        for file_path in file_paths:
+            if file_path not in rejected:
+                self._load_video(file_path)
+        if rejected:
+            messagebox.showerror("Invalid File", "Please select a valid video file.\n\n"
+                                 + "\n".join(os.path.basename(path) for path in rejected))
     
     def _browse_file(self):
-        """Open file dialog to browse for video"""
-        file_path = filedialog.askopenfilename(
-            title="Select Video File",
+        """Open file dialog to browse for one or more videos"""
+        file_paths = filedialog.askopenfilenames(
+            title="Select Video Files",
             filetypes=[
-                ("Video Files", "*.mp4 *.avi *.mov *.mkv *.flv *.wmv"),
+                ("Video Files", " ".join(f"*{ext}" for ext in VIDEO_EXTENSIONS)),
                 ("All Files", "*.*")
             ]
         )
         
-        if file_path:
+        for file_path in file_paths:
             self._load_video(file_path)
     
     def _load_video(self, file_path):
-        """Load video and get its duration"""
+        """Probe a video, add it to the queue and select it for editing"""
         try:
-            self.video_path = file_path
-            
-            # Get video duration
-            clip = VideoFileClip(file_path)
-            self.video_duration = clip.duration
-            clip.close()
-            
-            # Update UI
-            filename = os.path.basename(file_path)
-            duration_str = self._format_time(self.video_duration)
-            self.file_label.config(
-                text=f"{filename} (Duration: {duration_str})",
-                foreground='black'
-            )
-            self.status_label.config(text="Video loaded successfully!", foreground='green')
+            # Get video duration (one cached probe instead of opening a decoder)
+            with job_trace('load', video=file_path), span('probe'):
+                duration = probe_media(self.ffmpeg_path, file_path)['duration']
+            if not duration:
+                raise RedactionError("Could not determine the video duration")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load video: {str(e)}")
             self.status_label.config(text="Error loading video", foreground='red')
+            return
+        
+        job = self.job_queue.add(file_path)
+        self._refresh_queue_list()
+        self._select_job(job['id'])
+        self.status_label.config(text="Video loaded successfully!", foreground='green')
+    
+    def _restore_queue(self):
+        """Show the queue left from the last session and select its first unfinished video"""
+        self._refresh_queue_list()
+        unfinished = self.job_queue.pending()
+        if unfinished:
+            self._select_job(unfinished[0]['id'])
+            self.status_label.config(
+                text=f"{len(unfinished)} unfinished video(s) restored from the last session",
+                foreground='blue'
+            )
+    
+    def _refresh_queue_list(self):
+        """Redraw the queue list with each video's status"""
+        self.queue_list.delete(0, tk.END)
+        for job in self.job_queue.jobs:
+            name = os.path.basename(job['input'])
+            segments = len(job['segments'])
+            self.queue_list.insert(tk.END, f"{name}  -  {segments} segment(s)  -  {STATUS_LABELS[job['status']]}")
+            if job['id'] == self.selected_job_id:
+                self.queue_list.selection_set(tk.END)
+    
+    def _on_queue_select(self, event):
+        """Switch the segment editor to the clicked video"""
+        selection = self.queue_list.curselection()
+        if selection:
+            self._select_job(self.job_queue.jobs[selection[0]]['id'])
+    
+    def _select_job(self, job_id):
+        """Keep the edits of the current video and load the segments of job_id"""
+        if job_id == self.selected_job_id:
+            return
+        self._store_segments()
+        job = self.job_queue.get(job_id)
+        self.selected_job_id = job_id
+        self.video_path = job['input']
+        try:
+            self.video_duration = probe_media(self.ffmpeg_path, job['input'])['duration']
+        except Exception:
+            self.video_duration = None  # Moved or deleted since; processing reports it
+        
+        # Update UI
+        filename = os.path.basename(job['input'])
+        duration_str = format_time(self.video_duration, millis=True) if self.video_duration else "unknown"
+        self.file_label.config(
+            text=f"{filename} (Duration: {duration_str})",
+            foreground='black'
+        )
+        self._show_segments(job['segments'], job.get('regions'))
+        self._refresh_queue_list()
+        self._load_timeline(job['input'])
+    
+    def _show_segments(self, segments, regions=None):
+        """Replace the segment rows with one row per (start, end), each with the region on screen in it"""
+        for row in self.segment_rows:
+            row.destroy()
+        self.segment_rows = []
+        for start, end in segments:
+            self._add_segment()
+            self.segment_rows[-1].start_time.set_seconds(start)
+            self.segment_rows[-1].end_time.set_seconds(end)
+            self.segment_rows[-1].set_region(
+                next((region for region in regions or [] if region['start'] < end and region['end'] > start), None))
+        if not self.segment_rows:
+            self._add_segment()
+        self.timeline.draw_segments()
+    
+    def _current_segments(self):
+        """The complete segment rows as (start, end), for the timeline overlay"""
+        return [segment for segment in (row.get_segment() for row in self.segment_rows) if segment is not None]
+    
+    def _add_timeline_segment(self, start, end):
+        """Put a segment dragged out on the timeline into the first empty row, or a new one"""
+        row = next((row for row in self.segment_rows if row.get_segment() in (None, (0, 0))), None)
+        if row is None:
+            self._add_segment()
+            row = self.segment_rows[-1]
+        row.start_time.set_seconds(start)
+        row.end_time.set_seconds(end)
+        self._store_segments()
+        self._refresh_queue_list()
+        self.timeline.draw_segments()
+    
+    def _load_timeline(self, video_path):
+        """Show the video on the timeline and fetch its waveform and thumbnails in the background"""
+        if self.timeline_control is not None:
+            self.timeline_control.cancel()  # A previous video's timeline is no longer wanted
+        self.timeline.set_video(self.video_duration, "Reading waveform...")
+        if not self.video_duration:
+            self.timeline.set_message("Video not found")
+            return
+        
+        control = JobControl(on_progress=lambda info: self.timeline_events.put(('progress', video_path, info)))
+        self.timeline_control = control
+        polling = self.timeline_thread is not None
+        self.timeline_thread = threading.Thread(target=self._run_timeline, args=(video_path, control), daemon=True)
+        self.timeline_thread.start()
+        if not polling:
+            self.after(PROGRESS_POLL_MS, self._poll_timeline)
+    
+    def _run_timeline(self, video_path, control):
+        """Worker thread: waveform first (quick), then the thumbnails"""
+        try:
+            self.timeline_events.put(('peaks', video_path, load_peaks(self.ffmpeg_path, video_path, control)))
+            self.timeline_events.put(('thumbnails', video_path,
+                                      load_thumbnails(self.ffmpeg_path, video_path, control)))
+        except RedactionError:
+            pass  # Cancelled because another video was selected
+        except (TimelineError, OSError) as e:
+            self.timeline_events.put(('failed', video_path, str(e)))
     
-    def _format_time(self, seconds):
-        """Format seconds to HH:MM:SS"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+    def _poll_timeline(self):
+        """Hand the timeline worker's results to the widget, ignoring those of videos no longer shown"""
+        while True:
+            try:
+                kind, video_path, payload = self.timeline_events.get_nowait()
+            except queue.Empty:
+                break
+            if video_path != self.video_path:
+                continue
+            if kind == 'progress':
+                if payload['fraction'] is not None:
+                    self.timeline.set_message(f"{payload['stage']}... {payload['fraction'] * 100:.0f}%")
+            elif kind == 'peaks':
+                self.timeline.message = "Reading thumbnails..."
+                self.timeline.set_peaks(payload)
+            elif kind == 'thumbnails':
+                self.timeline.message = ""
+                self.timeline.set_thumbnails(payload)
+            elif kind == 'failed':
+                self.timeline.set_message(f"No timeline: {payload}")
+        
+        if self.timeline_thread.is_alive() or not self.timeline_events.empty():
+            self.after(PROGRESS_POLL_MS, self._poll_timeline)
+        else:
+            self.timeline_thread = None
+            self.timeline_control = None
+    
+    def _store_segments(self):
+        """Save the complete segment rows into the selected video's queue entry"""
+        if self.selected_job_id is None or self.job_queue.get(self.selected_job_id) is None:
+            return
+        segments = []
+        regions = []
+        for row in self.segment_rows:
+            segment = row.get_segment()
+            if segment is None or segment == (0, 0):
+                continue
+            segments.append(list(segment))
+            try:
+                region = row.get_region()
+            except ValueError:
+                region = None  # Not filled in yet; _validate_segments reports it
+            if region is not None:
+                # A region in the editor spans its whole segment
+                regions.append(dict(region, start=segment[0], end=segment[1]))
+        self.job_queue.update(self.selected_job_id, segments=segments, regions=regions)
+    
+    def _remove_selected(self):
+        """Take the selected video off the queue"""
+        if self.selected_job_id is None:
+            return
+        job = self.job_queue.get(self.selected_job_id)
+        if self.job_thread is not None and job['status'] in ('probing', 'queued', 'running'):
+            messagebox.showwarning("Warning", "This video is being processed. Cancel first to remove it.")
+            return
+        self.job_queue.remove(self.selected_job_id)
+        self.selected_job_id = None
+        self.video_path = None
+        self.video_duration = None
+        remaining = self.job_queue.jobs
+        if remaining:
+            self._select_job(remaining[0]['id'])
+        else:
+            for row in self.segment_rows[1:]:
+                row.destroy()
+            self.segment_rows = self.segment_rows[:1]
+            self.segment_rows[0].start_time.set_seconds(0)
+            self.segment_rows[0].end_time.set_seconds(0)
+            self.segment_rows[0].set_region(None)
+            self.file_label.config(text="No file selected", foreground='gray')
+            self.timeline.set_video(None, "No video selected")
+            self._refresh_queue_list()
+    
+    def _schedule_timeline_redraw(self):
+        """Redraw the segments on the timeline shortly after a segment time changes, once per burst of edits"""
+        if self.timeline_redraw is None:
+            self.timeline_redraw = self.after(TIMELINE_REDRAW_MS, self._redraw_timeline_segments)
+    
+    def _redraw_timeline_segments(self):
+        self.timeline_redraw = None
+        self.timeline.draw_segments()
     
     def _add_segment(self):
         """Add a new segment row"""
         segment_num = len(self.segment_rows) + 1
-        row = SegmentRow(self.segments_container, segment_num, self._delete_segment)
+        row = SegmentRow(self.segments_container, segment_num, self._delete_segment,
+                         on_change=self._schedule_timeline_redraw)
         row.pack(fill=tk.X, pady=5)
         self.segment_rows.append(row)
     
@@ -378,9 +988,10 @@ class HashbrownApp(TkinterDnD.Tk):
         # Renumber remaining segments
         for i, segment_row in enumerate(self.segment_rows):
             segment_row.update_label(i + 1)
+        self.timeline.draw_segments()
     
     def _validate_segments(self):
-        """Validate all segments"""
+        """Validate the segments of the video being edited"""
         if not self.video_path:
             messagebox.showerror("Error", "Please select a video file first.")
             return False
@@ -394,279 +1005,327 @@ class HashbrownApp(TkinterDnD.Tk):
                 messagebox.showerror("Error", f"Segment {i + 1} has invalid time values.")
                 return False
             
-            start, end = segment
-            
-            if start >= end:
-                messagebox.showerror("Error", f"Segment {i + 1}: Start time must be before end time.")
-                return False
-            
-            if end > self.video_duration:
-                messagebox.showerror("Error", 
-                    f"Segment {i + 1}: End time exceeds video duration ({self._format_time(self.video_duration)}).")
+            try:
+                row.get_region()
+            except ValueError:
+                messagebox.showerror("Error", f"Segment {i + 1}: the region needs whole numbers for x, y, w and h.")
                 return False
             
-            segments.append((start, end))
-        
-        # Check for overlapping segments
-        segments.sort()
-        for i in range(len(segments) - 1):
-            if segments[i][1] > segments[i + 1][0]:
-                messagebox.showerror("Error", 
-                    f"Segments overlap: Segment ending at {self._format_time(segments[i][1])} overlaps with segment starting at {self._format_time(segments[i + 1][0])}.")
-                return False
+            segments.append(segment)
         
-        return segments
+        try:
+            return validate_segments(segments, self.video_duration)
+        except RedactionError as e:
+            messagebox.showerror("Error", str(e))
+            return False
     
-    def _process_video(self):
-        """Process the video with mute segments"""
-        segments = self._validate_segments()
+    def _validate_queue(self):
+        """Check every unfinished video's segments; returns the jobs to run or None"""
+        if self._validate_segments() is False:
+            return None
+        self._store_segments()
         
-        if not segments:
+        jobs = self.job_queue.pending()
+        for job in jobs:
+            name = os.path.basename(job['input'])
+            if not job['segments']:
+                messagebox.showerror("Error", f"{name} has no segments to redact.")
+                return None
+            try:
+                info = probe_media(self.ffmpeg_path, job['input'])
+                validate_segments([tuple(segment) for segment in job['segments']], info['duration'])
+                video = info['video'] or {}
+                validate_regions(job.get('regions') or [], info['duration'], video.get('width'), video.get('height'))
+            except Exception as e:
+                messagebox.showerror("Error", f"{name}: {e}")
+                return None
+        return jobs
+    
+    def _find_keywords(self):
+        """Ask for keywords and propose a segment wherever they are spoken in the selected video"""
+        if self.job_thread is not None or self.detect_thread is not None:
+            return
+        if self.selected_job_id is None:
+            messagebox.showerror("Error", "Please select a video file first.")
             return
         
+        text = simpledialog.askstring(
+            "Find Spoken Keywords",
+            "Words or phrases to redact, separated by commas (* matches any letters):",
+            initialvalue=self.last_keywords, parent=self,
+        )
+        keywords = parse_keywords(text)
+        if not keywords:
+            return
+        self.last_keywords = text
+        
+        job_id = self.selected_job_id
+        self.detect_control = JobControl(on_progress=lambda info: self.detect_events.put(('progress', job_id, info)))
+        self.detect_thread = threading.Thread(target=self._run_detection,
+                                              args=(job_id, self.video_path, keywords, self.detect_control),
+                                              daemon=True)
+        
+        self.process_btn.config(state='disabled')
+        self.detect_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.progress_bar.config(mode='determinate', value=0)
+        self.status_label.config(text="Listening for keywords (the first time takes a while)...", foreground='blue')
+        
+        self.detect_thread.start()
+        self.after(PROGRESS_POLL_MS, self._poll_detection)
+    
+    def _run_detection(self, job_id, video_path, keywords, control):
+        """Worker thread: transcribe (or reuse the cached transcript) and match the keywords"""
         try:
-            self.status_label.config(text="Processing video... Please wait.", foreground='blue')
-            self.update()
-            
-            # Generate output filename
-            directory = os.path.dirname(self.video_path)
-            filename = os.path.basename(self.video_path)
-            name, ext = os.path.splitext(filename)
-            output_path = os.path.join(directory, f"processed-{filename}")
-            
-            # Load video
-            video = VideoFileClip(self.video_path)
-            
-            # Check if mute_2.png exists
-            mute_icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mute_2.png')
-            if not os.path.exists(mute_icon_path):
-                messagebox.showerror("Error", "mute_2.png not found in program directory.")
-                self.status_label.config(text="Error: mute_2.png not found", foreground='red')
-                return
-            
-            # Calculate mute icon size (1/5 of video height)
-            icon_size = int(video.h / 5)
-            
-            # Create segments list for ffmpeg filter
-            # We'll use ffmpeg's overlay filter which is much faster
-            filter_complex_parts = []
-            
-            for i, (start, end) in enumerate(segments):
-                # Format times for ffmpeg
-                filter_complex_parts.append(
-                    f"[0:v][1:v]overlay=0:0:enable='between(t,{start},{end})'[v{i}]"
-                )
-            
-            # Build the final filter
-            if len(filter_complex_parts) == 1:
-                filter_complex = filter_complex_parts[0].replace('[v0]', '[outv]')
-            else:
-                # Chain multiple overlays
-                filter_complex = filter_complex_parts[0]
-                for i in range(1, len(filter_complex_parts)):
-                    prev = f'[v{i-1}]'
-                    curr = filter_complex_parts[i].replace('[0:v]', prev)
-                    if i == len(filter_complex_parts) - 1:
-                        curr = curr.replace(f'[v{i}]', '[outv]')
-                    filter_complex += ';' + curr
-            
-            # Mute audio segments - skip audio processing for now to isolate the issue
-            audio = video.audio
-            temp_audio_path = None
-            if audio is not None:
-                try:
-                    # Get original audio
-                    original_audio = video.audio
-                    
-                    # Create new audio with muted segments
-                    def make_frame(t):
-                        # Handle both single time values and arrays of time values
-                        try:
-                            frame = original_audio.get_frame(t)
-                            if frame is None:
-                                return np.zeros((2,))  # Return silence if frame is None
-                                
-                            # Check if t is an array or single value
-                            if isinstance(t, (int, float)):
-                                # Single time value
-                                for start, end in segments:
-                                    if start <= t < end:
-                                        return frame * 0  # Mute
-                                return frame
-                            else:
-                                # Array of time values
-                                result = frame.copy()
-                                t_array = np.asarray(t)
-                                for start, end in segments:
-                                    mask = (t_array >= start) & (t_array < end)
-                                    if result.ndim == 1:
-                                        result[mask] = 0
-                                    else:
-                                        result[mask] = 0
-                                return result
-                        except Exception as e:
-                            # Return silence if there's any error
-                            if isinstance(t, (int, float)):
-                                return np.zeros((2,))
-                            else:
-                                return np.zeros((len(np.asarray(t)), 2))
-                    
-                    muted_audio = AudioClip(make_frame, duration=video.duration, fps=original_audio.fps)
-                    
-                    # Save audio temporarily with absolute path in temp directory
-                    temp_dir = tempfile.gettempdir()
-                    temp_audio_path = os.path.join(temp_dir, 'hashbrown-temp-muted-audio.m4a')
-                    muted_audio.write_audiofile(temp_audio_path, codec='aac')
-                except Exception as e:
-                    # If audio processing fails, just skip it and process video only
-                    audio = None
-                    temp_audio_path = None
-            
-            # Close video to release resources
-            video.close()
-            
-            # Use the ffmpeg path configured in __init__
-            ffmpeg_path = self.ffmpeg_path
-            
-            # Now use direct ffmpeg for much faster processing with GPU acceleration
-            import subprocess
-            
-            # Prepare mute icon overlay with size
-            temp_dir = tempfile.gettempdir()
-            temp_icon = os.path.join(temp_dir, 'hashbrown-temp_resized_icon.png')
-            from PIL import Image
-            icon_img = Image.open(mute_icon_path)
-            icon_img.thumbnail((icon_size, icon_size), Image.Resampling.LANCZOS)
-            icon_img.save(temp_icon)
-            
-            # Build ffmpeg command - remove CUDA since bundled ffmpeg doesn't support it
-            # We'll still use NVENC for encoding which is much faster
-            ffmpeg_cmd = [
-                ffmpeg_path,
-                '-y',  # Overwrite output
-                '-i', self.video_path,
-                '-i', temp_icon,
-            ]
-            
-            # Add audio input if we have muted audio
-            if audio is not None:
-                ffmpeg_cmd.extend(['-i', temp_audio_path])
-            
-            # Build filter complex for conditional overlay AND audio muting
-            overlay_filters = []
-            for start, end in segments:
-                overlay_filters.append(f"between(t,{start},{end})")
-            
-            overlay_enable = '+'.join(overlay_filters) if overlay_filters else '0'
-            
-            # Create audio volume filter to mute segments
-            volume_filters = []
-            for start, end in segments:
-                volume_filters.append(f"between(t,{start},{end})")
-            
-            # If we have segments to mute, create volume filter
-            if volume_filters:
-                volume_enable = '+'.join(volume_filters)
-                # Mute when condition is true (set volume to 0 during mute segments)
-                audio_filter = f"volume=enable='{volume_enable}':volume=0"
-                filter_complex = f"[0:v][1:v]overlay=0:0:enable='{overlay_enable}'[outv];[0:a]{audio_filter}[outa]"
-                
-                ffmpeg_cmd.extend([
-                    '-filter_complex', filter_complex,
-                    '-map', '[outv]',
-                    '-map', '[outa]',
-                ])
-            else:
-                # No muting needed, just overlay
-                filter_complex = f"[0:v][1:v]overlay=0:0:enable='{overlay_enable}'[outv]"
-                ffmpeg_cmd.extend([
-                    '-filter_complex', filter_complex,
-                    '-map', '[outv]',
-                    '-map', '0:a?',  # Copy original audio
-                ])
-            
-            # Check if NVENC is available and actually works, otherwise use CPU encoding
-            has_nvenc = False
+            segments = propose_segments(self.ffmpeg_path, video_path, keywords,
+                                        workers=self.workers, control=control)
+            self.detect_events.put(('proposed', job_id, segments))
+        except RedactionCancelled as e:
+            self.detect_events.put(('cancelled', job_id, str(e)))
+        except (SpeechError, ProbeError, OSError) as e:
+            self.detect_events.put(('cancelled' if control.cancelled else 'failed', job_id, str(e)))
+    
+    def _poll_detection(self):
+        """Apply the detection thread's progress and, once it is done, its proposed segments"""
+        while True:
             try:
-                # First check if NVENC is compiled into FFmpeg
-                test_cmd = [ffmpeg_path, '-hide_banner', '-encoders']
-                result = subprocess.run(test_cmd, capture_output=True, text=True)
-                
-                if 'h264_nvenc' in result.stdout:
-                    # NVENC is compiled in, now test if it actually works on this machine
-                    # Try to initialize NVENC with a dummy command
-                    test_nvenc = [
-                        ffmpeg_path,
-                        '-f', 'lavfi',
-                        '-i', 'nullsrc=s=256x256:d=0.1',
-                        '-c:v', 'h264_nvenc',
-                        '-f', 'null',
-                        '-'
-                    ]
-                    test_result = subprocess.run(test_nvenc, capture_output=True, text=True, timeout=5)
-                    # If the command didn't fail, NVENC is working
-                    has_nvenc = test_result.returncode == 0
-            except:
-                has_nvenc = False
-            
-            # Encoding settings
-            if has_nvenc:
-                # Use NVIDIA hardware encoding
-                ffmpeg_cmd.extend([
-                    '-c:v', 'h264_nvenc',
-                    '-preset', 'p4',
-                    '-rc:v', 'vbr',
-                    '-cq:v', '23',
-                    '-b:v', '10M',
-                    '-maxrate:v', '15M',
-                ])
-            else:
-                # Fall back to CPU encoding with fast settings
-                ffmpeg_cmd.extend([
-                    '-c:v', 'libx264',
-                    '-preset', 'fast',
-                    '-crf', '23',
-                ])
-            
-            ffmpeg_cmd.extend([
-                '-c:a', 'aac',
-                '-b:a', '192k',
-                output_path
-            ])
-            
-            # Run ffmpeg
+                kind, job_id, payload = self.detect_events.get_nowait()
+            except queue.Empty:
+                if self.detect_thread.is_alive():
+                    self.after(PROGRESS_POLL_MS, self._poll_detection)
+                    return
+                if not self.detect_events.empty():
+                    continue  # Posted just before the thread ended
+                # The worker died on a bug; its traceback is already on stderr
+                kind, job_id, payload = 'failed', None, "Keyword detection stopped unexpectedly."
+            if kind == 'progress':
+                self._show_progress(job_id, payload)
+                continue
+            break
+        
+        self.detect_thread.join()
+        self.detect_thread = None
+        self.detect_control = None
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=0)
+        self.progress_label.config(text="")
+        self.process_btn.config(state='normal')
+        self.detect_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        
+        if kind == 'failed':
+            messagebox.showerror("Error", f"Keyword detection failed:\n\n{payload}")
+            self.status_label.config(text="Keyword detection failed", foreground='red')
+        elif kind == 'cancelled':
+            self.status_label.config(text="Keyword detection cancelled", foreground='gray')
+        elif self.job_queue.get(job_id) is not None:
+            self._apply_proposed(job_id, payload)
+    
+    def _apply_proposed(self, job_id, proposed):
+        """Add the proposed segments to the video's own, merged where they overlap"""
+        self._store_segments()
+        job = self.job_queue.get(job_id)
+        segments = merge_segments([tuple(segment) for segment in job['segments']] + proposed)
+        self.job_queue.update(job_id, segments=[list(segment) for segment in segments])
+        if job_id == self.selected_job_id:
+            self._show_segments(segments, job.get('regions'))
+        self._refresh_queue_list()
+        name = os.path.basename(job['input'])
+        if proposed:
+            self.status_label.config(text=f"{len(proposed)} segment(s) proposed for {name}. Check them before processing.",
+                                     foreground='green')
+        else:
+            self.status_label.config(text=f"None of the keywords are spoken in {name}.", foreground='blue')
+    
+    def _process_video(self):
+        """Process every unfinished video in the queue in a background thread"""
+        if self.job_thread is not None or self.detect_thread is not None:
+            return
+        
+        jobs = self._validate_queue()
+        
+        if not jobs:
+            return
+        
+        # Check if mute_2.png exists
+        mute_icon_path = default_mute_icon_path()
+        if not os.path.exists(mute_icon_path):
+            messagebox.showerror("Error", "mute_2.png not found in program directory.")
+            self.status_label.config(text="Error: mute_2.png not found", foreground='red')
+            return
+        
+        mode = next(key for key, label in MODE_LABELS.items() if label == self.mode_var.get())
+        profile = next(key for key, settings in PROFILES.items() if settings['label'] == self.profile_var.get())
+        codec = next(key for key, label in CODEC_LABELS.items() if label == self.codec_var.get())
+        for job in jobs:
+            self.job_queue.update(job['id'], mode=mode, profile=profile, codec=codec, status='pending', error=None)
+        # The scheduler gets snapshots; results come back through job_events
+        jobs = [dict(job) for job in jobs]
+        
+        self.scheduler = BatchScheduler(
+            self.ffmpeg_path,
+            lambda job, control: self._run_job(job, mute_icon_path, control),
+            max_jobs=PARALLEL_JOBS,
+            workers=self.workers,
+            on_event=lambda job, event, payload: self.job_events.put((event, job['id'], payload)),
+        )
+        self.job_thread = threading.Thread(target=self._run_queue, args=(self.scheduler, jobs), daemon=True)
+        
+        self.process_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.progress_bar.config(mode='determinate', value=0)
+        self.progress_label.config(text="")
+        self.status_label.config(text=f"Processing {len(jobs)} video(s)...", foreground='blue')
+        self.run_job_ids = [job['id'] for job in jobs]
+        self.job_traces = []
+        self._refresh_queue_list()
+        
+        self.job_thread.start()
+        self.after(PROGRESS_POLL_MS, self._poll_job)
+    
+    def _run_queue(self, scheduler, jobs):
+        """Worker thread: run the scheduler and report when every job has finished"""
+        try:
+            scheduler.run(jobs)
+        finally:
+            self.job_events.put(('finished', None, None))
+    
+    def _run_job(self, job, mute_icon_path, control):
+        """Scheduler worker: redact one queued video and return its output path"""
+        output_path = job['output'] or default_output_path(job['input'])
+        try:
+            redact_video(job['input'], [tuple(segment) for segment in job['segments']], output_path,
+                         self.ffmpeg_path, mute_icon_path,
+                         legacy_audio=self.legacy_audio_pass, mode=job['mode'],
+                         workers=self.workers, chunk_seconds=self.chunk_seconds,
+                         control=control, profile=job.get('profile'), codec=job.get('codec'),
+                         regions=job.get('regions'))
+        finally:
+            if control.trace is not None:
+                self.job_events.put(('trace', job['id'], control.trace.record))
+        return output_path
+    
+    def _poll_job(self):
+        """Apply the scheduler's events on the Tk thread"""
+        while True:
             try:
-                process = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
-            except subprocess.CalledProcessError as e:
-                # Clean up temporary files
-                if audio is not None and os.path.exists(temp_audio_path):
-                    os.remove(temp_audio_path)
-                if os.path.exists(temp_icon):
-                    os.remove(temp_icon)
-                raise Exception(f"FFmpeg error: {e.stderr}")
-            except FileNotFoundError:
-                # Clean up temporary files
-                if audio is not None and os.path.exists(temp_audio_path):
-                    os.remove(temp_audio_path)
-                if os.path.exists(temp_icon):
-                    os.remove(temp_icon)
-                raise Exception("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+                kind, job_id, payload = self.job_events.get_nowait()
+            except queue.Empty:
+                break
             
-            # Clean up temporary files
-            if audio is not None and os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
-            if os.path.exists(temp_icon):
-                os.remove(temp_icon)
+            if kind == 'finished':
+                self._finish_job()
+                return
+            if kind == 'progress':
+                self._show_progress(job_id, payload)
+                continue
+            if kind == 'trace':
+                self.job_traces.append(payload)
+                continue
             
+            changes = {'status': kind}
+            if kind == 'done':
+                changes['output'] = payload
+            elif kind == 'failed':
+                changes['error'] = payload
+            self.job_queue.update(job_id, **changes)
+            self._refresh_queue_list()
+        
+        self.after(PROGRESS_POLL_MS, self._poll_job)
+    
+    def _show_progress(self, job_id, info):
+        """Update the progress bar and the stage/fps/speed/ETA readout"""
+        job = self.job_queue.get(job_id)
+        parts = [f"{os.path.basename(job['input'])}: {info['stage']}" if job else info['stage']]
+        if info['fraction'] is None:
+            if str(self.progress_bar.cget('mode')) != 'indeterminate':
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start(15)
+        else:
+            if str(self.progress_bar.cget('mode')) != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate')
+            self.progress_bar.config(value=info['fraction'] * 100)
+            parts.append(f"{info['fraction'] * 100:.0f}%")
+        if info['fps']:
+            parts.append(f"{info['fps']:.0f} fps")
+        if info['speed']:
+            parts.append(f"{info['speed']:.2f}x")
+        if info['eta'] is not None:
+            parts.append(f"ETA {format_time(info['eta'])}")
+        self.progress_label.config(text="  |  ".join(parts))
+    
+    def _finish_job(self):
+        """Reset the controls once the scheduler is done and summarise the run"""
+        self.job_thread.join()
+        self.job_thread = None
+        self.scheduler = None
+        
+        # Jobs finished in earlier runs stay in the queue; only count this run's
+        jobs = [job for job in map(self.job_queue.get, self.run_job_ids) if job is not None]
+        done = [job for job in jobs if job['status'] == 'done']
+        failed = [job for job in jobs if job['status'] == 'failed']
+        cancelled = any(job['status'] == 'cancelled' for job in jobs)
+        
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=0 if failed or cancelled else 100)
+        self.progress_label.config(text="")
+        self.process_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        self._refresh_queue_list()
+        
+        if TRACE_ENABLED and self.job_traces:
+            self._show_traces()
+        
+        if failed:
+            details = "\n\n".join(f"{os.path.basename(job['input'])}:\n{job['error']}" for job in failed)
+            messagebox.showerror("Error", f"Failed to process {len(failed)} video(s):\n\n{details}")
+            self.status_label.config(text="Error processing video", foreground='red')
+        elif cancelled:
+            self.status_label.config(text="Processing cancelled", foreground='gray')
+        elif len(done) == 1:
             self.status_label.config(
-                text=f"Video processed successfully! Saved as: {os.path.basename(output_path)}",
+                text=f"Video processed successfully! Saved as: {os.path.basename(done[0]['output'])}",
                 foreground='green'
             )
-            messagebox.showinfo("Success", f"Video saved as:\n{output_path}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process video:\n{str(e)}")
-            self.status_label.config(text="Error processing video", foreground='red')
+            messagebox.showinfo("Success", f"Video saved as:\n{done[0]['output']}")
+        else:
+            self.status_label.config(text=f"{len(done)} videos processed successfully!", foreground='green')
+            messagebox.showinfo("Success", "Videos saved as:\n" + "\n".join(job['output'] for job in done))
+    
+    def _show_traces(self):
+        """Open a window with the per-stage timings of the jobs that just ran"""
+        window = tk.Toplevel(self)
+        window.title("Hashbrown - stage timings")
+        text = tk.Text(window, width=100, height=25, font=('Courier', 10), wrap='none')
+        text.pack(fill=tk.BOTH, expand=True)
+        text.insert(tk.END, "\n\n".join(format_trace(record) for record in self.job_traces))
+        text.config(state='disabled')
+    
+    def _cancel_job(self):
+        """Kill the running ffmpeg processes; the workers clean up their temp files"""
+        if self.detect_control is not None:
+            self.detect_control.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.status_label.config(text="Cancelling...", foreground='gray')
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+            self.cancel_btn.config(state='disabled')
+            self.status_label.config(text="Cancelling...", foreground='gray')
+    
+    def _on_close(self):
+        """Cancel running jobs before closing so no ffmpeg or temp files are left behind"""
+        self._store_segments()
+        if self.job_thread is not None:
+            if not messagebox.askyesno("Quit", "Videos are still being processed. Cancel them and quit?"):
+                return
+            self.scheduler.cancel()
+            self.job_thread.join(timeout=10)
+        if self.detect_control is not None:
+            self.detect_control.cancel()
+        if self.timeline_control is not None:
+            self.timeline_control.cancel()
+        self.destroy()
 
 
 def main():
@@ -675,4 +1334,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Keyword detection runs worker processes, which a frozen Windows build must be able to start
+    multiprocessing.freeze_support()
     main()
@@ -11,11 +11,9 @@ datas = [('logo.png', '.'), ('mute.png', '.'), ('mute_2.png', '.')]
 # This saves ~290 MB by avoiding duplication
 
 binaries = []
-hiddenimports = ['tkinterdnd2', 'moviepy', 'moviepy.editor', 'moviepy.video.io.VideoFileClip', 'moviepy.video.compositing.CompositeVideoClip', 'moviepy.video.VideoClip', 'moviepy.audio.AudioClip', 'PIL', 'PIL.Image', 'imageio_ffmpeg', 'subprocess']
+hiddenimports = ['tkinterdnd2', 'PIL', 'PIL.Image', 'imageio_ffmpeg', 'subprocess']
 datas += copy_metadata('imageio-ffmpeg')
 binaries += collect_dynamic_libs('imageio_ffmpeg')
-tmp_ret = collect_all('moviepy')
-datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('tkinterdnd2')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
 tmp_ret = collect_all('imageio_ffmpeg')
@@ -31,7 +29,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=['scipy', 'matplotlib', 'pandas', 'IPython', 'jupyter', 'notebook', 
+    excludes=['moviepy', 'numpy', 'scipy', 'matplotlib', 'pandas', 'IPython', 'jupyter', 'notebook', 
               'setuptools', 'distutils', 'lxml', 'pytest', 'tests', 'test',
               'pydoc', 'pydoc_data', 'doctest', 'xmlrpc',
               'unittest', 'pkg_resources',  # Not needed for this app
@@ -52,7 +50,7 @@ a = Analysis(
               'PIL.WebPImagePlugin', 'PIL.WmfImagePlugin', 'PIL.XbmImagePlugin',
               'PIL.XpmImagePlugin', 'PIL.XVThumbImagePlugin'],
     noarchive=False,
-    optimize=0,  # numpy has issues with optimize=2
+    optimize=0,
 )
 pyz = PYZ(a.pure)
 
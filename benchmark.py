@@ -0,0 +1,543 @@
+"""Benchmarks for the Hashbrown redaction pipeline.
+
+Usage:
+    python benchmark.py audio-pass [--duration SECONDS] [--height PIXELS] [--segments N]
+    python benchmark.py chunked [--duration SECONDS] [--height PIXELS] [--workers 1,2,4,...]
+    python benchmark.py startup [--runs N] [--max-import-seconds S] [--no-window]
+    python benchmark.py suite [--full] [--resolutions 480p,1080p,4k] [--minutes 1,10,...]
+                              [--segments 1,100,...] [--modes full,smart,...]
+                              [--output report.json] [--baseline report.json]
+
+Synthetic inputs are generated with ffmpeg's lavfi sources, so no sample
+footage is needed. Each run is executed in a fresh Python process, whose
+process tree (Python plus every ffmpeg it runs at the same time) is
+sampled from /proc for its peak RSS.
+
+`suite` runs every processing mode over a grid of resolutions, lengths and
+segment counts and writes one JSON record per run (wall time, realtime
+factor, summed and single-process peak RSS, peak temp disk use and output
+size). Pass the report of a
+previous release as --baseline to fail on runs that got slower.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+# Modules that must not be imported just to show the window
+HEAVY_MODULES = ('moviepy', 'numpy', 'PIL', 'imageio', 'scipy')
+
+# Synthetic source heights by the names the suite takes on the command line
+RESOLUTIONS = {'480p': 480, '720p': 720, '1080p': 1080, '4k': 2160}
+# `suite --full`: the whole grid, which takes hours at 4K and 120 minutes
+FULL_SUITE = {
+    'resolutions': '480p,1080p,4k',
+    'minutes': '1,10,60,120',
+    'segments': '1,10,100,1000',
+}
+# The mute chain before asegment: the whole track re-framed into 64-sample frames,
+# each one tested against the enable expression. Kept to show the mute got no slower.
+PER_FRAME_MUTE = "asetnsamples=n=64:p=0,volume=enable='{enable}':volume=0"
+# How often the memory and temp dir of a running job are measured
+POLL_SECONDS = 0.25
+MB = 1024 * 1024
+
+
+def peak_process_rss_mb():
+    """Peak RSS of the largest single process, this one or a waited-for child, in MB.
+
+    Processes that ran at the same time are not added up; see tree_rss_bytes.
+    """
+    if resource is None:
+        return None
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(max(self_rss, child_rss) / divisor, 1)
+
+
+def tree_rss_bytes(pid):
+    """Current RSS of a process and all its descendants added up, or None without /proc"""
+    if not os.path.isdir('/proc/self'):
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    children = collections.defaultdict(list)
+    rss = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                stat = f.read()
+            with open(f'/proc/{name}/statm', 'rb') as f:
+                resident = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue  # Exited while we were looking
+        # The command name in parentheses may contain spaces; the parent pid follows the state
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children[ppid].append(int(name))
+        rss[int(name)] = resident * page_size
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+def make_synthetic_video(ffmpeg_path, output_path, duration, height):
+    """Generate a test pattern video with a sine tone soundtrack"""
+    width = int(height * 16 / 9) // 2 * 2
+    cmd = [
+        ffmpeg_path, '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60',
+        '-c:a', 'aac', '-b:a', '128k',
+        '-shortest', output_path,
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def spread_segments(duration, count, length=10):
+    """Evenly spread `count` non-overlapping segments across the timeline"""
+    step = duration / count
+    length = min(length, step / 2)
+    return [(round(i * step, 3), round(i * step + length, 3)) for i in range(count)]
+
+
+def run_one(args):
+    """Run a single redaction in this process and print its stats as JSON"""
+    import hashbrown_engine
+
+    segments = [tuple(s) for s in json.loads(args.segments_json)]
+    ffmpeg_path = hashbrown_engine.find_ffmpeg()
+
+    start = time.perf_counter()
+    hashbrown_engine.redact_video(args.input, segments, args.output, ffmpeg_path,
+                                  legacy_audio=args.legacy, mode=args.mode, workers=args.workers,
+                                  chunk_seconds=args.chunk_seconds)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': round(elapsed, 2), 'peak_process_rss_mb': peak_process_rss_mb()}))
+
+
+def _run_polled(extra_args, env=None, poll=None):
+    """Run `benchmark.py _run-one`, sampling its process tree's RSS, and parse its JSON line.
+
+    poll(), if given, is called at every sample too. peak_rss_mb in the
+    result is the largest summed RSS seen (None without /proc).
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), '_run-one'] + extra_args
+    peak_rss = None
+    # Files rather than pipes, so a chatty child can never block on a full pipe while we poll
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr, env=env)
+        while process.poll() is None:
+            rss = tree_rss_bytes(process.pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            if poll is not None:
+                poll()
+            time.sleep(POLL_SECONDS)
+        stdout.seek(0)
+        stderr.seek(0)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout.read(), stderr.read())
+        result = json.loads(stdout.read().decode().strip().splitlines()[-1])
+    result['peak_rss_mb'] = round(peak_rss / MB, 1) if peak_rss is not None else None
+    return result
+
+
+def run_child(extra_args):
+    """Run `benchmark.py _run-one` in a fresh interpreter and return its stats"""
+    return _run_polled(extra_args)
+
+
+def dir_size(path):
+    """Total size of the files under path, in bytes"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Deleted by the job while we were walking
+    return total
+
+
+def run_child_measured(extra_args, scratch_dir, cache_dir):
+    """Like run_child, but with its own temp and cache dirs and their peak size recorded.
+
+    The job's temp files go to scratch_dir, and the chunks checkpointed
+    jobs keep until they finish to the journals in cache_dir; both are
+    sampled while it runs. The chunk cache is off and the cache dir is
+    fresh, so every run is cold.
+    """
+    os.makedirs(scratch_dir, exist_ok=True)
+    env = dict(os.environ, TMPDIR=scratch_dir, TEMP=scratch_dir, TMP=scratch_dir,
+               HASHBROWN_CACHE_DIR=cache_dir, HASHBROWN_CHUNK_CACHE_MB='0')
+    peak = 0
+
+    def measure_temp():
+        nonlocal peak
+        peak = max(peak, dir_size(scratch_dir) + dir_size(os.path.join(cache_dir, 'journals')))
+
+    result = _run_polled(extra_args, env, measure_temp)
+    result['peak_temp_mb'] = round(peak / MB, 1)
+    return result
+
+
+def time_audio_filter(ffmpeg_path, source, audio_filter):
+    """Seconds to decode the first audio track through audio_filter, with nothing encoded or written"""
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-i', source, '-map', '0:a:0']
+    if audio_filter:
+        cmd.extend(['-af', audio_filter])
+    cmd.extend(['-f', 'null', '-'])
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    return round(time.perf_counter() - start, 2)
+
+
+def bench_mute_filter(ffmpeg_path, source, duration, segments):
+    """Audio throughput (seconds of audio per second) unmuted, with the mute filter, and per-frame"""
+    import hashbrown_engine
+    from hashbrown_segments import enable_expr
+
+    filters = {
+        'unmuted': None,
+        'mute_filter': hashbrown_engine.mute_filter(segments),
+        'per_frame_mute': PER_FRAME_MUTE.format(enable=enable_expr(segments)),
+    }
+    results = {}
+    for name, audio_filter in filters.items():
+        seconds = time_audio_filter(ffmpeg_path, source, audio_filter)
+        results[name] = {'seconds': seconds, 'realtime_factor': round(duration / seconds, 1) if seconds else None}
+    if results['unmuted']['seconds']:
+        # How much of the unmuted throughput muting keeps; close to 1.0 means the mute is nearly free
+        results['mute_filter']['relative_throughput'] = round(
+            results['unmuted']['seconds'] / results['mute_filter']['seconds'], 2)
+    return results
+
+
+def bench_audio_pass(args):
+    """Compare the single-pass pipeline against the Python (PCM pipe) audio pass"""
+    import hashbrown_engine
+
+    ffmpeg_path = hashbrown_engine.find_ffmpeg()
+    segments = spread_segments(args.duration, args.segments)
+
+    with tempfile.TemporaryDirectory(prefix='hashbrown-bench-') as work_dir:
+        source = os.path.join(work_dir, 'source.mp4')
+        make_synthetic_video(ffmpeg_path, source, args.duration, args.height)
+
+        results = {}
+        for name, legacy in (('single_pass', False), ('legacy_audio', True)):
+            child_args = [
+                '--input', source,
+                '--output', os.path.join(work_dir, f'{name}.mp4'),
+                '--segments-json', json.dumps(segments),
+            ]
+            if legacy:
+                child_args.append('--legacy')
+            results[name] = run_child(child_args)
+        mute = bench_mute_filter(ffmpeg_path, source, args.duration, segments)
+
+    report = {
+        'benchmark': 'audio-pass',
+        'duration_seconds': args.duration,
+        'height': args.height,
+        'segments': len(segments),
+        'results': results,
+        'mute_filter': mute,
+        'seconds_saved': round(results['legacy_audio']['seconds'] - results['single_pass']['seconds'], 2),
+    }
+    if results['single_pass']['seconds']:
+        report['speedup'] = round(results['legacy_audio']['seconds'] / results['single_pass']['seconds'], 2)
+    print(json.dumps(report, indent=2))
+
+
+def default_worker_counts():
+    """1, 2, 4, ... up to the number of cores (always including the core count)"""
+    cpu_count = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cpu_count:
+        counts.append(n)
+        n *= 2
+    counts.append(cpu_count)
+    return counts
+
+
+def bench_chunked(args):
+    """Measure how the parallel chunked encoder scales with the worker count"""
+    import hashbrown_engine
+
+    ffmpeg_path = hashbrown_engine.find_ffmpeg()
+    segments = spread_segments(args.duration, args.segments)
+    if args.workers:
+        worker_counts = [int(n) for n in args.workers.split(',')]
+    else:
+        worker_counts = default_worker_counts()
+
+    with tempfile.TemporaryDirectory(prefix='hashbrown-bench-') as work_dir:
+        source = os.path.join(work_dir, 'source.mp4')
+        make_synthetic_video(ffmpeg_path, source, args.duration, args.height)
+
+        common = ['--input', source, '--segments-json', json.dumps(segments)]
+        results = {'full': run_child(common + ['--output', os.path.join(work_dir, 'full.mp4')])}
+        for workers in worker_counts:
+            results[f'chunked_{workers}'] = run_child(common + [
+                '--output', os.path.join(work_dir, f'chunked_{workers}.mp4'),
+                '--mode', 'chunked',
+                '--workers', str(workers),
+                '--chunk-seconds', str(args.chunk_seconds),
+            ])
+
+    baseline = results['full']['seconds']
+    for result in results.values():
+        result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] else None
+
+    report = {
+        'benchmark': 'chunked',
+        'duration_seconds': args.duration,
+        'height': args.height,
+        'segments': len(segments),
+        'chunk_seconds': args.chunk_seconds,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+
+
+def _csv(text, convert=str):
+    return [convert(item.strip()) for item in text.split(',') if item.strip()]
+
+
+def _case_key(case):
+    return (case['resolution'], case['minutes'], case['segments'], case['mode'])
+
+
+def compare_to_baseline(results, baseline_path, tolerance):
+    """Annotate results with their slowdown against a previous report and list the regressions"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {_case_key(case): case for case in json.load(f)['results']}
+    regressions = []
+    for case in results:
+        before = baseline.get(_case_key(case))
+        if not before or not before.get('seconds') or not case.get('seconds'):
+            continue
+        case['baseline_seconds'] = before['seconds']
+        case['slowdown'] = round(case['seconds'] / before['seconds'], 2)
+        if case['slowdown'] > 1 + tolerance:
+            regressions.append(f"{case['mode']} {case['resolution']} {case['minutes']}min "
+                               f"{case['segments']} segments: {case['seconds']}s vs {before['seconds']}s")
+    return regressions
+
+
+def bench_suite(args):
+    """Run every mode over a grid of synthetic inputs and write the results as JSON"""
+    import hashbrown_engine
+
+    if args.full:
+        for name, value in FULL_SUITE.items():
+            setattr(args, name, value)
+    resolutions = _csv(args.resolutions)
+    unknown = [name for name in resolutions if name not in RESOLUTIONS]
+    if unknown:
+        raise SystemExit(f"unknown resolution(s): {', '.join(unknown)} (choose from {', '.join(RESOLUTIONS)})")
+    minutes_list = _csv(args.minutes, float)
+    segment_counts = _csv(args.segments, int)
+    modes = _csv(args.modes) if args.modes else list(hashbrown_engine.MODES)
+
+    ffmpeg_path = hashbrown_engine.find_ffmpeg()
+    results = []
+    with tempfile.TemporaryDirectory(prefix='hashbrown-bench-', dir=args.work_dir) as work_dir:
+        for resolution in resolutions:
+            for minutes in minutes_list:
+                duration = int(minutes * 60)
+                source = os.path.join(work_dir, f'source-{resolution}-{minutes:g}min.mp4')
+                make_synthetic_video(ffmpeg_path, source, duration, RESOLUTIONS[resolution])
+                for count in segment_counts:
+                    segments = spread_segments(duration, count)
+                    for mode in modes:
+                        name = f'{mode}-{resolution}-{minutes:g}min-{count}seg'
+                        output = os.path.join(work_dir, f'{name}.mp4')
+                        case = {'resolution': resolution, 'minutes': minutes, 'segments': count, 'mode': mode}
+                        try:
+                            run = run_child_measured(
+                                ['--input', source, '--output', output, '--mode', mode,
+                                 '--segments-json', json.dumps(segments),
+                                 '--chunk-seconds', str(args.chunk_seconds)],
+                                os.path.join(work_dir, 'tmp', name),
+                                os.path.join(work_dir, 'cache', name),
+                            )
+                        except subprocess.CalledProcessError as e:
+                            # One failing combination (say smart mode at 4K) shouldn't end the suite
+                            case['error'] = (e.stderr or b'').decode(errors='replace').strip()[-500:]
+                            results.append(case)
+                            print(json.dumps(case), file=sys.stderr)
+                            continue
+                        case.update(run)
+                        case['realtime_factor'] = round(duration / run['seconds'], 2) if run['seconds'] else None
+                        case['output_mb'] = round(os.path.getsize(output) / (1024 * 1024), 1)
+                        os.remove(output)
+                        results.append(case)
+                        print(json.dumps(case), file=sys.stderr)
+                os.remove(source)
+
+    report = {
+        'benchmark': 'suite',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    failures = [f"{case['mode']} {case['resolution']} {case['minutes']}min {case['segments']} segments "
+                f"failed" for case in results if 'error' in case]
+    if args.baseline:
+        failures += compare_to_baseline(results, args.baseline, args.tolerance)
+    report['regressions'] = failures
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    return 1 if failures else 0
+
+
+def run_startup_one(args):
+    """Import the GUI and open its window in this process, then print the timings as JSON"""
+    started = time.perf_counter()
+    import Hashbrown
+    imported = time.perf_counter()
+    result = {
+        'import_seconds': round(imported - started, 3),
+        'heavy_modules': sorted(name for name in HEAVY_MODULES if name in sys.modules),
+        'first_frame_seconds': None,
+    }
+    if not args.no_window:
+        try:
+            app = Hashbrown.HashbrownApp()
+            app.update()
+            app.wait_visibility()
+            result['first_frame_seconds'] = round(time.perf_counter() - started, 3)
+            app.destroy()
+        except Exception as e:  # No display (CI, SSH): the import numbers still count
+            result['window_error'] = str(e)
+    print(json.dumps(result))
+
+
+def bench_startup(args):
+    """Measure GUI import time and time until the window is first painted"""
+    runs = []
+    for _ in range(args.runs):
+        child_args = ['--no-window'] if args.no_window else []
+        cmd = [sys.executable, os.path.abspath(__file__), '_startup-one'] + child_args
+        started = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        # Includes interpreter start-up, which is what the user actually waits for
+        run['process_seconds'] = round(time.perf_counter() - started, 3)
+        runs.append(run)
+
+    def median(key):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        return round(statistics.median(values), 3) if values else None
+
+    heavy = sorted({name for run in runs for name in run['heavy_modules']})
+    report = {
+        'benchmark': 'startup',
+        'runs': args.runs,
+        'median_import_seconds': median('import_seconds'),
+        'median_first_frame_seconds': median('first_frame_seconds'),
+        'median_process_seconds': median('process_seconds'),
+        'heavy_modules_at_startup': heavy,
+        'results': runs,
+    }
+    failures = []
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if args.max_import_seconds and report['median_import_seconds'] > args.max_import_seconds:
+        failures.append(f"median import time {report['median_import_seconds']}s "
+                        f"exceeds {args.max_import_seconds}s")
+    report['regressions'] = failures
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hashbrown performance benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    audio_pass = subparsers.add_parser('audio-pass', help="single-pass vs Python PCM audio mute, and mute throughput")
+    audio_pass.add_argument('--duration', type=int, default=300, help="synthetic video length in seconds")
+    audio_pass.add_argument('--height', type=int, default=720, help="synthetic video height in pixels")
+    audio_pass.add_argument('--segments', type=int, default=5, help="number of redacted segments")
+    audio_pass.set_defaults(func=bench_audio_pass)
+
+    chunked = subparsers.add_parser('chunked', help="parallel chunked encode scaling with core count")
+    chunked.add_argument('--duration', type=int, default=600, help="synthetic video length in seconds")
+    chunked.add_argument('--height', type=int, default=1080, help="synthetic video height in pixels")
+    chunked.add_argument('--segments', type=int, default=5, help="number of redacted segments")
+    chunked.add_argument('--chunk-seconds', type=float, default=30, help="target chunk length")
+    chunked.add_argument('--workers', help="comma-separated worker counts (default: 1,2,4,... cores)")
+    chunked.set_defaults(func=bench_chunked)
+
+    startup = subparsers.add_parser('startup', help="GUI import time and time to first window paint")
+    startup.add_argument('--runs', type=int, default=5, help="number of cold starts to measure")
+    startup.add_argument('--max-import-seconds', type=float,
+                         help="exit with status 1 if the median import time is above this")
+    startup.add_argument('--no-window', action='store_true', help="only measure the imports (no display needed)")
+    startup.set_defaults(func=bench_startup)
+
+    suite = subparsers.add_parser('suite', help="every mode over a grid of resolutions, lengths and segment counts")
+    suite.add_argument('--full', action='store_true',
+                       help="run the whole grid: 480p/1080p/4k, 1-120 minutes, 1-1000 segments")
+    suite.add_argument('--resolutions', default='480p,1080p', help="comma-separated, from " + ', '.join(RESOLUTIONS))
+    suite.add_argument('--minutes', default='1', help="comma-separated synthetic video lengths in minutes")
+    suite.add_argument('--segments', default='1,100', help="comma-separated numbers of redacted segments")
+    suite.add_argument('--modes', help="comma-separated processing modes (default: all)")
+    suite.add_argument('--chunk-seconds', type=float, default=60, help="chunk length for chunked mode")
+    suite.add_argument('--work-dir', help="where to put the synthetic videos and outputs (default: system temp)")
+    suite.add_argument('--output', help="also write the JSON report to this file")
+    suite.add_argument('--baseline', help="report of a previous run to compare against")
+    suite.add_argument('--tolerance', type=float, default=0.15,
+                       help="allowed slowdown against the baseline before a run counts as a regression")
+    suite.set_defaults(func=bench_suite)
+
+    # Internal: a single measured run, executed in a child process
+    one = subparsers.add_parser('_run-one')
+    one.add_argument('--input', required=True)
+    one.add_argument('--output', required=True)
+    one.add_argument('--segments-json', required=True)
+    one.add_argument('--legacy', action='store_true')
+    one.add_argument('--mode', default='full')
+    one.add_argument('--workers', type=int)
+    one.add_argument('--chunk-seconds', type=float, default=60)
+    one.set_defaults(func=run_one)
+
+    one_startup = subparsers.add_parser('_startup-one')
+    one_startup.add_argument('--no-window', action='store_true')
+    one_startup.set_defaults(func=run_startup_one)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
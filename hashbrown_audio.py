@@ -0,0 +1,155 @@
+"""Per-track plans for muting audio while keeping the source codec.
+
+Every audio track of the source is kept, in its own codec, and as much of
+it as possible is left bit-for-bit untouched:
+
+- Lossless tracks (PCM, FLAC, ALAC...) are decoded, muted and encoded
+  again in the same codec and sample format. Outside the segments the
+  samples come out identical, so nothing is lost.
+- Lossy tracks whose frames can be cut apart (AAC, AC-3, E-AC-3, Opus)
+  are spliced: packets away from the segments are stream-copied,
+  and only a short span around each segment, from the packet before it to
+  a little after it, is decoded, muted and re-encoded in the source codec
+  at the source bitrate.
+- Anything else is re-encoded whole with the mute, in the source codec if
+  ffmpeg can write it and as AAC otherwise. That includes MP3, whose
+  frames borrow bits from earlier ones (the bit reservoir), so a copied
+  piece starting at a cut would decode with a glitch.
+
+This module only plans; the ffmpeg work is done in hashbrown_engine.
+"""
+import bisect
+
+from hashbrown_segments import merge_segments
+
+# Spliceable codecs: the ffmpeg encoder, its samples per packet and the priming
+# samples it puts in front of the audio
+SPLICE_CODECS = {
+    'aac': ('aac', 1024, 1024),
+    'ac3': ('ac3', 1536, 256),
+    'eac3': ('eac3', 1536, 256),
+    'opus': ('libopus', 960, 312),
+}
+# Opus always runs at 48 kHz, whatever rate it was fed
+OPUS_SAMPLE_RATE = 48000
+LOSSLESS_CODECS = ('flac', 'alac', 'wavpack', 'tta')
+# Encoders for re-encoding a whole track in its own codec
+REENCODE_ENCODERS = {
+    'aac': 'aac', 'ac3': 'ac3', 'eac3': 'eac3', 'mp2': 'mp2', 'mp3': 'libmp3lame',
+    'opus': 'libopus', 'vorbis': 'libvorbis', 'wmav1': 'wmav1', 'wmav2': 'wmav2',
+}
+DEFAULT_AUDIO_BITRATE = 192000
+# Original audio re-encoded after each segment, so the seam back to copied packets is smooth
+SPLICE_PAD_SECONDS = 0.1
+# Copied stretches shorter than this are re-encoded instead of becoming a piece of their own
+MIN_COPY_SECONDS = 1.0
+# Beyond this many spliced spans the splitting costs more than one re-encode of the track
+MAX_SPLICE_SPANS = 200
+INTEGER_SAMPLE_FMTS = ('u8', 's16', 's32', 'u8p', 's16p', 's32p')
+
+
+def is_lossless(codec_name):
+    return bool(codec_name) and (codec_name.startswith('pcm_') or codec_name in LOSSLESS_CODECS)
+
+
+def mute_precision(stream):
+    """'fixed' when the track's samples are integers, so the volume filter doesn't convert them to float"""
+    codec_name = stream.get('codec_name') or ''
+    if stream.get('sample_fmt') in INTEGER_SAMPLE_FMTS:
+        return 'fixed'
+    if codec_name.startswith(('pcm_s', 'pcm_u')) and not codec_name.startswith('pcm_s64'):
+        return 'fixed'
+    return None
+
+
+def _bitrate_options(stream):
+    return [('b', str(stream.get('bit_rate') or DEFAULT_AUDIO_BITRATE))]
+
+
+def _format_options(stream):
+    options = []
+    if stream.get('sample_rate'):
+        options.append(('ar', str(stream['sample_rate'])))
+    if stream.get('channels'):
+        options.append(('ac', str(stream['channels'])))
+    return options
+
+
+def plan_track(track, stream, available_encoders=None):
+    """How to mute one audio track: a dict with 'track', 'method' and the encoder options.
+
+    method is 'lossless', 'splice' (with the 'encoder', its 'sample_rate',
+    and 'frame' and 'delay' in samples) or 'reencode'. options are (name, value) pairs that become -name:a:N value.
+    available_encoders, if given, limits which encoders may be used.
+    """
+    codec_name = stream.get('codec_name')
+
+    def usable(encoder):
+        return available_encoders is None or encoder in available_encoders
+
+    if is_lossless(codec_name) and usable(codec_name):
+        options = [('c', codec_name)]
+        if stream.get('sample_fmt'):
+            options.append(('sample_fmt', stream['sample_fmt']))
+        if codec_name in ('flac', 'alac') and stream.get('bits_per_raw_sample'):
+            # 24-bit FLAC decodes to s32; without this it would come back as 32-bit
+            options.append(('bits_per_raw_sample', str(stream['bits_per_raw_sample'])))
+        return {'track': track, 'method': 'lossless', 'options': options, 'precision': mute_precision(stream)}
+
+    sample_rate = OPUS_SAMPLE_RATE if codec_name == 'opus' else stream.get('sample_rate')
+    if codec_name in SPLICE_CODECS and sample_rate and usable(SPLICE_CODECS[codec_name][0]):
+        encoder, frame, delay = SPLICE_CODECS[codec_name]
+        return {'track': track, 'method': 'splice', 'encoder': encoder, 'sample_rate': sample_rate,
+                'frame': frame, 'delay': delay,
+                'options': [('c', encoder)] + _bitrate_options(stream) + _format_options(stream),
+                'precision': None}
+
+    encoder = REENCODE_ENCODERS.get(codec_name)
+    if encoder is None or not usable(encoder):
+        encoder = 'aac'
+    return {'track': track, 'method': 'reencode',
+            'options': [('c', encoder)] + _bitrate_options(stream) + _format_options(stream),
+            'precision': None}
+
+
+def stream_options(options, output_index):
+    """(name, value) pairs as ffmpeg arguments for the output_index-th audio stream"""
+    args = []
+    for name, value in options:
+        args.extend([f'-{name}:a:{output_index}', value])
+    return args
+
+
+def splice_lead(plan):
+    """Encoded packets to drop from the front of a re-encoded piece, and the samples to feed before it.
+
+    The encoder's first packets hold its priming. Feeding `lead` samples of
+    the source from before the piece makes packet `drop` start exactly on
+    the piece, so dropping the packets in front of it removes the priming
+    without shifting the audio.
+    """
+    drop = -(-plan['delay'] // plan['frame'])
+    return drop, drop * plan['frame'] - plan['delay']
+
+
+def splice_spans(packets, segments, pad=SPLICE_PAD_SECONDS):
+    """Packet-aligned (start, end) spans to re-encode so that every segment is covered.
+
+    A span starts at the packet the segment starts in and ends on the first
+    packet boundary `pad` seconds after the segment; the last span may end
+    at infinity. Spans closer together than MIN_COPY_SECONDS are joined.
+    """
+    if not packets:
+        return []
+    spans = []
+    for start, end in merge_segments(segments):
+        first = max(bisect.bisect_right(packets, start) - 1, 0)
+        last = bisect.bisect_left(packets, end + pad)
+        spans.append((packets[first], packets[last] if last < len(packets) else float('inf')))
+    joined = []
+    for start, end in spans:
+        if joined and start - joined[-1][1] < MIN_COPY_SECONDS:
+            joined[-1] = (joined[-1][0], max(joined[-1][1], end))
+        else:
+            joined.append((start, end))
+    return joined
@@ -0,0 +1,48 @@
+"""On-disk cache location and JSON helpers shared by Hashbrown's caches."""
+import json
+import os
+import sys
+import tempfile
+
+# Set HASHBROWN_CACHE_DIR to keep the caches somewhere else (e.g. a fast local disk)
+CACHE_DIR_ENV = 'HASHBROWN_CACHE_DIR'
+
+
+def cache_dir(*parts):
+    """Return (and create) a directory inside the per-user Hashbrown cache"""
+    base = os.environ.get(CACHE_DIR_ENV)
+    if not base:
+        if sys.platform == 'win32':
+            root = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+            base = os.path.join(root, 'Hashbrown', 'cache')
+        elif sys.platform == 'darwin':
+            base = os.path.expanduser('~/Library/Caches/Hashbrown')
+        else:
+            root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+            base = os.path.join(root, 'hashbrown')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def load_json(path, default=None):
+    """Read a JSON cache file, returning default if it is missing or corrupt"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """Write a JSON cache file atomically so concurrent readers never see half a file"""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,384 @@
+"""Cached probe of which encoders actually work with a given ffmpeg.
+
+Checking for hardware encoders means a trial encode per encoder, which takes
+seconds. The result only changes when ffmpeg or the GPU driver changes, so
+it is stored on disk and keyed by the ffmpeg binary (path, size, mtime) and
+a driver signature. Run `python hashbrown_cli.py --clear-encoder-cache`
+after changing hardware to force a new probe.
+
+The same probe checks hardware decoding (CUDA, QSV, VAAPI) for each GPU
+family with a working encoder, and whether the icon can be overlaid on the
+GPU (overlay_cuda, overlay_vaapi), so frames go from the decoder to the
+encoder without a round trip through system memory. Where that fails, or
+for sources the GPU filters can't take, the job runs the software overlay.
+"""
+import glob
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from hashbrown_cache import cache_dir, load_json, save_json
+from hashbrown_profiles import DEFAULT_PROFILE, profile_args
+
+# Set HASHBROWN_ENCODER to force a specific encoder (if it works)
+ENCODER_ENV = 'HASHBROWN_ENCODER'
+VAAPI_DEVICE_ENV = 'HASHBROWN_VAAPI_DEVICE'
+DEFAULT_VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Encoders Hashbrown knows how to drive, fastest first within each codec.
+# Their quality settings come from the encoding profile (see hashbrown_profiles).
+ENCODERS = {
+    'h264_nvenc': {'codec': 'h264', 'family': 'nvenc'},
+    'h264_qsv': {'codec': 'h264', 'family': 'qsv'},
+    'h264_amf': {'codec': 'h264', 'family': 'amf'},
+    'h264_vaapi': {'codec': 'h264', 'family': 'vaapi'},
+    'libx264': {'codec': 'h264', 'family': 'software'},
+
+    'hevc_nvenc': {'codec': 'hevc', 'family': 'nvenc'},
+    'hevc_qsv': {'codec': 'hevc', 'family': 'qsv'},
+    'hevc_amf': {'codec': 'hevc', 'family': 'amf'},
+    'hevc_vaapi': {'codec': 'hevc', 'family': 'vaapi'},
+    'libx265': {'codec': 'hevc', 'family': 'software'},
+
+    'av1_nvenc': {'codec': 'av1', 'family': 'nvenc'},
+    'av1_qsv': {'codec': 'av1', 'family': 'qsv'},
+    'av1_vaapi': {'codec': 'av1', 'family': 'vaapi'},
+    'libsvtav1': {'codec': 'av1', 'family': 'software'},
+}
+
+# Set HASHBROWN_HWACCEL to 'decode' to keep the overlay on the CPU, or to 'off' to decode there too
+HWACCEL_ENV = 'HASHBROWN_HWACCEL'
+HWACCEL_MODES = ('auto', 'decode', 'off')
+
+# Hardware decoders, tried with the encoders of the same family. 'overlay' is
+# the GPU overlay filter (None: decoded frames are overlaid on the CPU), and
+# 'icon_format' the pixel format the icon is uploaded in.
+HWACCELS = {
+    'cuda': {'family': 'nvenc', 'overlay': 'overlay_cuda', 'icon_format': 'yuva420p'},
+    'qsv': {'family': 'qsv', 'overlay': None, 'icon_format': None},
+    'vaapi': {'family': 'vaapi', 'overlay': 'overlay_vaapi', 'icon_format': 'rgba'},
+}
+# Source pixel formats the GPU overlay filters accept as the main picture
+GPU_OVERLAY_PIX_FMTS = ('yuv420p', 'yuvj420p', 'nv12')
+# Name of the hardware device the decoder and the filters share
+HW_DEVICE_NAME = 'hb'
+
+# Seconds allowed for one trial encode before the encoder counts as broken
+PROBE_TIMEOUT = 10
+
+_probe_lock = threading.Lock()
+_memo = {}
+
+
+def _cache_path():
+    return os.path.join(cache_dir(), 'encoders.json')
+
+
+def vaapi_device():
+    return os.environ.get(VAAPI_DEVICE_ENV, DEFAULT_VAAPI_DEVICE)
+
+
+def hwaccel_mode():
+    """'auto', 'decode' or 'off', from HASHBROWN_HWACCEL"""
+    mode = (os.environ.get(HWACCEL_ENV) or 'auto').lower()
+    return mode if mode in HWACCEL_MODES else 'auto'
+
+
+def _hw_device_args(hwaccel):
+    if hwaccel == 'vaapi':
+        return ['-init_hw_device', f'vaapi={HW_DEVICE_NAME}:{vaapi_device()}']
+    return ['-init_hw_device', f'{hwaccel}={HW_DEVICE_NAME}']
+
+
+def encoder_input_args(name, hwaccel=None):
+    """Options that must come right before the video input (device setup, hardware decoding).
+
+    hwaccel (from select_hwaccel) decodes the video on the GPU; with its
+    'gpu_overlay' set the frames stay there for gpu_overlay_filter().
+    """
+    if hwaccel is not None:
+        args = _hw_device_args(hwaccel['name'])
+        args += ['-filter_hw_device', HW_DEVICE_NAME,
+                 '-hwaccel', hwaccel['name'], '-hwaccel_device', HW_DEVICE_NAME]
+        if hwaccel['gpu_overlay']:
+            args += ['-hwaccel_output_format', hwaccel['name']]
+        return args
+    if ENCODERS.get(name, {}).get('family') == 'vaapi':
+        return ['-vaapi_device', vaapi_device()]
+    return []
+
+
+def encoder_filter(name, hwaccel=None):
+    """Filter to append to the video chain so frames reach the encoder, or None"""
+    if hwaccel is not None and hwaccel['gpu_overlay']:
+        return None  # Already in GPU memory, where the encoder reads them
+    if ENCODERS.get(name, {}).get('family') == 'vaapi':
+        return 'format=nv12,hwupload'
+    return None
+
+
+def gpu_overlay_filter(hwaccel, main, icon, enable):
+    """Filter chain that uploads the icon and overlays it on the GPU-resident main picture"""
+    accel = HWACCELS[hwaccel]
+    return (f"{icon}format={accel['icon_format']},hwupload[icon];"
+            f"{main}[icon]{accel['overlay']}=x=0:y=0:enable='{enable}'")
+
+
+def encoder_output_args(name, profile=DEFAULT_PROFILE, info=None, threads=None, match_source=False):
+    """-c:v plus the encoder settings of the profile, matched to the probed source info"""
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        return ['-c:v', name]
+    return ['-c:v', name] + profile_args(name, encoder['family'], encoder['codec'], profile, info, threads,
+                                         match_source)
+
+
+def is_hardware_encoder(name):
+    return ENCODERS.get(name, {}).get('family', 'software') != 'software'
+
+
+def _ffmpeg_identity(ffmpeg_path):
+    """Path, size and mtime of the ffmpeg binary, or None if it can't be found"""
+    resolved = ffmpeg_path if os.path.isfile(ffmpeg_path) else shutil.which(ffmpeg_path)
+    if not resolved:
+        return None
+    resolved = os.path.realpath(resolved)
+    stat = os.stat(resolved)
+    return f"{resolved}|{stat.st_size}|{int(stat.st_mtime)}"
+
+
+def driver_signature():
+    """Cheap fingerprint of the OS and GPU drivers, so driver updates trigger a re-probe"""
+    parts = [platform.system(), platform.release()]
+    nvidia_proc = '/proc/driver/nvidia/version'
+    if os.path.exists(nvidia_proc):
+        try:
+            with open(nvidia_proc, encoding='utf-8', errors='replace') as f:
+                parts.append(f.readline().strip())
+        except OSError:
+            pass
+    elif shutil.which('nvidia-smi'):
+        try:
+            result = subprocess.run(
+                ['nvidia-smi', '--query-gpu=name,driver_version', '--format=csv,noheader'],
+                capture_output=True, text=True, timeout=5)
+            parts.append(result.stdout.strip())
+        except (OSError, subprocess.SubprocessError):
+            pass
+    parts.extend(sorted(glob.glob('/dev/dri/renderD*')))
+    return '; '.join(part for part in parts if part)
+
+
+def _ffmpeg_version(ffmpeg_path):
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-version'], capture_output=True, text=True)
+        return result.stdout.splitlines()[0] if result.stdout else ''
+    except OSError:
+        return ''
+
+
+def _compiled_names(ffmpeg_path, option, pattern):
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', option], capture_output=True, text=True)
+    except OSError:
+        return set()
+    return set(re.findall(pattern, result.stdout, re.MULTILINE))
+
+
+def _compiled_encoders(ffmpeg_path, kind='V'):
+    """Names of the encoders of one kind ('V'ideo or 'A'udio) built into this ffmpeg"""
+    return _compiled_names(ffmpeg_path, '-encoders', rf'^\s*{kind}\S*\s+(\S+)')
+
+
+def probe_encoder(ffmpeg_path, name):
+    """Run a tiny trial encode; returns (works, seconds)"""
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error']
+    cmd.extend(encoder_input_args(name))
+    cmd.extend(['-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1'])
+    if encoder_filter(name):
+        cmd.extend(['-vf', encoder_filter(name)])
+    cmd.extend(['-c:v', name, '-f', 'null', '-'])
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        works = result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        works = False
+    return works, round(time.perf_counter() - started, 3)
+
+
+def _make_probe_sample(ffmpeg_path, directory, compiled):
+    """A short clip for the decode trials, in a codec every GPU decodes; None if it can't be written"""
+    path = os.path.join(directory, 'sample.mkv')
+    encoder = 'libx264' if 'libx264' in compiled else 'mpeg2video'
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+           '-i', 'color=black:s=256x256:d=0.2', '-c:v', encoder, '-pix_fmt', 'yuv420p', '-y', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return path if result.returncode == 0 else None
+
+
+def _trial(cmd):
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        works = result.returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        works = False
+    return works, round(time.perf_counter() - started, 3)
+
+
+def probe_hwaccel(ffmpeg_path, hwaccel, sample_path, encoder=None):
+    """Trial-decode sample_path on the GPU; returns (decodes, overlays, seconds).
+
+    The decoded frames must really be in GPU memory (ffmpeg otherwise falls
+    back to software decoding without failing). If encoder is given and the
+    hwaccel has an overlay filter, the whole GPU chain the jobs use is run
+    too: decode, icon upload, overlay and encode.
+    """
+    device = {'name': hwaccel, 'gpu_overlay': True}
+    base = [ffmpeg_path, '-hide_banner', '-loglevel', 'error'] + encoder_input_args(None, device)
+    decodes, seconds = _trial(base + ['-i', sample_path, '-vf', 'hwdownload,format=nv12', '-f', 'null', '-'])
+    overlays = False
+    if decodes and encoder and HWACCELS[hwaccel]['overlay']:
+        overlay = gpu_overlay_filter(hwaccel, '[0:v]', '[1:v]', 'between(t,0,0.1)')
+        overlays, overlay_seconds = _trial(
+            base + ['-i', sample_path, '-f', 'lavfi', '-i', 'color=white@0.5:s=32x32:d=0.2,format=rgba',
+                    '-filter_complex', overlay + '[outv]', '-map', '[outv]', '-c:v', encoder, '-f', 'null', '-'])
+        seconds += overlay_seconds
+    return decodes, overlays, seconds
+
+
+def _probe_hwaccels(ffmpeg_path, compiled, encoders):
+    """Decode and overlay trial results per hwaccel, for the families that have a working encoder"""
+    compiled_hwaccels = _compiled_names(ffmpeg_path, '-hwaccels', r'^(\w+)\s*$')
+    compiled_filters = _compiled_names(ffmpeg_path, '-filters', r'^\s*\S+\s+(\w+)\s')
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='hashbrown-probe-') as directory:
+        sample_path = None
+        for name, accel in HWACCELS.items():
+            family_encoders = [encoder for encoder, info in ENCODERS.items()
+                               if info['family'] == accel['family'] and encoders[encoder]['works']]
+            result = {'compiled': name in compiled_hwaccels, 'decode': False, 'overlay': False, 'probe_seconds': 0.0}
+            if result['compiled'] and family_encoders:
+                sample_path = sample_path or _make_probe_sample(ffmpeg_path, directory, compiled)
+                if sample_path:
+                    overlay_encoder = family_encoders[0] if accel['overlay'] in compiled_filters else None
+                    result['decode'], result['overlay'], result['probe_seconds'] = probe_hwaccel(
+                        ffmpeg_path, name, sample_path, overlay_encoder)
+            results[name] = result
+    return results
+
+
+def get_encoder_capabilities(ffmpeg_path, refresh=False):
+    """Return the cached capability record for ffmpeg_path, probing on a cache miss.
+
+    The record holds the ffmpeg version, the driver signature, per known
+    encoder whether it is compiled in and whether a trial encode worked,
+    per hardware decoder whether it decodes and overlays on the GPU, and the
+    names of the audio encoders built in.
+    """
+    identity = _ffmpeg_identity(ffmpeg_path) or ffmpeg_path
+
+    with _probe_lock:
+        # Drivers don't change under a running process, and checking them can mean running nvidia-smi
+        if not refresh and identity in _memo:
+            return _memo[identity]
+
+        driver = driver_signature()
+        cache = load_json(_cache_path(), {})
+        record = cache.get(identity)
+        # Records from before the audio encoder list or the hwaccel probe count as stale
+        if (refresh or not record or record.get('driver') != driver
+                or 'audio_encoders' not in record or 'hwaccels' not in record):
+            compiled = _compiled_encoders(ffmpeg_path)
+            encoders = {}
+            for name in ENCODERS:
+                if name in compiled:
+                    works, seconds = probe_encoder(ffmpeg_path, name)
+                    encoders[name] = {'compiled': True, 'works': works, 'probe_seconds': seconds}
+                else:
+                    encoders[name] = {'compiled': False, 'works': False, 'probe_seconds': 0.0}
+            record = {
+                'ffmpeg': identity.split('|')[0],
+                'version': _ffmpeg_version(ffmpeg_path),
+                'driver': driver,
+                'probed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'encoders': encoders,
+                'hwaccels': _probe_hwaccels(ffmpeg_path, compiled, encoders),
+                'audio_encoders': sorted(_compiled_encoders(ffmpeg_path, 'A')),
+            }
+            # Re-read right before writing so probes of other ffmpeg builds aren't lost
+            cache = load_json(_cache_path(), {})
+            cache[identity] = record
+            try:
+                save_json(_cache_path(), cache)
+            except OSError:
+                pass  # A read-only cache only costs us the re-probe next time
+
+        _memo[identity] = record
+        return record
+
+
+def working_encoders(ffmpeg_path, codec=None):
+    """Names of the encoders that passed the trial encode, fastest first"""
+    encoders = get_encoder_capabilities(ffmpeg_path)['encoders']
+    return [name for name, info in ENCODERS.items()
+            if encoders.get(name, {}).get('works') and (codec is None or info['codec'] == codec)]
+
+
+def audio_encoders(ffmpeg_path):
+    """Names of the audio encoders built into this ffmpeg"""
+    return set(get_encoder_capabilities(ffmpeg_path)['audio_encoders'])
+
+
+def select_encoder(ffmpeg_path, codec='h264'):
+    """Pick the fastest working encoder for codec.
+
+    Hardware encoders win over software ones (NVENC, then QSV, AMF and VAAPI).
+    HASHBROWN_ENCODER overrides the choice when that encoder works. Returns
+    None if nothing for this codec works.
+    """
+    candidates = working_encoders(ffmpeg_path, codec)
+    forced = os.environ.get(ENCODER_ENV)
+    if forced and forced in candidates:
+        return forced
+    return candidates[0] if candidates else None
+
+
+def select_hwaccel(ffmpeg_path, encoder, pix_fmt=None, gpu_overlay=True):
+    """How to decode for encoder: None (software), or {'name', 'gpu_overlay'} for a hardware decoder.
+
+    Only a decoder of the encoder's own GPU family is used. The overlay
+    stays on the GPU when its trial passed and the source pixel format is
+    one the GPU overlay filters take; pass gpu_overlay=False when the graph
+    needs filters that only run on the CPU. HASHBROWN_HWACCEL can turn
+    either off.
+    """
+    mode = hwaccel_mode()
+    family = ENCODERS.get(encoder, {}).get('family')
+    if mode == 'off' or family in (None, 'software'):
+        return None
+    hwaccels = get_encoder_capabilities(ffmpeg_path)['hwaccels']
+    for name, accel in HWACCELS.items():
+        if accel['family'] == family and hwaccels.get(name, {}).get('decode'):
+            on_gpu = (gpu_overlay and mode == 'auto' and hwaccels[name]['overlay']
+                      and (pix_fmt is None or pix_fmt in GPU_OVERLAY_PIX_FMTS))
+            return {'name': name, 'gpu_overlay': bool(on_gpu)}
+    return None
+
+
+def clear_encoder_cache():
+    """Forget every cached probe so the next job probes the encoders again"""
+    with _probe_lock:
+        _memo.clear()
+        path = _cache_path()
+        if os.path.exists(path):
+            os.remove(path)
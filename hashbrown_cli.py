@@ -0,0 +1,402 @@
+"""Headless batch front end for Hashbrown.
+
+Usage:
+    python hashbrown_cli.py MANIFEST [MANIFEST ...] [--jobs N] [--mode MODE] [--profile PROFILE]
+                            [--codec CODEC] [--results FILE]
+    python hashbrown_cli.py --probe-encoders        # show (and cache) the working encoders
+    python hashbrown_cli.py --clear-encoder-cache   # re-probe on the next run
+    python hashbrown_cli.py --clear-media-cache     # forget cached durations, keyframes, timelines and icons
+    python hashbrown_cli.py --purge-job-cache       # delete the encoded chunks kept for re-runs
+    python hashbrown_cli.py --propose VIDEO [VIDEO ...] --keywords "smith*, main street" > manifest.json
+
+A manifest lists the videos to redact and their segments, either as JSON:
+
+    [
+        {"input": "interview.mp4", "segments": [["00:01:00", "00:01:30"], [300, 312.5]]},
+        {"input": "bodycam.mp4", "segments": [["1:02:03", "1:02:10"]],
+         "mode": "smart", "profile": "archival", "output": "redacted/bodycam.mp4"},
+        {"input": "lobby.mp4", "segments": [],
+         "regions": [{"start": "00:00:05", "end": "00:00:40", "x": 640, "y": 120, "w": 200, "h": 240,
+                      "style": "pixelate"}]}
+    ]
+
+or as CSV with one row per segment (rows with the same input form one job):
+
+    input,start,end,output,mode,profile
+    interview.mp4,00:01:00,00:01:30,,,
+    interview.mp4,300,312.5,,,draft
+
+Times are seconds or HH:MM:SS. Regions (JSON only) are rectangles in
+pixels of the source picture that are blurred, pixelated or covered by a
+black box ("blur", "pixelate" or "box") between their start and end, in
+the same encode as the mute. Relative paths are resolved against the
+manifest's directory. --propose transcribes the videos offline (see
+hashbrown_speech) and prints a JSON manifest with a segment around every
+spoken keyword, to check and then run. The exit status is 0 if every video was processed,
+1 if any of them failed, 2 if the manifest could not be read and 3 if
+processing was cancelled before every video was done.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from hashbrown_capabilities import (
+    clear_encoder_cache,
+    get_encoder_capabilities,
+    select_encoder,
+    select_hwaccel,
+)
+from hashbrown_icons import clear_icon_cache
+from hashbrown_jobcache import chunk_cache_usage, purge_chunk_cache
+from hashbrown_probe import ProbeError, clear_media_cache, probe_media
+from hashbrown_profiles import DEFAULT_PROFILE, PROFILES, SOFTWARE_ENCODERS
+from hashbrown_queue import BatchScheduler
+from hashbrown_regions import validate_regions
+from hashbrown_speech import SPEECH_MODEL_ENV, SpeechError, parse_keywords, propose_segments
+from hashbrown_timeline import clear_timeline_cache
+from hashbrown_engine import (
+    MODES,
+    RedactionCancelled,
+    RedactionError,
+    default_output_path,
+    find_ffmpeg,
+    format_time,
+    load_env_settings,
+    parse_timestamp,
+    redact_video,
+    validate_segments,
+)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = 3
+
+
+def _resolve(path, base_dir):
+    if not path:
+        return None
+    path = os.path.expanduser(path)
+    return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+
+def _parse_segment(segment):
+    """Accept [start, end], {"start": .., "end": ..} or "start-end" strings"""
+    if isinstance(segment, dict):
+        start, end = segment.get('start'), segment.get('end')
+    elif isinstance(segment, str):
+        start, _, end = segment.partition('-')
+    else:
+        start, end = segment
+    return parse_timestamp(start), parse_timestamp(end)
+
+
+def _parse_region(region):
+    """Accept {"start": .., "end": .., "x": .., "y": .., "w": .., "h": .., "style": ..}"""
+    return dict(region, start=parse_timestamp(region['start']), end=parse_timestamp(region['end']))
+
+
+def load_manifest(path):
+    """Read a JSON or CSV manifest into a list of job dicts.
+
+    Each job has 'input', 'segments', 'regions', 'output' (or None), 'mode'
+    (or None) and 'profile' (or None).
+    Raises RedactionError if the manifest is malformed.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            if path.lower().endswith('.csv'):
+                rows = list(csv.DictReader(f))
+                entries = {}
+                for row in rows:
+                    entry = entries.setdefault(row['input'], {
+                        'input': row['input'],
+                        'segments': [],
+                        'output': row.get('output'),
+                        'mode': row.get('mode'),
+                        'profile': row.get('profile'),
+                    })
+                    entry['segments'].append((row['start'], row['end']))
+                entries = list(entries.values())
+            else:
+                entries = json.load(f)
+                if isinstance(entries, dict):
+                    entries = entries.get('jobs', [])
+    except (OSError, ValueError, KeyError) as e:
+        raise RedactionError(f"Could not read manifest {path}: {e}")
+
+    jobs = []
+    for i, entry in enumerate(entries):
+        try:
+            segments = [_parse_segment(segment) for segment in entry.get('segments') or []]
+        except (KeyError, TypeError, ValueError, RedactionError) as e:
+            raise RedactionError(f"{path}: entry {i + 1} has invalid segments ({e})")
+        try:
+            regions = validate_regions([_parse_region(region) for region in entry.get('regions') or []])
+        except (KeyError, TypeError, ValueError, RedactionError) as e:
+            raise RedactionError(f"{path}: entry {i + 1} has invalid regions ({e})")
+        if not entry.get('input') or not (segments or regions):
+            raise RedactionError(f"{path}: entry {i + 1} needs an input and at least one segment or region")
+        mode = entry.get('mode') or None
+        if mode is not None and mode not in MODES:
+            raise RedactionError(f"{path}: entry {i + 1} has unknown mode {mode!r}")
+        profile = entry.get('profile') or None
+        if profile is not None and profile not in PROFILES:
+            raise RedactionError(f"{path}: entry {i + 1} has unknown profile {profile!r}")
+        jobs.append({
+            'input': _resolve(entry['input'], base_dir),
+            'segments': segments,
+            'regions': regions,
+            'output': _resolve(entry.get('output'), base_dir),
+            'mode': mode,
+            'profile': profile,
+        })
+    return jobs
+
+
+def run_job(job, ffmpeg_path, settings, control=None):
+    """Redact a single manifest entry and return its result record"""
+    started = time.perf_counter()
+    result = {'input': job['input'], 'output': None, 'ok': False, 'cancelled': False, 'error': None}
+    try:
+        if not os.path.isfile(job['input']):
+            raise RedactionError(f"Input not found: {job['input']}")
+        try:
+            duration = probe_media(ffmpeg_path, job['input'])['duration']
+        except ProbeError as e:
+            raise RedactionError(str(e))
+        segments = validate_segments(job['segments'], duration)
+
+        output_path = job['output']
+        if output_path is None and settings['output_dir']:
+            output_path = os.path.join(settings['output_dir'], os.path.basename(default_output_path(job['input'])))
+        if output_path:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        result['output'] = redact_video(
+            job['input'], segments, output_path, ffmpeg_path,
+            legacy_audio=settings['legacy_audio'],
+            mode=job['mode'] or settings['mode'],
+            workers=settings['workers'],
+            chunk_seconds=settings['chunk_seconds'],
+            control=control,
+            profile=job.get('profile') or settings['profile'],
+            codec=settings['codec'],
+            regions=job.get('regions'),
+        )
+        result['ok'] = True
+    except RedactionCancelled:
+        raise  # The scheduler reports the job as cancelled rather than failed
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def run_batch(jobs, ffmpeg_path, settings, max_jobs=1, on_result=None):
+    """Process the jobs with at most max_jobs videos encoding at the same time.
+
+    The next videos are probed while earlier ones encode (see BatchScheduler).
+    Results are returned in manifest order; on_result is called with each one
+    as soon as it finishes. Ctrl-C cancels the batch; the jobs that had not
+    finished by then are returned as cancelled.
+    """
+    jobs = [dict(job, mode=job['mode'] or settings['mode'], codec=settings['codec']) for job in jobs]
+    positions = {id(job): i for i, job in enumerate(jobs)}
+    results = [None] * len(jobs)
+
+    def unfinished(job, cancelled, error=None):
+        return {'input': job['input'], 'output': None, 'ok': False, 'cancelled': cancelled,
+                'error': error or "Processing was cancelled.", 'seconds': 0.0}
+
+    def on_event(job, event, payload):
+        if event not in ('done', 'failed', 'cancelled'):
+            return
+        result = payload if event == 'done' else unfinished(job, event == 'cancelled', payload)
+        results[positions[id(job)]] = result
+        if on_result:
+            on_result(result)
+
+    scheduler = BatchScheduler(ffmpeg_path, lambda job, control: run_job(job, ffmpeg_path, settings, control),
+                               max_jobs=max_jobs, workers=settings['workers'], on_event=on_event)
+    try:
+        scheduler.run(jobs)
+    except KeyboardInterrupt:
+        # Ctrl-C: stop the running encodes and let the workers report what they had finished
+        scheduler.cancel()
+        scheduler.wait()
+        for i, job in enumerate(jobs):
+            if results[i] is None:
+                results[i] = unfinished(job, True)
+    return results
+
+
+def _print_result(result):
+    if result['ok']:
+        print(f"OK    {result['input']} -> {result['output']} ({result['seconds']}s)", flush=True)
+    elif result['cancelled']:
+        print(f"CANCEL {result['input']}", file=sys.stderr, flush=True)
+    else:
+        print(f"FAIL  {result['input']}: {result['error']}", file=sys.stderr, flush=True)
+
+
+def propose_manifest(videos, keywords, ffmpeg_path, model_path=None, workers=None):
+    """Manifest entries with a segment around every keyword spoken in each video.
+
+    Videos without any keyword are left out; failures are printed and make
+    the second return value False.
+    """
+    entries = []
+    ok = True
+    for video in videos:
+        try:
+            segments = propose_segments(ffmpeg_path, video, keywords, model_path, workers=workers)
+        except (SpeechError, ProbeError, OSError) as e:
+            print(f"FAIL  {video}: {e}", file=sys.stderr, flush=True)
+            ok = False
+            continue
+        print(f"{len(segments):>5} segment(s) proposed for {video}", file=sys.stderr, flush=True)
+        if segments:
+            entries.append({
+                'input': os.path.abspath(video),
+                'segments': [[format_time(start, millis=True), format_time(end, millis=True)]
+                             for start, end in segments],
+            })
+    return entries, ok
+
+
+def print_encoder_capabilities(ffmpeg_path):
+    """Probe (or read the cached probe of) the encoders and print a summary"""
+    record = get_encoder_capabilities(ffmpeg_path)
+    print(f"ffmpeg:  {record['ffmpeg']}")
+    print(f"version: {record['version']}")
+    print(f"driver:  {record['driver']}")
+    print(f"probed:  {record['probed_at']}")
+    for name, info in record['encoders'].items():
+        if info['works']:
+            state = "works"
+        elif info['compiled']:
+            state = "compiled in, but failed the trial encode"
+        else:
+            state = "not compiled in"
+        print(f"  {name:<12} {state}")
+    for name, info in record['hwaccels'].items():
+        if info['overlay']:
+            state = "decodes and overlays on the GPU"
+        elif info['decode']:
+            state = "decodes on the GPU, overlays on the CPU"
+        elif info['compiled']:
+            state = "compiled in, but not usable here"
+        else:
+            state = "not compiled in"
+        print(f"  {name + ' decode':<12} {state}")
+    for codec in ('h264', 'hevc', 'av1'):
+        encoder = select_encoder(ffmpeg_path, codec)
+        hwaccel = select_hwaccel(ffmpeg_path, encoder) if encoder else None
+        decode = f" ({hwaccel['name']} decode{', GPU overlay' if hwaccel['gpu_overlay'] else ''})" if hwaccel else ''
+        print(f"selected {codec}: {encoder or 'none'}{decode}")
+
+
+def main(argv=None):
+    env = load_env_settings()
+    parser = argparse.ArgumentParser(
+        prog='hashbrown',
+        description="Redact videos listed in one or more manifests without the GUI.")
+    parser.add_argument('manifests', nargs='*', help="JSON or CSV manifest(s) of files and segments")
+    parser.add_argument('-j', '--jobs', type=int, default=2,
+                        help="number of videos processed at the same time (default: 2)")
+    parser.add_argument('--mode', choices=MODES, default='full',
+                        help="processing mode for entries that don't set one (default: full)")
+    parser.add_argument('--profile', choices=list(PROFILES), default=env['profile'] or DEFAULT_PROFILE,
+                        help="encoding profile for entries that don't set one: draft is fastest, "
+                             f"archival keeps the most quality (default: {DEFAULT_PROFILE})")
+    parser.add_argument('--codec', choices=list(SOFTWARE_ENCODERS), default=env['codec'] or 'h264',
+                        help="output video codec (default: h264; smart mode keeps the source codec)")
+    parser.add_argument('--output-dir', help="write outputs here instead of next to each input")
+    parser.add_argument('--results', help="also write the per-file results to this JSON file")
+    parser.add_argument('--ffmpeg', help="ffmpeg executable to use (default: the bundled one)")
+    parser.add_argument('--workers', type=int, default=env['workers'],
+                        help="ffmpeg workers per video in chunked mode (default: all cores)")
+    parser.add_argument('--chunk-seconds', type=float, default=env['chunk_seconds'],
+                        help="chunk length for chunked mode")
+    parser.add_argument('--legacy-audio', action='store_true', default=env['legacy_audio'],
+                        help="mute the audio in Python through a PCM pipe instead of an ffmpeg filter")
+    parser.add_argument('--probe-encoders', action='store_true',
+                        help="show which encoders work with this ffmpeg (uses the cached probe)")
+    parser.add_argument('--clear-encoder-cache', action='store_true',
+                        help="forget the cached encoder probe, e.g. after a driver update")
+    parser.add_argument('--clear-media-cache', action='store_true',
+                        help="forget the cached durations, stream layouts, keyframe indexes, "
+                             "waveforms, thumbnails and scaled mute icons")
+    parser.add_argument('--purge-job-cache', action='store_true',
+                        help="delete the encoded chunks kept so chunked re-runs only redo edited parts, "
+                             "and the journals of unfinished jobs")
+    parser.add_argument('--propose', nargs='+', metavar='VIDEO',
+                        help="transcribe the videos offline and print a manifest with a segment "
+                             "around every keyword (needs vosk and a speech model)")
+    parser.add_argument('--keywords', help="comma-separated words or phrases for --propose; * matches any letters")
+    parser.add_argument('--speech-model', help=f"Vosk model folder for --propose (default: ${SPEECH_MODEL_ENV})")
+    args = parser.parse_args(argv)
+
+    ffmpeg_path = args.ffmpeg or find_ffmpeg()
+    if args.clear_encoder_cache:
+        clear_encoder_cache()
+        print("Encoder cache cleared.")
+    if args.clear_media_cache:
+        clear_media_cache()
+        clear_timeline_cache()
+        clear_icon_cache()
+        print("Media cache cleared.")
+    if args.purge_job_cache:
+        count, _ = chunk_cache_usage()
+        freed = purge_chunk_cache()
+        print(f"Job cache purged ({count} chunks, {freed / (1024 * 1024):.0f} MB freed).")
+    if args.probe_encoders:
+        print_encoder_capabilities(ffmpeg_path)
+    if args.propose:
+        keywords = parse_keywords(args.keywords)
+        if not keywords:
+            parser.error("--propose needs --keywords")
+        entries, ok = propose_manifest(args.propose, keywords, ffmpeg_path, args.speech_model, args.workers)
+        print(json.dumps(entries, indent=2))
+        return EXIT_OK if ok else EXIT_FAILED
+    if not args.manifests:
+        if args.clear_encoder_cache or args.clear_media_cache or args.purge_job_cache or args.probe_encoders:
+            return EXIT_OK
+        parser.error("at least one manifest is required")
+
+    try:
+        jobs = [job for manifest in args.manifests for job in load_manifest(manifest)]
+    except RedactionError as e:
+        print(f"hashbrown: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    settings = {
+        'mode': args.mode,
+        'profile': args.profile,
+        'codec': args.codec,
+        'output_dir': args.output_dir,
+        'workers': args.workers,
+        'chunk_seconds': args.chunk_seconds,
+        'legacy_audio': args.legacy_audio,
+    }
+    results = run_batch(jobs, ffmpeg_path, settings, max_jobs=args.jobs, on_result=_print_result)
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    cancelled = sum(1 for result in results if result['cancelled'])
+    failed = sum(1 for result in results if not result['ok']) - cancelled
+    print(f"{len(results) - failed - cancelled} of {len(results)} videos processed", flush=True)
+    if failed:
+        return EXIT_FAILED
+    return EXIT_CANCELLED if cancelled else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
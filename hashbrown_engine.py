@@ -0,0 +1,1375 @@
+"""GUI-free redaction engine for Hashbrown.
+
+Everything needed to redact a video lives here so it can be used from the Tk
+app, the command line (hashbrown_cli.py) and the benchmarks alike. Nothing in
+this module touches tkinter; failures are raised as RedactionError.
+"""
+import os
+import re
+import csv
+import hashlib
+import bisect
+import shutil
+import tempfile
+import time
+import threading
+import subprocess
+import collections
+import concurrent.futures
+
+from hashbrown_probe import (
+    ProbeError,
+    find_ffmpeg,
+    probe_audio_packets,
+    probe_keyframes,
+    probe_media,
+    to_float,
+)
+from hashbrown_cache import cache_dir
+from hashbrown_icons import scaled_icon
+from hashbrown_jobcache import (
+    JobJournal,
+    chunk_cache_limit,
+    chunk_key,
+    evict_chunks,
+    file_fingerprint,
+    lookup_chunk,
+    reserve_chunk,
+    store_chunk,
+)
+from hashbrown_segments import (
+    enable_expr,
+    merge_segments,
+    sample_ranges,
+    segments_between,
+    snap_segments,
+)
+from hashbrown_audio import (
+    DEFAULT_AUDIO_BITRATE,
+    MAX_SPLICE_SPANS,
+    plan_track,
+    splice_lead,
+    splice_spans,
+    stream_options,
+)
+from hashbrown_capabilities import (
+    ENCODERS,
+    audio_encoders,
+    encoder_filter,
+    encoder_input_args,
+    encoder_output_args,
+    gpu_overlay_filter,
+    is_hardware_encoder,
+    select_encoder,
+    select_hwaccel,
+    working_encoders,
+)
+from hashbrown_profiles import (
+    CODEC_ENV,
+    DEFAULT_PROFILE,
+    PROFILE_ENV,
+    SOFTWARE_ENCODERS,
+    can_match_source,
+    resolve_codec,
+    resolve_profile,
+)
+from hashbrown_regions import region_filter, region_spans, regions_between, validate_regions
+from hashbrown_scratch import SCRATCH_DIR_ENV, free_space_shortfalls, job_scratch_dir
+from hashbrown_trace import begin_span, in_current_trace, job_trace, span, wait_process
+
+
+# Set HASHBROWN_LEGACY_AUDIO=1 to mute the audio in Python through a PCM pipe instead of an ffmpeg filter
+LEGACY_AUDIO_ENV = 'HASHBROWN_LEGACY_AUDIO'
+# Parallel chunked encoding: number of ffmpeg workers and target chunk length
+WORKERS_ENV = 'HASHBROWN_WORKERS'
+CHUNK_SECONDS_ENV = 'HASHBROWN_CHUNK_SECONDS'
+DEFAULT_CHUNK_SECONDS = 60
+# Full re-encodes at least this long are done chunk by chunk so they can resume (0 turns it off)
+CHECKPOINT_SECONDS_ENV = 'HASHBROWN_CHECKPOINT_SECONDS'
+DEFAULT_CHECKPOINT_SECONDS = 600
+
+# Consumer NVIDIA cards only allow a few concurrent NVENC sessions
+NVENC_SESSION_LIMIT = 3
+
+# Cut times are nudged back by this much so a keyframe time that was rounded
+# up when printed still lands in the chunk it starts
+KEYFRAME_EPSILON = 0.001
+
+# Frames (samples of every channel) per PCM block in the Python audio path
+PCM_BLOCK_FRAMES = 65536
+# Lines of ffmpeg stderr kept for error messages
+STDERR_TAIL_LINES = 40
+DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+# Longer filter graphs are passed as script files (Windows caps command lines at 32k characters)
+FILTER_SCRIPT_THRESHOLD = 4000
+FILTER_SCRIPT_OPTIONS = {
+    '-filter_complex': '-filter_complex_script',
+    '-vf': '-filter_script:v',
+    '-af': '-filter_script:a',
+}
+
+# Processing modes accepted by redact_video
+MODES = ('full', 'smart', 'audio', 'chunked')
+
+# Free space estimates: a re-encode can come out larger than its source
+REENCODE_SIZE_FACTOR = 1.5
+LEGACY_AUDIO_BYTES_PER_SECOND = 192000 // 8
+DISK_HEADROOM_BYTES = 256 * 1024 * 1024
+
+
+class RedactionError(Exception):
+    """Raised when a video can't be redacted (bad segments, ffmpeg failure, ...)"""
+
+
+class RedactionCancelled(RedactionError):
+    """Raised when a job is stopped through JobControl.cancel()"""
+
+
+def load_env_settings():
+    """Read the processing settings that can be overridden through the environment"""
+    settings = {
+        # Mute through the Python PCM pipe (mute_audio_stream) if explicitly requested
+        'legacy_audio': os.environ.get(LEGACY_AUDIO_ENV) == '1',
+        'workers': None,
+        'chunk_seconds': DEFAULT_CHUNK_SECONDS,
+        # Encoding profile and output codec; checked when a job starts
+        'profile': os.environ.get(PROFILE_ENV) or None,
+        'codec': os.environ.get(CODEC_ENV) or None,
+    }
+    try:
+        settings['workers'] = int(os.environ.get(WORKERS_ENV, 0)) or None
+    except ValueError:
+        pass
+    try:
+        settings['chunk_seconds'] = float(os.environ.get(CHUNK_SECONDS_ENV, DEFAULT_CHUNK_SECONDS))
+    except ValueError:
+        pass
+    return settings
+
+
+def checkpoint_seconds():
+    """Shortest full re-encode that is checkpointed chunk by chunk; 0 means never"""
+    try:
+        return max(0.0, float(os.environ.get(CHECKPOINT_SECONDS_ENV, DEFAULT_CHECKPOINT_SECONDS)))
+    except ValueError:
+        return DEFAULT_CHECKPOINT_SECONDS
+
+
+def is_checkpointed(mode, duration):
+    """Whether a job runs as resumable chunks: chunked mode, and long full re-encodes"""
+    if mode == 'chunked':
+        return True
+    limit = checkpoint_seconds()
+    return mode == 'full' and bool(limit) and bool(duration) and duration >= limit
+
+
+def default_mute_icon_path():
+    """Path of the mute icon shipped next to the program"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mute_2.png')
+
+
+def default_output_path(video_path):
+    """processed-<name> next to the source video"""
+    directory = os.path.dirname(video_path)
+    filename = os.path.basename(video_path)
+    return os.path.join(directory, f"processed-{filename}")
+
+
+def format_time(seconds, millis=False):
+    """Format seconds to HH:MM:SS (HH:MM:SS.mmm with millis=True)"""
+    if millis:
+        whole, ms = divmod(int(round(seconds * 1000)), 1000)
+        return f"{format_time(whole)}.{ms:03d}"
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def parse_timestamp(value):
+    """Parse seconds ("75", "75.5") or [[HH:]MM:]SS timestamps ("00:01:15") into seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        seconds = 0.0
+        for part in text.split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise RedactionError(f"Invalid timestamp: {value!r}")
+    if text.count(':') > 2 or seconds < 0:
+        raise RedactionError(f"Invalid timestamp: {value!r}")
+    return seconds
+
+
+def validate_segments(segments, duration=None):
+    """Check the segments and return them sorted by start time.
+
+    Raises RedactionError describing the first problem found.
+    """
+    for i, (start, end) in enumerate(segments):
+        if start >= end:
+            raise RedactionError(f"Segment {i + 1}: Start time must be before end time.")
+
+        if duration is not None and end > duration:
+            raise RedactionError(
+                f"Segment {i + 1}: End time exceeds video duration ({format_time(duration, millis=True)}).")
+
+    # Check for overlapping segments
+    segments = sorted(segments)
+    for i in range(len(segments) - 1):
+        if segments[i][1] > segments[i + 1][0]:
+            raise RedactionError(
+                f"Segments overlap: Segment ending at {format_time(segments[i][1])} overlaps with segment starting at {format_time(segments[i + 1][0])}.")
+
+    return segments
+
+
+def mute_filter(segments, precision=None, label='mute'):
+    """Audio filter graph that silences the segments, to the sample.
+
+    asegment cuts the track at each segment boundary, splitting only the
+    audio frames a boundary falls in; the pieces inside segments go through
+    volume=0 and concat joins everything again. The audio between segments
+    passes through in its own frames without any filter looking at it.
+    Boundaries are counted from the track's first sample, which is where its
+    timestamps start. precision='fixed' keeps integer samples integers,
+    which lossless tracks need to come out bit-exact outside the segments.
+    label prefixes the graph's pads, which must be unique in a filter_complex.
+    """
+    points = []
+    muted = set()
+    for start, end in merge_segments(segments):
+        if start > 0:
+            points.append(start)
+        muted.add(len(points))
+        points.append(end)
+    if not points:
+        return 'anull'
+    volume = 'volume=0' + (f':precision={precision}' if precision else '')
+    pieces = [f'[{label}{i}]' for i in range(len(points) + 1)]
+    graph = [f"asegment=timestamps={'|'.join(f'{point:.6f}' for point in points)}{''.join(pieces)}"]
+    for i in sorted(muted):
+        graph.append(f"{pieces[i]}{volume}[{label}{i}m]")
+        pieces[i] = f'[{label}{i}m]'
+    graph.append(f"{''.join(pieces)}concat=n={len(pieces)}:v=0:a=1")
+    return ';'.join(graph)
+
+
+def audio_output_args(audio_tracks, segments, source_input, first_input):
+    """Inputs, filter graph parts and output options for the muted audio tracks.
+
+    audio_tracks are the plans from prepare_audio_tracks, in output order.
+    Tracks muted in the graph read input `source_input`; tracks already
+    muted to a file are added as inputs numbered from `first_input` and
+    stream-copied. Each output track keeps its source track's metadata
+    (language, title). Returns (input_args, filters, output_args).
+    """
+    inputs, filters, maps, options = [], [], [], []
+    for out, plan in enumerate(audio_tracks or []):
+        if plan['method'] == 'file':
+            if plan.get('offset'):
+                inputs.extend(['-itsoffset', f"{plan['offset']:.6f}"])
+            inputs.extend(['-i', plan['path']])
+            maps.extend(['-map', f'{first_input}:a:0'])
+            options.extend([f'-c:a:{out}', 'copy'])
+            first_input += 1
+        elif plan['method'] == 'copy':
+            maps.extend(['-map', f"{source_input}:a:{plan['track']}"])
+            options.extend([f'-c:a:{out}', 'copy'])
+        else:
+            mute = mute_filter(segments, plan.get('precision'), label=f'mute{out}_')
+            filters.append(f"[{source_input}:a:{plan['track']}]{mute}[a{out}]")
+            maps.extend(['-map', f'[a{out}]'])
+            options.extend(stream_options(plan['options'], out))
+        options.extend([f'-map_metadata:s:a:{out}', f"{source_input}:s:a:{plan['track']}"])
+    return inputs, filters, maps + options
+
+
+def overlay_filter(segments, encoder, main='[0:v]', icon='[1:v]', hwaccel=None, regions=None):
+    """Filter chain that overlays the icon during the segments and hands frames to the encoder.
+
+    The regions (see hashbrown_regions) are redacted first, in the same
+    graph. With a GPU-resident hwaccel (see select_hwaccel) the icon is
+    uploaded and overlaid on the GPU instead; regions need the CPU path.
+    """
+    if hwaccel is not None and hwaccel['gpu_overlay']:
+        return gpu_overlay_filter(hwaccel['name'], main, icon, enable_expr(segments)) + '[outv]'
+    graph = []
+    if regions:
+        graph.append(region_filter(regions, main, '[regions]'))
+        main = '[regions]'
+    if segments:
+        chain = f"{main}{icon}overlay=0:0:enable='{enable_expr(segments)}'"
+    else:
+        chain = f"{main}null"
+    if encoder_filter(encoder):
+        chain += ',' + encoder_filter(encoder)
+    return ';'.join(graph + [chain + '[outv]'])
+
+
+def build_redaction_command(ffmpeg_path, video_path, icon_path, segments, output_path,
+                            encoder, audio_tracks=None, encoder_args=None, hwaccel=None, regions=None):
+    """Build the single ffmpeg command that overlays the icon and mutes the segments.
+
+    Both the overlay and the mute are driven by the same enable expression,
+    and the regions are blurred in the same filter graph, so video and
+    audio are handled in one decode/encode pass. audio_tracks
+    (from prepare_audio_tracks) are the audio tracks to write, and
+    encoder_args (from encoder_output_args) default to the balanced profile.
+    hwaccel (from select_hwaccel) decodes, and possibly overlays, on the GPU.
+    """
+    ffmpeg_cmd = [
+        ffmpeg_path,
+        '-y',  # Overwrite output
+    ]
+    ffmpeg_cmd.extend(encoder_input_args(encoder, hwaccel))
+    ffmpeg_cmd.extend([
+        '-i', video_path,
+        '-i', icon_path,
+    ])
+
+    # Audio tracks muted ahead of time (spliced, or by the Python path) come in as extra inputs
+    audio_inputs, audio_filters, audio_args = audio_output_args(audio_tracks, segments, 0, 2)
+    ffmpeg_cmd.extend(audio_inputs)
+
+    # Mute when condition is true (set volume to 0 during mute segments)
+    filter_complex = ';'.join([overlay_filter(segments, encoder, hwaccel=hwaccel, regions=regions)]
+                              + audio_filters)
+    ffmpeg_cmd.extend([
+        '-filter_complex', filter_complex,
+        '-map', '[outv]',
+    ])
+
+    ffmpeg_cmd.extend(encoder_args or encoder_output_args(encoder))
+    ffmpeg_cmd.extend(audio_args)
+    ffmpeg_cmd.append(output_path)
+    return ffmpeg_cmd
+
+
+def build_audio_only_command(ffmpeg_path, video_path, segments, output_path, audio_tracks=None):
+    """Build an ffmpeg command that mutes the segments without touching the video.
+
+    The video is stream-copied and only the audio is muted, each of
+    audio_tracks (from prepare_audio_tracks) as its plan says. Subtitle and
+    attachment streams are carried over as they are.
+    """
+    audio_inputs, audio_filters, audio_args = audio_output_args(audio_tracks, segments, 0, 1)
+    cmd = [
+        ffmpeg_path,
+        '-y',  # Overwrite output
+        '-i', video_path,
+    ] + audio_inputs
+    if audio_filters:
+        cmd.extend(['-filter_complex', ';'.join(audio_filters)])
+    # The general -c copy has to come before the per-track audio options that override it
+    cmd.extend(['-map', '0:v?', '-c', 'copy'])
+    cmd.extend(audio_args)
+    cmd.extend([
+        '-map', '0:s?',
+        '-map', '0:t?',
+        '-map_metadata', '0',
+        output_path
+    ])
+    return cmd
+
+
+class JobControl:
+    """Progress reporting and cancellation for all ffmpeg processes of one job.
+
+    on_progress is called from worker threads with a dict holding 'stage',
+    'fraction' (0-1, or None if the length is unknown), 'fps', 'speed' and
+    'eta' (seconds). GUI callers must hand it over to their main thread.
+    """
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+        # Set while HASHBROWN_TRACE is on: the job's Trace, and the span of the current stage
+        self.trace = None
+        self._span = None
+        # Per-job directory for intermediate files, set by redact_video
+        self.scratch_dir = None
+        self.start_stage('starting')
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the job: kill every running ffmpeg process and refuse to start new ones"""
+        self._cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def check(self):
+        """Raise RedactionCancelled if the job has been cancelled"""
+        if self.cancelled:
+            raise RedactionCancelled("Processing was cancelled.")
+
+    def start_stage(self, stage, total_seconds=None):
+        """Begin a new stage whose ffmpeg processes output total_seconds of media between them"""
+        with self._lock:
+            self.stage = stage
+            self.total_seconds = total_seconds
+            self._stage_started = time.monotonic()
+            self._stats = {}
+            previous, self._span = self._span, begin_span(stage)
+        if previous is not None:
+            previous.end()
+        self._report()
+
+    def _register(self, process):
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled:
+            process.kill()
+
+    def _unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+            if process in self._stats:
+                # Keep its output towards the total, but it no longer adds to fps/speed
+                self._stats[process] = (self._stats[process][0], 0.0, 0.0)
+
+    def _discard(self, process):
+        # A failed process's output doesn't count; its retry reports again
+        with self._lock:
+            self._stats.pop(process, None)
+
+    def _set_total(self, total_seconds):
+        with self._lock:
+            if self.total_seconds is None:
+                self.total_seconds = total_seconds
+
+    def _update(self, process, out_seconds, fps, speed):
+        with self._lock:
+            self._stats[process] = (out_seconds, fps, speed)
+            if self._span is not None:
+                self._span.progress(sum(s[1] for s in self._stats.values()),
+                                    sum(s[2] for s in self._stats.values()))
+        self._report()
+
+    def _report(self):
+        if self.on_progress is None:
+            return
+        with self._lock:
+            stats = list(self._stats.values())
+            total = self.total_seconds
+            elapsed = time.monotonic() - self._stage_started
+            stage = self.stage
+        # Parallel chunk encodes add up: total media done, combined fps and speed
+        done = sum(s[0] for s in stats)
+        fraction = min(done / total, 1.0) if total else None
+        eta = elapsed * (1 - fraction) / fraction if fraction else None
+        self.on_progress({
+            'stage': stage,
+            'fraction': fraction,
+            'fps': sum(s[1] for s in stats) if stats else None,
+            'speed': sum(s[2] for s in stats) if stats else None,
+            'eta': eta,
+        })
+
+
+def _scratch_dir(control):
+    return control.scratch_dir if control is not None else None
+
+
+def _spill_long_filters(cmd, directory=None):
+    """Move very long filter graphs into script files; returns (cmd, script paths)"""
+    cmd = list(cmd)
+    scripts = []
+    for i in range(len(cmd) - 1):
+        option = FILTER_SCRIPT_OPTIONS.get(cmd[i])
+        if option and len(cmd[i + 1]) > FILTER_SCRIPT_THRESHOLD:
+            fd, path = tempfile.mkstemp(prefix='hashbrown-filter-', suffix='.txt', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(cmd[i + 1])
+            cmd[i], cmd[i + 1] = option, path
+            scripts.append(path)
+    return cmd, scripts
+
+
+def run_ffmpeg_streamed(cmd, control=None):
+    """Run a long ffmpeg command, streaming its progress instead of buffering its output.
+
+    ffmpeg writes machine-readable progress to stdout (-progress pipe:1),
+    which feeds control. stderr is drained as it arrives and only the last
+    lines are kept for the error message, so multi-hour jobs don't pile up
+    huge strings in memory. Raises RedactionCancelled if control is cancelled.
+    """
+    if control is not None:
+        control.check()
+    cmd, filter_scripts = _spill_long_filters([cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:]),
+                                              _scratch_dir(control))
+    try:
+        return _run_streamed(cmd, control)
+    finally:
+        for path in filter_scripts:
+            os.remove(path)
+
+
+def _run_streamed(cmd, control):
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True, errors='replace')
+    except FileNotFoundError:
+        raise RedactionError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line)
+            if control is not None:
+                # The input's own length, used when the caller didn't know it
+                match = DURATION_RE.search(line)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    control._set_total(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    if control is not None:
+        control._register(process)
+    try:
+        values = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            values[key] = value
+            if key == 'progress' and control is not None:
+                # out_time_ms is actually in microseconds, like out_time_us
+                out_us = to_float(values.get('out_time_us', values.get('out_time_ms')), 0.0)
+                speed = to_float(values.get('speed', '').rstrip('x'), 0.0)
+                control._update(process, max(out_us, 0.0) / 1e6, to_float(values.get('fps'), 0.0), speed)
+        wait_process(process)
+        stderr_thread.join()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            wait_process(process)
+        if control is not None:
+            control._unregister(process)
+
+    if control is not None:
+        control.check()
+    if process.returncode != 0:
+        if control is not None:
+            control._discard(process)
+        raise RedactionError(f"FFmpeg error: {''.join(stderr_tail)}")
+    return process.returncode
+
+
+def run_with_software_fallback(build_cmd, hwaccel, control=None):
+    """Run build_cmd(hwaccel), and build_cmd(None) on the CPU if the hardware-decoded run fails.
+
+    The trial clip passing doesn't mean every file decodes on the GPU (an
+    unsupported codec profile, a 10-bit source, a resolution beyond the
+    decoder), so a GPU failure costs time but never fails the job.
+    """
+    if hwaccel is None:
+        return run_ffmpeg_streamed(build_cmd(None), control)
+    try:
+        return run_ffmpeg_streamed(build_cmd(hwaccel), control)
+    except RedactionCancelled:
+        raise
+    except RedactionError:
+        pass
+    with span('software fallback', hwaccel=hwaccel['name']):
+        return run_ffmpeg_streamed(build_cmd(None), control)
+
+
+def _drain_stderr(process, tail):
+    thread = threading.Thread(target=lambda: tail.extend(process.stderr), daemon=True)
+    thread.start()
+    return thread
+
+
+def _zero_ranges(view, size, position, ranges, next_range, zeros):
+    """Zero the parts of the byte ranges [a, b) that fall in view[:size], the block at byte offset position.
+
+    ranges are sorted and don't overlap; those before next_range are already
+    done. Returns the index to pass for the following block.
+    """
+    end = position + size
+    # Skip the finished ranges once and zero the rest in place
+    while next_range < len(ranges) and ranges[next_range][1] <= position:
+        next_range += 1
+    i = next_range
+    while i < len(ranges) and ranges[i][0] < end:
+        first = max(ranges[i][0], position) - position
+        last = min(ranges[i][1], end) - position
+        view[first:last] = zeros[:last - first]
+        i += 1
+    return next_range
+
+
+def mute_audio_stream(ffmpeg_path, video_path, segments, output_path, sample_rate, channels,
+                      options, control=None):
+    """Mute the segments in Python, streaming the first audio track through two ffmpeg pipes.
+
+    One ffmpeg decodes to raw float PCM, the muted sample ranges of each
+    fixed-size block are zeroed in place, and a second ffmpeg encodes the
+    result with the track plan's options (see hashbrown_audio.plan_track).
+    Memory use is one block however long the file is.
+    Raises RedactionError with the failing ffmpeg's output.
+    """
+    frame_bytes = channels * 4
+    ranges = [(first * frame_bytes, last * frame_bytes) for first, last in sample_ranges(segments, sample_rate)]
+    pcm_args = ['-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels)]
+    decode_cmd = [ffmpeg_path, '-hide_banner', '-nostdin', '-i', video_path,
+                  '-map', '0:a:0', '-c:a', 'pcm_f32le'] + pcm_args + ['-']
+    encode_cmd = ([ffmpeg_path, '-y', '-hide_banner'] + pcm_args + ['-i', '-']
+                  + stream_options(options, 0) + [output_path])
+
+    if control is not None:
+        control.check()
+    processes = []
+    try:
+        for cmd in (decode_cmd, encode_cmd):
+            processes.append(subprocess.Popen(cmd, stdin=subprocess.PIPE if processes else subprocess.DEVNULL,
+                                              stdout=subprocess.DEVNULL if processes else subprocess.PIPE,
+                                              stderr=subprocess.PIPE, text=False))
+    except FileNotFoundError:
+        for process in processes:
+            process.kill()
+        raise RedactionError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+    decoder, encoder = processes
+
+    tails = {}
+    threads = []
+    for process in processes:
+        tails[process] = collections.deque(maxlen=STDERR_TAIL_LINES)
+        threads.append(_drain_stderr(process, tails[process]))
+        if control is not None:
+            control._register(process)
+
+    block = bytearray(PCM_BLOCK_FRAMES * frame_bytes)
+    view = memoryview(block)
+    zeros = memoryview(bytes(len(block)))
+    position = 0  # Byte offset of the block in the decoded stream
+    next_range = 0
+    started = time.monotonic()
+    encoder_failed = False
+    try:
+        while True:
+            size = decoder.stdout.readinto(view)
+            if not size:
+                break
+            end = position + size
+            next_range = _zero_ranges(view, size, position, ranges, next_range, zeros)
+            try:
+                encoder.stdin.write(view[:size])
+            except (BrokenPipeError, OSError):
+                encoder_failed = True
+                break
+            position = end
+            if control is not None:
+                media_seconds = position / frame_bytes / sample_rate
+                speed = media_seconds / max(time.monotonic() - started, 1e-6)
+                control._update(decoder, media_seconds, 0.0, speed)
+        if encoder_failed:
+            decoder.kill()  # Nobody reads its output any more
+        try:
+            encoder.stdin.close()
+        except OSError:
+            encoder_failed = True
+        for process in processes:
+            wait_process(process)
+        for thread in threads:
+            thread.join()
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+                wait_process(process)
+            if control is not None:
+                control._unregister(process)
+
+    if control is not None:
+        control.check()
+    for process, name in ((decoder, 'decoding'), (encoder, 'encoding')):
+        if process.returncode != 0 or (process is encoder and encoder_failed):
+            output = b''.join(tails[process]).decode('utf-8', errors='replace')
+            raise RedactionError(f"FFmpeg error while {name} the audio: {output}")
+    return output_path
+
+
+def split_audio_track(ffmpeg_path, video_path, track, cut_times, work_dir, control=None):
+    """Stream-copy one audio track into Matroska pieces split at the given packet times.
+
+    Returns the piece paths in order, one more than there are cut times
+    (or fewer, if the muxer couldn't cut somewhere).
+    """
+    list_path = os.path.join(work_dir, 'pieces.csv')
+    cmd = [
+        ffmpeg_path, '-y', '-hide_banner',
+        '-i', video_path,
+        '-map', f'0:a:{track}', '-c', 'copy',
+        '-f', 'segment',
+        '-segment_format', 'matroska',
+        # Every audio packet is a keyframe, so the muxer cuts right at each time
+        '-segment_times', ','.join(f'{max(t - KEYFRAME_EPSILON, 0):.6f}' for t in cut_times),
+        '-reset_timestamps', '1',
+        '-segment_list', list_path,
+        '-segment_list_type', 'csv',
+        os.path.join(work_dir, 'piece%05d.mka'),
+    ]
+    run_ffmpeg_streamed(cmd, control)
+    with open(list_path, newline='', encoding='utf-8') as f:
+        return [os.path.join(work_dir, row[0]) for row in csv.reader(f) if row]
+
+
+def encode_audio_piece(ffmpeg_path, video_path, plan, segments, start, end, output_path, control=None):
+    """Re-encode [start, end) of an audio track with the segments muted, primed to splice cleanly.
+
+    Returns (inpoint, outpoint) in the piece's own time: the part to keep,
+    with the encoder's priming packets in front of it left out.
+    """
+    sample_rate = plan['sample_rate']
+    drop, lead = splice_lead(plan)
+    source_start = max(start - lead / sample_rate, 0.0)
+    # Near the start of the file there is no source audio to lead in with, so silence stands in
+    silence = lead - round((start - source_start) * sample_rate)
+
+    filters = []
+    local_segments = chunk_segments(segments, source_start, end)
+    if local_segments:
+        filters.append(mute_filter(local_segments))
+    if silence > 0:
+        filters.append(f'adelay=delays={silence}S:all=1')
+
+    cmd = [ffmpeg_path, '-y', '-hide_banner', '-ss', f'{source_start:.6f}']
+    if end != float('inf'):
+        # Two packets extra, so the encoder's last (padded) packet lies past the outpoint
+        cmd.extend(['-t', f'{end - source_start + 2 * plan["frame"] / sample_rate:.6f}'])
+    cmd.extend(['-i', video_path, '-map', f"0:a:{plan['track']}"])
+    if filters:
+        cmd.extend(['-af', ','.join(filters)])
+    cmd.extend(stream_options(plan['options'], 0))
+    cmd.extend(['-avoid_negative_ts', 'make_zero', '-f', 'matroska', output_path])
+    run_ffmpeg_streamed(cmd, control)
+
+    # Matroska rounds timestamps to the millisecond, so stay a millisecond clear of the packet edges
+    first_packet = drop * plan['frame'] / sample_rate
+    inpoint = first_packet + KEYFRAME_EPSILON if drop else None
+    outpoint = first_packet + (end - start) - KEYFRAME_EPSILON if end != float('inf') else None
+    return inpoint, outpoint
+
+
+def splice_audio_track(ffmpeg_path, video_path, plan, segments, work_dir, control=None):
+    """Mute a lossy track by re-encoding only the packets around the segments.
+
+    The track is split by stream copy at packet boundaries around each
+    segment (see hashbrown_audio.splice_spans), the pieces holding a segment
+    are re-encoded in the source codec with the mute, and all pieces are
+    joined again. Returns a 'file' plan for the spliced track, or None when
+    splicing doesn't pay off or isn't possible (the caller then re-encodes
+    the whole track).
+    """
+    packets = probe_audio_packets(ffmpeg_path, video_path, plan['track'])
+    if not packets:
+        return None
+    spans = splice_spans(packets, segments)
+    cut_times = sorted({t for span in spans for t in span if 0 < t < float('inf')})
+    if not cut_times or len(spans) > MAX_SPLICE_SPANS:
+        return None  # One span over the whole track, or so many that a single re-encode is cheaper
+    bounds = list(zip([0.0] + cut_times, cut_times + [float('inf')]))
+
+    track_dir = os.path.join(work_dir, f"track{plan['track']}")
+    os.makedirs(track_dir, exist_ok=True)
+    if control is not None:
+        control.start_stage(f"Splicing audio track {plan['track'] + 1}")
+    pieces = split_audio_track(ffmpeg_path, video_path, plan['track'], cut_times, track_dir, control=control)
+    if len(pieces) != len(bounds):
+        return None
+
+    entries = []
+    for i, (start, end) in enumerate(bounds):
+        if (start, end) in spans:
+            piece = os.path.join(track_dir, f'muted{i:05d}.mka')
+            inpoint, outpoint = encode_audio_piece(ffmpeg_path, video_path, plan, segments, start, end,
+                                                   piece, control=control)
+            entries.append((piece, inpoint, outpoint))
+        else:
+            entries.append((pieces[i], None, None))
+
+    list_path = os.path.join(track_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path, inpoint, outpoint in entries:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            if inpoint is not None:
+                f.write(f"inpoint {inpoint:.6f}\n")
+            if outpoint is not None:
+                f.write(f"outpoint {outpoint:.6f}\n")
+    spliced_path = os.path.join(work_dir, f"spliced{plan['track']}.mka")
+    run_ffmpeg_streamed([
+        ffmpeg_path, '-y', '-hide_banner',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-map', '0:a', '-c', 'copy', spliced_path,
+    ], control)
+    shutil.rmtree(track_dir, ignore_errors=True)
+    # The pieces start at zero; the offset puts the track back where it was against the video
+    return {'track': plan['track'], 'method': 'file', 'path': spliced_path, 'offset': packets[0]}
+
+
+def prepare_audio_tracks(ffmpeg_path, video_path, info, segments, work_dir, legacy_audio=False,
+                         control=None):
+    """Decide how each audio track of the source gets muted, doing any work needed up front.
+
+    Returns one plan per track (see hashbrown_audio.plan_track) for
+    audio_output_args. Spliced tracks, and with legacy_audio the first track
+    muted in Python, are written to work_dir and come back as 'file' plans.
+    Without segments (a job that only blurs regions) every track is copied.
+    """
+    if not segments:
+        return [{'track': track, 'method': 'copy'} for track in range(len(info['audio']))]
+    available = audio_encoders(ffmpeg_path) or None
+    plans = []
+    for track, stream in enumerate(info['audio']):
+        if legacy_audio and track == 0:
+            if control is not None:
+                control.start_stage('Muting audio in Python', info['duration'])
+            # Encoded like the graph would, in the track's own codec and bitrate
+            path = os.path.join(work_dir, 'legacy-muted.mka')
+            options = plan_track(track, stream, available)['options']
+            mute_audio_stream(ffmpeg_path, video_path, segments, path,
+                              stream['sample_rate'] or 48000, stream['channels'] or 2, options, control=control)
+            plans.append({'track': track, 'method': 'file', 'path': path})
+            continue
+        plan = plan_track(track, stream, available)
+        if plan['method'] == 'splice':
+            with span('splice audio', track=track, codec=stream['codec_name']):
+                spliced = splice_audio_track(ffmpeg_path, video_path, plan, segments, work_dir, control=control)
+            plan = spliced or dict(plan, method='reencode')
+        plans.append(plan)
+    return plans
+
+
+def smart_encoder(ffmpeg_path, video):
+    """The software encoder smart mode re-encodes GOPs with, or None if the source can't be matched.
+
+    Hardware encoders write their own SPS/PPS, which may not match the copied
+    GOPs, so only the source codec's software encoder is used, and only if it
+    can keep the source's pixel format.
+    """
+    codec = video['codec_name'] if video else None
+    encoder = SOFTWARE_ENCODERS.get(codec)
+    if encoder is None or encoder not in working_encoders(ffmpeg_path, codec):
+        return None
+    return encoder if can_match_source(encoder, video) else None
+
+
+def plan_smart_cuts(keyframes, segments):
+    """Pick the keyframe times to split at so every segment lies inside its own GOP run.
+
+    For each segment we cut at the last keyframe at or before its start and at
+    the first keyframe after its end. Everything between those cuts gets
+    re-encoded, everything else can be stream-copied.
+    """
+    cuts = set()
+    for start, end in segments:
+        i = bisect.bisect_right(keyframes, start) - 1
+        if i >= 0 and keyframes[i] > 0:
+            cuts.add(keyframes[i])
+        j = bisect.bisect_right(keyframes, end)
+        if j < len(keyframes):
+            cuts.add(keyframes[j])
+    return sorted(cuts)
+
+
+def chunk_segments(segments, chunk_start, chunk_end):
+    """Shift the segments overlapping [chunk_start, chunk_end) into chunk-local time"""
+    return [(round(max(start, chunk_start) - chunk_start, 6), round(min(end, chunk_end) - chunk_start, 6))
+            for start, end in segments_between(merge_segments(segments), chunk_start, chunk_end)]
+
+
+def split_video_at(ffmpeg_path, video_path, cut_times, work_dir, control=None):
+    """Stream-copy the video track into MPEG-TS chunks split at the given keyframe times.
+
+    Returns a list of (chunk_path, start, end) in source time; the last chunk
+    ends at infinity.
+    """
+    list_path = os.path.join(work_dir, 'chunks.csv')
+    cmd = [
+        ffmpeg_path, '-y', '-hide_banner',
+        '-i', video_path,
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment',
+        '-segment_format', 'mpegts',
+        # The muxer cuts at the first keyframe at or after each time
+        '-segment_times', ','.join(f'{max(t - KEYFRAME_EPSILON, 0):.3f}' for t in cut_times),
+        '-reset_timestamps', '1',
+        '-segment_list', list_path,
+        '-segment_list_type', 'csv',
+        os.path.join(work_dir, 'chunk%05d.ts'),
+    ]
+    run_ffmpeg_streamed(cmd, control)
+
+    chunks = []
+    with open(list_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 3:
+                chunks.append([os.path.join(work_dir, row[0]), float(row[1]), float(row[2])])
+    if chunks:
+        chunks[-1][2] = float('inf')
+    return [tuple(chunk) for chunk in chunks]
+
+
+def encode_chunk(ffmpeg_path, chunk_path, icon_path, local_segments, output_path,
+                 encoder, start=None, duration=None, control=None, threads=None,
+                 encoder_args=None, hwaccel=None, local_regions=None):
+    """Re-encode one chunk (video only) with the mute icon overlaid on its segments.
+
+    If start/duration are given, only that range of chunk_path is read, and
+    local_segments and local_regions must be relative to start. hwaccel
+    (from select_hwaccel) decodes on the GPU, falling back to the CPU if
+    that fails.
+    """
+    def build(hwaccel):
+        cmd = [ffmpeg_path, '-y', '-hide_banner']
+        cmd.extend(encoder_input_args(encoder, hwaccel))
+        if start is not None:
+            cmd.extend(['-ss', f'{start:.6f}'])
+        if duration is not None:
+            cmd.extend(['-t', f'{duration:.6f}'])
+        cmd.extend(['-i', chunk_path])
+        if local_segments or local_regions:
+            if local_segments:
+                cmd.extend(['-i', icon_path])
+            cmd.extend([
+                '-filter_complex', overlay_filter(local_segments, encoder, hwaccel=hwaccel, regions=local_regions),
+                '-map', '[outv]',
+            ])
+        else:
+            cmd.extend(['-map', '0:v:0'])
+            if encoder_filter(encoder, hwaccel):
+                cmd.extend(['-vf', encoder_filter(encoder, hwaccel)])
+        cmd.extend(encoder_args or encoder_output_args(encoder, threads=threads))
+        cmd.extend(['-f', 'mpegts', output_path])
+        return cmd
+
+    run_with_software_fallback(build, hwaccel, control)
+    return output_path
+
+
+def concat_chunks(ffmpeg_path, chunk_paths, video_path, segments, output_path, work_dir,
+                  audio_tracks=None, control=None):
+    """Join the video chunks losslessly and mux in the source audio tracks with the segments muted"""
+    list_path = os.path.join(work_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in chunk_paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    audio_inputs, audio_filters, audio_args = audio_output_args(audio_tracks, segments, 1, 2)
+    cmd = [
+        ffmpeg_path, '-y', '-hide_banner',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', video_path,
+    ] + audio_inputs
+    if audio_filters:
+        cmd.extend(['-filter_complex', ';'.join(audio_filters)])
+    cmd.extend(['-map', '0:v', '-c:v', 'copy'])
+    cmd.extend(audio_args)
+    cmd.append(output_path)
+    run_ffmpeg_streamed(cmd, control)
+    return output_path
+
+
+def plan_chunk_bounds(keyframes, chunk_seconds):
+    """Split the timeline into chunks of at least chunk_seconds that each start on a keyframe.
+
+    Returns a list of (start, end) in source time; the last chunk ends at infinity.
+    """
+    starts = [0.0]
+    for keyframe in keyframes:
+        if keyframe >= starts[-1] + chunk_seconds:
+            starts.append(keyframe)
+    ends = starts[1:] + [float('inf')]
+    return list(zip(starts, ends))
+
+
+def chunked_render(video_path, segments, output_path, ffmpeg_path, icon_path, encoder,
+                   audio_tracks=None, workers=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                   duration=None, control=None, profile=DEFAULT_PROFILE, info=None, regions=None,
+                   chunk_cache=True):
+    """Encode keyframe-aligned chunks of the video in parallel and join them losslessly.
+
+    Each worker seeks straight to its chunk in the source and runs its own
+    ffmpeg, so a single long encode is spread over every core. The encoder
+    threads are divided between the workers to avoid oversubscribing the CPU.
+    Encoded chunks are kept in the job cache (see hashbrown_jobcache), so a
+    re-run after a segment edit only encodes the chunks whose redaction changed.
+    A journal records every finished chunk with its hash, so running a
+    crashed or cancelled job again resumes after the chunks it had finished.
+    With chunk_cache=False the chunks are only kept next to the journal, and
+    removed with it once the job is done.
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, workers or cpu_count)
+    threads = None
+    if ENCODERS[encoder]['family'] == 'nvenc':
+        workers = min(workers, NVENC_SESSION_LIMIT)
+    elif not is_hardware_encoder(encoder):
+        threads = max(1, cpu_count // workers)
+    encoder_args = encoder_output_args(encoder, profile, info, threads)
+    hwaccel = select_hwaccel(ffmpeg_path, encoder, ((info or {}).get('video') or {}).get('pix_fmt'),
+                             gpu_overlay=not regions)
+
+    if control is not None:
+        control.start_stage('Finding keyframes')
+    bounds = plan_chunk_bounds(probe_keyframes(ffmpeg_path, video_path), chunk_seconds)
+
+    use_cache = chunk_cache and chunk_cache_limit() > 0
+    with open(icon_path, 'rb') as f:
+        icon_digest = hashlib.sha1(f.read()).hexdigest()
+    source = file_fingerprint(video_path)
+    journal = JobJournal(chunk_key(source=source, segments=segments, regions=regions, chunk_seconds=chunk_seconds,
+                                   encoder=encoder, args=encoder_args, icon=icon_digest, hwaccel=hwaccel))
+
+    work_dir = tempfile.mkdtemp(prefix='hashbrown-chunked-', dir=_scratch_dir(control))
+    try:
+        chunk_paths = [None] * len(bounds)
+        pending = []
+        for i, (start, end) in enumerate(bounds):
+            seek_start = max(start - KEYFRAME_EPSILON, 0)
+            seek_end = end - KEYFRAME_EPSILON
+            local_segments = chunk_segments(segments, seek_start, seek_end)
+            local_regions = regions_between(regions or [], seek_start, seek_end)
+            # Chunks without regions keep the keys they had before regions existed
+            key = chunk_key(source=source, start=seek_start, end=seek_end, segments=local_segments,
+                            encoder=encoder, args=encoder_args, icon=icon_digest, hwaccel=hwaccel,
+                            **({'regions': local_regions} if local_regions else {}))
+            chunk_paths[i] = journal.verified(key)
+            if chunk_paths[i] is None and use_cache:
+                chunk_paths[i] = lookup_chunk(key)
+            if chunk_paths[i] is None:
+                pending.append((i, seek_start, seek_end, local_segments, local_regions, key))
+
+        if control is not None:
+            # Only the chunks that actually get encoded count towards progress
+            total = sum(min(seek_end, duration or seek_start) - seek_start
+                        for _, seek_start, seek_end, _, _, _ in pending)
+            resuming = f'Resuming after {journal.resumed} finished chunks: ' if journal.resumed else ''
+            control.start_stage(f'{resuming}Encoding {len(pending)} of {len(bounds)} chunks', total or None)
+
+        def encode(i, seek_start, seek_end, local_segments, local_regions, key):
+            # Chunks outlive the job's scratch dir, so a crashed job can pick them up again
+            target = reserve_chunk(key) if use_cache else journal.chunk_path(i)
+            try:
+                encode_chunk(ffmpeg_path, video_path, icon_path, local_segments, target, encoder,
+                             start=seek_start,
+                             duration=seek_end - seek_start if seek_end != float('inf') else None,
+                             control=control, encoder_args=encoder_args, hwaccel=hwaccel,
+                             local_regions=local_regions)
+            except BaseException:
+                if os.path.exists(target):
+                    os.remove(target)
+                raise
+            path = store_chunk(key, target) if use_cache else target
+            journal.add(key, path)
+            return path
+
+        # The workers only wait on their ffmpeg child, so threads are enough
+        # to keep one encoder process per worker busy
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            # The workers' spans and CPU time belong to this job's trace
+            futures = {pool.submit(in_current_trace(encode), *job): job[0] for job in pending}
+            try:
+                for future, i in futures.items():
+                    chunk_paths[i] = future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if control is not None:
+            control.start_stage('Joining chunks', duration)
+        concat_chunks(ffmpeg_path, chunk_paths, video_path, segments, output_path, work_dir,
+                      audio_tracks=audio_tracks, control=control)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    journal.finish()
+    if use_cache:
+        evict_chunks(keep=chunk_paths)
+    return output_path
+
+
+def smart_render(video_path, segments, output_path, ffmpeg_path, icon_path,
+                 audio_tracks=None, duration=None, control=None, profile=DEFAULT_PROFILE, regions=None):
+    """Re-encode only the GOPs that touch a segment or a region and stream-copy the rest.
+
+    The video track is split at keyframes around each segment, the affected
+    chunks are re-encoded with the overlay by the source codec's software
+    encoder, matching the source's profile, level and pixel format, and all
+    chunks are concatenated back together with the muted audio. Returns False
+    if the source can't be smart rendered (unsupported codec or pixel format,
+    or every GOP is affected) so the caller can fall back to a full encode.
+    """
+    # Re-encoded GOPs must match the source's parameter sets to be concatenated with the copied ones
+    info = probe_media(ffmpeg_path, video_path)
+    stream = info['video']
+    with span('select encoder', codec=stream['codec_name'] if stream else None):
+        encoder = smart_encoder(ffmpeg_path, stream)
+    if encoder is None:
+        return False
+    encoder_args = encoder_output_args(encoder, profile, info, match_source=True)
+    regions = regions or []
+
+    if control is not None:
+        control.start_stage('Finding keyframes')
+    cut_times = plan_smart_cuts(probe_keyframes(ffmpeg_path, video_path), segments + region_spans(regions))
+    if not cut_times:
+        return False
+
+    work_dir = tempfile.mkdtemp(prefix='hashbrown-smart-', dir=_scratch_dir(control))
+    try:
+        if control is not None:
+            control.start_stage('Splitting at keyframes', duration)
+        chunks = split_video_at(ffmpeg_path, video_path, cut_times, work_dir, control=control)
+
+        redacted = {}
+        for i, (chunk_path, start, end) in enumerate(chunks):
+            local_segments = chunk_segments(segments, start, end)
+            local_regions = regions_between(regions, start, end)
+            if local_segments or local_regions:
+                redacted[i] = (local_segments, local_regions)
+        if control is not None:
+            redacted_seconds = sum(min(chunks[i][2], duration or chunks[i][1]) - chunks[i][1] for i in redacted)
+            control.start_stage('Encoding redacted GOPs', redacted_seconds or None)
+
+        chunk_paths = []
+        for i, (chunk_path, start, end) in enumerate(chunks):
+            if i in redacted:
+                local_segments, local_regions = redacted[i]
+                chunk_path = encode_chunk(
+                    ffmpeg_path, chunk_path, icon_path, local_segments,
+                    os.path.join(work_dir, f'encoded{i:05d}.ts'),
+                    encoder, control=control, encoder_args=encoder_args, local_regions=local_regions,
+                )
+            chunk_paths.append(chunk_path)
+
+        if control is not None:
+            control.start_stage('Joining chunks', duration)
+        concat_chunks(ffmpeg_path, chunk_paths, video_path, segments, output_path, work_dir,
+                      audio_tracks=audio_tracks, control=control)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return True
+
+
+def estimate_disk_needs(video_path, info, output_path, mode, legacy_audio, scratch_dir):
+    """Rough number of bytes the job writes to each directory, erring on the generous side"""
+    source_size = os.path.getsize(video_path)
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    # Smart mode falls back to a full encode for sources it can't cut
+    output_size = source_size if mode == 'audio' else int(source_size * REENCODE_SIZE_FACTOR)
+    needs = {output_dir: output_size + DISK_HEADROOM_BYTES, scratch_dir: 0}
+    if mode == 'smart':
+        # The stream-copied chunks, plus the re-encoded ones in the worst case
+        needs[scratch_dir] += source_size + output_size
+    elif is_checkpointed(mode, info['duration']):
+        chunks_dir = cache_dir('chunks') if mode == 'chunked' and chunk_cache_limit() > 0 else cache_dir('journals')
+        needs[chunks_dir] = needs.get(chunks_dir, 0) + output_size
+    if legacy_audio and mode == 'full' and info['audio']:
+        needs[scratch_dir] += int((info['duration'] or 0) * LEGACY_AUDIO_BYTES_PER_SECOND)
+    # Spliced audio tracks: the copied pieces and the joined track, worst case all tracks
+    audio_bitrate = sum(stream.get('bit_rate') or DEFAULT_AUDIO_BITRATE for stream in info['audio'])
+    needs[scratch_dir] += 2 * int((info['duration'] or 0) * audio_bitrate / 8)
+    return needs
+
+
+def check_disk_space(video_path, info, output_path, mode, legacy_audio, scratch_dir):
+    """Raise RedactionError before any work starts if the job won't fit on disk"""
+    needs = estimate_disk_needs(video_path, info, output_path, mode, legacy_audio,
+                                scratch_dir or tempfile.gettempdir())
+    for directory, needed, free in free_space_shortfalls(needs):
+        hint = f" Set {SCRATCH_DIR_ENV} to use another disk for temporary files." if directory == scratch_dir else ""
+        raise RedactionError(
+            f"Not enough free disk space in {directory}: this job needs about "
+            f"{needed / 1024 ** 3:.1f} GB, but only {free / 1024 ** 3:.1f} GB is free.{hint}"
+        )
+
+
+def redact_video(video_path, segments, output_path=None, ffmpeg_path=None, mute_icon_path=None,
+                 legacy_audio=False, mode='full', workers=None, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                 control=None, profile=None, codec=None, regions=None):
+    """Overlay the mute icon and silence the audio during each segment.
+
+    By default this is a single ffmpeg pass and no audio is decoded in Python.
+    With legacy_audio=True the soundtrack is muted in Python first by
+    streaming it through mute_audio_stream. mode='smart'
+    only re-encodes the GOPs around each segment (see smart_render),
+    mode='audio' skips the icon and copies the video stream untouched, and
+    mode='chunked' spreads the encode over `workers` parallel ffmpeg processes.
+    Chunked jobs, and full re-encodes longer than HASHBROWN_CHECKPOINT_SECONDS
+    (encoded one chunk at a time), resume after their finished chunks when
+    they are run again after a crash or cancel.
+
+    Every audio track is kept in its source codec: lossless tracks are
+    muted bit-exact, and AAC, AC-3 and Opus tracks only have the
+    packets around each segment re-encoded (see hashbrown_audio).
+
+    profile ('draft', 'balanced' or 'archival', see hashbrown_profiles) trades
+    encode time for file size, and codec ('h264', 'hevc' or 'av1') is the
+    output video codec; both default to HASHBROWN_PROFILE/HASHBROWN_CODEC.
+    Smart mode always keeps the source codec.
+
+    regions (see hashbrown_regions) are rectangles blurred, pixelated or
+    boxed out of the picture during their own time spans, in the same pass
+    as the icon and the mute; a job may have regions and no segments.
+
+    With a hardware encoder, the video is also decoded on the same GPU and,
+    where the probe found it works, the icon is overlaid there too (see
+    select_hwaccel); if the GPU can't handle a file, the job runs again
+    decoding on the CPU.
+
+    Pass a JobControl to follow progress and to be able to cancel; a
+    cancelled or failed job leaves no partial output behind. Intermediate
+    files go to a per-job scratch directory (see hashbrown_scratch) that is
+    removed when the job ends, and the job is refused up front if the disks
+    it writes to are too full for it.
+
+    With HASHBROWN_TRACE set, the job's stage timings are logged (see
+    hashbrown_trace) and kept on control.trace.
+
+    Returns the output path (processed-<name> next to the source by default).
+    """
+    if mode not in MODES:
+        raise RedactionError(f"Unknown processing mode: {mode}")
+    try:
+        profile = resolve_profile(profile)
+        codec = resolve_codec(codec)
+    except ValueError as e:
+        raise RedactionError(str(e))
+    output_path = output_path or default_output_path(video_path)
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    mute_icon_path = mute_icon_path or default_mute_icon_path()
+
+    if control is None:
+        control = JobControl()  # Carries the scratch dir, and the stages the trace times
+
+    started = time.time()
+    try:
+        with job_trace('redact', video=video_path, mode=mode, segments=len(segments), profile=profile,
+                       codec=codec, legacy_audio=legacy_audio, regions=len(regions or [])) as trace, \
+                job_scratch_dir() as scratch_dir:
+            control.trace = trace
+            control.scratch_dir = scratch_dir
+            try:
+                _redact(video_path, segments, output_path, ffmpeg_path, mute_icon_path,
+                        legacy_audio, mode, workers, chunk_seconds, control, profile, codec, regions or [])
+            except ProbeError as e:
+                raise RedactionError(str(e))
+    except BaseException:
+        # Only remove what this job wrote, not an older file it failed to replace
+        if os.path.exists(output_path) and os.path.getmtime(output_path) >= started - 1:
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+def _redact(video_path, segments, output_path, ffmpeg_path, mute_icon_path,
+            legacy_audio, mode, workers, chunk_seconds, control, profile, codec, regions):
+    with span('probe'):
+        info = probe_media(ffmpeg_path, video_path)
+    check_disk_space(video_path, info, output_path, mode, legacy_audio, _scratch_dir(control))
+    # Line the boundaries up with the frames and samples the filters actually see
+    segments = snap_segments(segments,
+                             fps=info['video']['fps'] if info['video'] else None,
+                             sample_rate=info['audio'][0]['sample_rate'] if info['audio'] else None)
+    if regions:
+        if mode == 'audio':
+            raise RedactionError("Regions can only be blurred when the video is re-encoded, not in audio-only mode.")
+        video = info['video'] or {}
+        try:
+            regions = validate_regions(regions, info['duration'], video.get('width'), video.get('height'))
+        except ValueError as e:
+            raise RedactionError(str(e))
+        for region in regions:
+            region['start'], region['end'] = snap_segments([(region['start'], region['end'])],
+                                                           fps=video.get('fps'))[0]
+
+    if mode != 'audio':
+        if not os.path.exists(mute_icon_path):
+            raise RedactionError(f"Mute icon not found: {mute_icon_path}")
+        if info['video'] is None or not info['video']['height']:
+            raise RedactionError(f"No video stream found in {video_path}")
+    duration = info['duration']
+
+    # Unique names so concurrent jobs don't overwrite each other's files
+    audio_dir = tempfile.mkdtemp(prefix='hashbrown-audio-', dir=_scratch_dir(control))
+    try:
+        audio_tracks = prepare_audio_tracks(ffmpeg_path, video_path, info, segments, audio_dir,
+                                            legacy_audio=legacy_audio and mode == 'full', control=control)
+
+        if mode == 'audio':
+            if control is not None:
+                control.start_stage('Muting audio', duration)
+            run_ffmpeg_streamed(build_audio_only_command(ffmpeg_path, video_path, segments, output_path,
+                                                         audio_tracks), control)
+            return
+
+        if control is not None:
+            control.check()
+
+        # Calculate mute icon size (1/5 of video height)
+        icon_size = int(info['video']['height'] / 5)
+
+        # Shared, content-addressed render of the icon at this size
+        with span('icon', size=icon_size):
+            icon_path = scaled_icon(mute_icon_path, icon_size)
+
+        if control is not None:
+            control.start_stage('Checking encoders')
+
+        if mode == 'smart' and smart_render(video_path, segments, output_path, ffmpeg_path,
+                                            icon_path, audio_tracks=audio_tracks, duration=duration,
+                                            control=control, profile=profile, regions=regions):
+            return
+
+        # The probe is cached on disk, so this only costs time on the first run
+        with span('select encoder') as encoder_span:
+            encoder = select_encoder(ffmpeg_path, codec) or SOFTWARE_ENCODERS[codec]
+            hwaccel = select_hwaccel(ffmpeg_path, encoder, info['video']['pix_fmt'], gpu_overlay=not regions)
+            if encoder_span is not None:
+                encoder_span.fields['encoder'] = encoder
+                encoder_span.fields['hwaccel'] = hwaccel
+
+        if is_checkpointed(mode, duration):
+            # A long full re-encode runs as one chunk at a time: the same load as the single
+            # pass, but a crash or cancel only loses the chunk in progress. Its chunks are
+            # only checkpoints, so they stay out of the chunk cache and go once it's done.
+            chunked_render(video_path, segments, output_path, ffmpeg_path, icon_path,
+                           encoder, audio_tracks=audio_tracks,
+                           workers=workers if mode == 'chunked' else 1, chunk_seconds=chunk_seconds,
+                           duration=duration, control=control, profile=profile, info=info, regions=regions,
+                           chunk_cache=mode == 'chunked')
+            return
+
+        encoder_args = encoder_output_args(encoder, profile, info)
+        if control is not None:
+            control.start_stage('Encoding', duration)
+        run_with_software_fallback(
+            lambda hwaccel: build_redaction_command(
+                ffmpeg_path, video_path, icon_path, segments, output_path,
+                encoder,
+                audio_tracks=audio_tracks,
+                encoder_args=encoder_args,
+                hwaccel=hwaccel,
+                regions=regions,
+            ),
+            hwaccel, control)
+    finally:
+        # Clean up temporary files
+        shutil.rmtree(audio_dir, ignore_errors=True)
@@ -0,0 +1,90 @@
+"""Pre-scaled mute icons, cached on disk per source icon and size.
+
+Every job needs the mute icon resized to a fifth of the video height. The
+resized PNGs are stored under the cache dir with names derived from the
+source icon's content hash and the target size, so jobs on videos of the
+same resolution share one file and concurrent jobs never overwrite each
+other's icon. The cache is bounded in size; least recently used icons are
+evicted first.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from hashbrown_cache import cache_dir
+
+# Bump when the resizing itself changes, so old renders are not reused
+ICON_CACHE_VERSION = 1
+ICON_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Icons used this recently are never evicted: a running job may still open them
+ICON_EVICT_MIN_AGE = 24 * 3600
+
+
+def _icon_digest(icon_path):
+    with open(icon_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def _evict(directory, keep):
+    """Drop the least recently used icons until the cache fits ICON_CACHE_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # Evicted by another job meanwhile
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - ICON_EVICT_MIN_AGE
+    for mtime, size, path in sorted(entries):
+        if total <= ICON_CACHE_MAX_BYTES or mtime > cutoff:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def scaled_icon(icon_path, size):
+    """Return the path of icon_path scaled to fit size x size, rendering it on a miss"""
+    size = max(1, int(size))
+    directory = cache_dir('icons')
+    name = f"{_icon_digest(icon_path)}-v{ICON_CACHE_VERSION}-{size}.png"
+    path = os.path.join(directory, name)
+    try:
+        # Touching marks the icon as recently used for the eviction order
+        os.utime(path)
+        return path
+    except OSError:
+        pass
+
+    from PIL import Image
+    icon_img = Image.open(icon_path)
+    icon_img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    # Render under a unique name and rename, so a job never sees half an icon
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.png', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            icon_img.save(f, format='PNG')
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _evict(directory, keep=path)
+    return path
+
+
+def clear_icon_cache():
+    """Remove every cached icon"""
+    directory = cache_dir('icons')
+    for name in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
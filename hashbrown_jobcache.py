@@ -0,0 +1,256 @@
+"""Cache of encoded chunks for incremental re-processing.
+
+In chunked mode every chunk is encoded independently, and its output only
+depends on the source file, the encoder settings, the icon, the chunk's
+time range and the segments inside it. Each encoded chunk is stored under
+a hash of exactly those inputs, so after a segment edit only the chunks
+whose redaction changed are encoded again; everything else is reused.
+
+The cache is bounded by HASHBROWN_CHUNK_CACHE_MB (default 10 GB, 0 turns
+it off) and evicts the least recently used chunks first. Run
+`python hashbrown_cli.py --purge-job-cache` to empty it.
+
+Each chunked job also keeps a journal: the chunks it has finished, with
+their size and SHA-256. When a job that crashed or was cancelled is run
+again, the finished chunks are checked against their hashes and only the
+rest are encoded, even when the chunk cache is turned off (its chunks are
+then kept next to the journal until the job completes). Journals of jobs
+that are never run again are dropped after a week.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from hashbrown_cache import cache_dir, load_json, save_json
+
+CHUNK_CACHE_ENV = 'HASHBROWN_CHUNK_CACHE_MB'
+DEFAULT_CHUNK_CACHE_MB = 10240
+# Bump when the chunk encoding changes in a way the key doesn't capture
+CHUNK_CACHE_VERSION = 1
+# Chunks used this recently are never evicted: another job may be about to join them
+CHUNK_EVICT_MIN_AGE = 3600
+# Bytes read from each end of the source for its fingerprint
+FINGERPRINT_BYTES = 1024 * 1024
+# Bump when the journal layout changes
+JOURNAL_VERSION = 1
+# Journals (and their chunks) of jobs that weren't run again within this long are removed
+JOURNAL_MAX_AGE = 7 * 24 * 3600
+# Bytes read at a time when hashing a chunk
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def chunk_cache_limit():
+    """Cache size limit in bytes; 0 means the cache is disabled"""
+    try:
+        megabytes = float(os.environ.get(CHUNK_CACHE_ENV, DEFAULT_CHUNK_CACHE_MB))
+    except ValueError:
+        megabytes = DEFAULT_CHUNK_CACHE_MB
+    return max(0, int(megabytes * 1024 * 1024))
+
+
+def _chunk_dir():
+    return cache_dir('chunks')
+
+
+def file_fingerprint(path):
+    """Hash of a file's size, mtime and first and last megabyte.
+
+    Hashing a multi-gigabyte video in full would take as long as decoding
+    it; the head and tail catch re-exports and in-place edits in practice.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if stat.st_size > 2 * FINGERPRINT_BYTES:
+            f.seek(-FINGERPRINT_BYTES, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def chunk_key(**inputs):
+    """Stable key for an encoded chunk from everything that affects its bytes"""
+    inputs['version'] = CHUNK_CACHE_VERSION
+    text = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_path(key):
+    return os.path.join(_chunk_dir(), f'{key}.ts')
+
+
+def lookup_chunk(key):
+    """Path of the cached chunk for key (marked as recently used), or None"""
+    path = _chunk_path(key)
+    try:
+        os.utime(path)
+        return path
+    except OSError:
+        return None
+
+
+def reserve_chunk(key):
+    """Unique temp path inside the cache to encode a chunk into before store_chunk()"""
+    fd, temp_path = tempfile.mkstemp(prefix=f'.tmp-{key[:12]}-', suffix='.ts', dir=_chunk_dir())
+    os.close(fd)
+    return temp_path
+
+
+def store_chunk(key, temp_path):
+    """Publish an encoded chunk under its key and return its cache path"""
+    path = _chunk_path(key)
+    os.replace(temp_path, path)
+    return path
+
+
+def _entries():
+    directory = _chunk_dir()
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # Removed by another job meanwhile
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict_chunks(keep=()):
+    """Drop the least recently used chunks until the cache fits its limit"""
+    keep = set(keep)
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    limit = chunk_cache_limit()
+    cutoff = time.time() - CHUNK_EVICT_MIN_AGE
+    for mtime, size, path in sorted(entries):
+        if total <= limit or mtime > cutoff:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def chunk_cache_usage():
+    """(number of cached chunks, total bytes)"""
+    entries = [entry for entry in _entries() if not os.path.basename(entry[2]).startswith('.tmp-')]
+    return len(entries), sum(size for _, size, _ in entries)
+
+
+def purge_chunk_cache():
+    """Remove every cached chunk and job journal; returns the number of bytes freed"""
+    freed = 0
+    for _, size, path in _entries():
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    for name in os.listdir(_journal_dir()):
+        freed += _remove_journal(os.path.join(_journal_dir(), name))
+    return freed
+
+
+def _journal_dir():
+    return cache_dir('journals')
+
+
+def _remove_journal(path):
+    """Remove a journal file or a journal's chunk directory; returns the bytes freed"""
+    freed = 0
+    try:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                freed += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+            shutil.rmtree(path)
+        else:
+            freed = os.path.getsize(path)
+            os.remove(path)
+    except OSError:
+        pass
+    return freed
+
+
+def clean_stale_journals():
+    """Drop the journals, and their chunks, of jobs that haven't run for JOURNAL_MAX_AGE"""
+    directory = _journal_dir()
+    cutoff = time.time() - JOURNAL_MAX_AGE
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stale = os.path.getmtime(path) < cutoff
+        except OSError:
+            continue
+        if stale:
+            _remove_journal(path)
+
+
+class JobJournal:
+    """The chunks a chunked job has finished, kept on disk so a re-run resumes after them.
+
+    key identifies the job (a chunk_key of its inputs). Entries are written
+    as each chunk completes and checked against their SHA-256 before reuse.
+    """
+
+    def __init__(self, key):
+        clean_stale_journals()
+        self.key = key
+        self.path = os.path.join(_journal_dir(), f'{key}.json')
+        self._lock = threading.Lock()
+        record = load_json(self.path)
+        if not record or record.get('version') != JOURNAL_VERSION:
+            record = {'version': JOURNAL_VERSION, 'chunks': {}}
+        self.record = record
+        # Chunks verified and reused by this run
+        self.resumed = 0
+
+    def verified(self, chunk_key):
+        """Path of a chunk this job finished before, if it is still there with the same hash"""
+        entry = self.record['chunks'].get(chunk_key)
+        if entry is None:
+            return None
+        try:
+            if os.path.getsize(entry['path']) == entry['size'] and file_sha256(entry['path']) == entry['sha256']:
+                os.utime(entry['path'])  # Recently used, so the chunk cache keeps it
+                self.resumed += 1
+                return entry['path']
+        except OSError:
+            pass
+        with self._lock:
+            self.record['chunks'].pop(chunk_key, None)
+        return None
+
+    def chunk_path(self, index):
+        """Where to keep chunk `index` when the chunk cache is off"""
+        return os.path.join(cache_dir('journals', self.key), f'encoded{index:05d}.ts')
+
+    def add(self, chunk_key, path):
+        """Record a finished chunk; the journal on disk is updated before this returns"""
+        entry = {'path': path, 'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+        with self._lock:
+            self.record['chunks'][chunk_key] = entry
+            try:
+                save_json(self.path, self.record)
+            except OSError:
+                pass  # The job still completes; it just can't resume after this chunk
+
+    def finish(self):
+        """Forget the journal of a completed job, with any chunks kept alongside it"""
+        _remove_journal(self.path)
+        _remove_journal(os.path.join(_journal_dir(), self.key))
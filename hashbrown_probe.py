@@ -0,0 +1,416 @@
+"""Lightweight media metadata for Hashbrown, cached per file.
+
+A single ffprobe JSON call (or, with the bundled ffmpeg that has no
+ffprobe, one `ffmpeg -i` dump) gives the duration, dimensions, frame rate
+and stream layout. The keyframe index needs a pass over the whole file, so
+it is only built when a mode needs it. Both are cached on disk, keyed by the
+file's path, size and mtime, so re-opening a file is instant.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from hashbrown_cache import cache_dir, load_json, save_json
+
+# Bump when the cached record layout changes
+MEDIA_CACHE_VERSION = 3
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class ProbeError(Exception):
+    """Raised when a file's metadata can't be read"""
+
+
+def find_ffmpeg():
+    """Locate ffmpeg - use the one bundled with imageio_ffmpeg"""
+    try:
+        import imageio_ffmpeg
+        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+        os.environ['IMAGEIO_FFMPEG_EXE'] = ffmpeg_path
+    except Exception as e:
+        # Fallback to system ffmpeg if imageio_ffmpeg fails
+        ffmpeg_path = 'ffmpeg'
+        import warnings
+        warnings.warn(f"Could not load imageio_ffmpeg ({e}). Using system FFmpeg if available.")
+    return ffmpeg_path
+
+
+def find_ffprobe(ffmpeg_path):
+    """Locate ffprobe next to ffmpeg or on the PATH (imageio_ffmpeg doesn't bundle it)"""
+    directory, name = os.path.split(ffmpeg_path)
+    candidate = os.path.join(directory, name.replace('ffmpeg', 'ffprobe', 1))
+    if directory and os.path.isfile(candidate):
+        return candidate
+    return shutil.which('ffprobe')
+
+
+def to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _run(cmd):
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, errors='replace', check=True)
+    except subprocess.CalledProcessError as e:
+        raise ProbeError(f"Could not read {cmd[-1]}: {e.stderr.strip()}")
+    except FileNotFoundError:
+        raise ProbeError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+
+
+def _frame_rate(value):
+    """'30000/1001' -> 29.97"""
+    num, _, den = str(value or '').partition('/')
+    num, den = to_float(num), to_float(den or 1)
+    return round(num / den, 3) if num and den else None
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _cache_file(key):
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir('media'), f'{name}.json')
+
+
+def _parse_ffprobe(data):
+    fmt = data.get('format', {})
+    info = {
+        'duration': to_float(fmt.get('duration')),
+        'start_time': to_float(fmt.get('start_time'), 0.0),
+        'format_name': fmt.get('format_name'),
+        'bit_rate': _to_int(fmt.get('bit_rate')),
+        'video': None,
+        'audio': [],
+        'subtitles': [],
+    }
+    for stream in data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video' and info['video'] is None:
+            if stream.get('disposition', {}).get('attached_pic'):
+                continue  # Cover art, not the actual picture track
+            rotation = _to_int(stream.get('tags', {}).get('rotate'), 0)
+            for side_data in stream.get('side_data_list', []):
+                if 'rotation' in side_data:
+                    rotation = _to_int(side_data['rotation'], 0)
+            info['video'] = {
+                'index': stream.get('index'),
+                'codec_name': stream.get('codec_name'),
+                'profile': stream.get('profile'),
+                'level': _to_int(stream.get('level')),
+                'pix_fmt': stream.get('pix_fmt'),
+                'width': stream.get('width'),
+                'height': stream.get('height'),
+                'rotation': rotation,
+                'fps': _frame_rate(stream.get('avg_frame_rate')) or _frame_rate(stream.get('r_frame_rate')),
+                'bit_rate': _to_int(stream.get('bit_rate')),
+            }
+        elif codec_type == 'audio':
+            info['audio'].append({
+                'index': stream.get('index'),
+                'codec_name': stream.get('codec_name'),
+                'sample_rate': _to_int(stream.get('sample_rate')),
+                'channels': stream.get('channels'),
+                'channel_layout': stream.get('channel_layout'),
+                'bit_rate': _to_int(stream.get('bit_rate')),
+                'sample_fmt': stream.get('sample_fmt'),
+                'bits_per_raw_sample': _to_int(stream.get('bits_per_raw_sample')),
+            })
+        elif codec_type == 'subtitle':
+            info['subtitles'].append({'index': stream.get('index'), 'codec_name': stream.get('codec_name')})
+    return info
+
+
+def _strip_parens(text):
+    while True:
+        stripped = re.sub(r'\([^()]*\)', '', text)
+        if stripped == text:
+            return text
+        text = stripped
+
+
+def parse_ffmpeg_dump(stderr):
+    """Build the same record as the ffprobe path from ffmpeg's `-i` input dump"""
+    info = {
+        'duration': None,
+        'start_time': 0.0,
+        'format_name': None,
+        'bit_rate': None,
+        'video': None,
+        'audio': [],
+        'subtitles': [],
+    }
+    match = re.search(r'Input #0, ([^,]+(?:,[^,\s]+)*), from', stderr)
+    if match:
+        info['format_name'] = match.group(1)
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = re.search(r'start: (-?[\d.]+)', stderr)
+    if match:
+        info['start_time'] = float(match.group(1))
+    match = re.search(r'Duration:.*bitrate: (\d+) kb/s', stderr)
+    if match:
+        info['bit_rate'] = int(match.group(1)) * 1000
+
+    lines = stderr.splitlines()
+    for n, line in enumerate(lines):
+        match = re.search(r'Stream #\d+:(\d+).*?: (Video|Audio|Subtitle): (.*)', line)
+        if not match:
+            continue
+        index, codec_type, description = int(match.group(1)), match.group(2), match.group(3)
+        bit_rate = re.search(r'(\d+) kb/s', description)
+        bit_rate = int(bit_rate.group(1)) * 1000 if bit_rate else None
+        # e.g. "h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709), 1920x1080 [SAR 1:1 DAR 16:9], ..."
+        parts = [part.strip() for part in _strip_parens(description).split(',')]
+        codec_name = parts[0].split()[0] if parts[0] else None
+
+        if codec_type == 'Video' and info['video'] is None and 'attached pic' not in description:
+            size = re.search(r'(\d{2,5})x(\d{2,5})', description)
+            fps = re.search(r'([\d.]+) fps', description)
+            rotation = 0
+            # The display matrix is printed a few lines below the stream
+            for extra in lines[n + 1:n + 6]:
+                if extra.lstrip().startswith('Stream #'):
+                    break
+                rotate = re.search(r'rotation of (-?[\d.]+) degrees', extra)
+                if rotate:
+                    rotation = int(float(rotate.group(1)))
+            info['video'] = {
+                'index': index,
+                'codec_name': codec_name,
+                'profile': None,
+                'level': None,
+                'pix_fmt': parts[1] if len(parts) > 1 and re.fullmatch(r'\w+', parts[1]) else None,
+                'width': int(size.group(1)) if size else None,
+                'height': int(size.group(2)) if size else None,
+                'rotation': rotation,
+                'fps': float(fps.group(1)) if fps else None,
+                'bit_rate': bit_rate,
+            }
+        elif codec_type == 'Audio':
+            sample_rate = re.search(r'(\d+) Hz', description)
+            layout = parts[2] if len(parts) > 2 else None
+            channels = {'mono': 1, 'stereo': 2, '2.1': 3, 'quad': 4, '5.0': 5, '5.1': 6, '7.1': 8}.get(layout)
+            match_channels = re.search(r'(\d+) channels', description)
+            if match_channels:
+                channels = int(match_channels.group(1))
+            raw_bits = re.search(r'\((\d+) bit\)', description)
+            info['audio'].append({
+                'index': index,
+                'codec_name': codec_name,
+                'sample_rate': int(sample_rate.group(1)) if sample_rate else None,
+                'channels': channels,
+                'channel_layout': layout,
+                'bit_rate': bit_rate,
+                'sample_fmt': parts[3] if len(parts) > 3 and re.fullmatch(r'\w+', parts[3]) else None,
+                'bits_per_raw_sample': int(raw_bits.group(1)) if raw_bits else None,
+            })
+        elif codec_type == 'Subtitle':
+            info['subtitles'].append({'index': index, 'codec_name': codec_name})
+    return info
+
+
+def _probe_uncached(ffmpeg_path, path):
+    ffprobe_path = find_ffprobe(ffmpeg_path)
+    if ffprobe_path:
+        result = _run([
+            ffprobe_path, '-v', 'error', '-of', 'json',
+            '-show_format', '-show_streams', path,
+        ])
+        try:
+            return _parse_ffprobe(json.loads(result.stdout))
+        except ValueError:
+            raise ProbeError(f"Could not read {path}: ffprobe returned invalid JSON")
+
+    # ffmpeg exits with an error when given no output, but the dump is complete
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-i', path],
+                                capture_output=True, text=True, errors='replace')
+    except FileNotFoundError:
+        raise ProbeError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+    if 'Input #0' not in result.stderr:
+        raise ProbeError(f"Could not read {path}: {result.stderr.strip().splitlines()[-1:] or 'unknown error'}")
+    return parse_ffmpeg_dump(result.stderr)
+
+
+def _load_record(path):
+    key = _file_key(path)
+    with _memo_lock:
+        if key in _memo:
+            return key, _memo[key]
+    record = load_json(_cache_file(key))
+    if not record or record.get('version') != MEDIA_CACHE_VERSION or record.get('key') != key:
+        return key, None
+    with _memo_lock:
+        _memo[key] = record
+    return key, record
+
+
+def _store_record(key, record):
+    with _memo_lock:
+        _memo[key] = record
+    try:
+        save_json(_cache_file(key), record)
+    except OSError:
+        pass  # Caching is an optimisation only
+
+
+def probe_media(ffmpeg_path, path):
+    """Return the cached metadata record for path, probing it on a miss.
+
+    The record holds 'duration', 'start_time', 'format_name', 'bit_rate',
+    'video' (codec_name, pix_fmt, width, height, rotation, fps, ...),
+    'audio' and 'subtitles' (lists of stream dicts). Display width/height
+    already account for rotation.
+    """
+    try:
+        key, record = _load_record(path)
+    except OSError as e:
+        raise ProbeError(f"Could not read {path}: {e}")
+    if record is None:
+        info = _probe_uncached(ffmpeg_path, path)
+        video = info['video']
+        if video and video['width'] and abs(video['rotation']) in (90, 270):
+            # ffmpeg autorotates before filtering, so the overlay sees the rotated frame
+            video['width'], video['height'] = video['height'], video['width']
+        record = {'version': MEDIA_CACHE_VERSION, 'key': key, 'info': info, 'keyframes': None}
+        _store_record(key, record)
+    return record['info']
+
+
+def _scan_keyframes(ffmpeg_path, path):
+    ffprobe_path = find_ffprobe(ffmpeg_path)
+    if ffprobe_path:
+        # Reading packet flags only demuxes the file, nothing gets decoded
+        result = _run([
+            ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'format=start_time:packet=pts_time,flags',
+            '-of', 'csv', path,
+        ])
+        start_time = 0.0
+        times = []
+        for line in result.stdout.splitlines():
+            fields = line.strip().split(',')
+            if fields[0] == 'format' and len(fields) > 1:
+                start_time = to_float(fields[1], 0.0)
+            elif fields[0] == 'packet' and len(fields) > 2 and fields[2].startswith('K'):
+                pts = to_float(fields[1])
+                if pts is not None:
+                    times.append(pts)
+        # ffmpeg shifts output timestamps to start at zero, so do the same here
+        return sorted(round(t - start_time, 6) for t in times)
+
+    # No ffprobe: decode only the keyframes and let showinfo print their times
+    result = _run([
+        ffmpeg_path, '-hide_banner', '-nostats', '-skip_frame', 'nokey',
+        '-i', path, '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-',
+    ])
+    return sorted(float(m) for m in re.findall(r'pts_time:\s*(-?[\d.]+)', result.stderr))
+
+
+def probe_keyframes(ffmpeg_path, path):
+    """Return the sorted presentation times (in seconds) of the video keyframes.
+
+    Built on first use and stored alongside the file's metadata record.
+    """
+    probe_media(ffmpeg_path, path)
+    key, record = _load_record(path)
+    if record is None:
+        # The cache couldn't be written; just scan without storing
+        return _scan_keyframes(ffmpeg_path, path)
+    if record.get('keyframes') is None:
+        record = dict(record, keyframes=_scan_keyframes(ffmpeg_path, path))
+        _store_record(key, record)
+    return record['keyframes']
+
+
+def _packet_runs(times):
+    """Compress sorted packet times into [first, last, count] runs of evenly spaced packets"""
+    runs = []
+    for t in times:
+        if runs:
+            first, last, count = runs[-1]
+            step = (last - first) / (count - 1) if count > 1 else t - last
+            if abs(t - last - step) < 1e-5:
+                runs[-1] = [first, t, count + 1]
+                continue
+        runs.append([t, t, 1])
+    return runs
+
+
+def _expand_runs(runs):
+    times = []
+    for first, last, count in runs:
+        step = (last - first) / (count - 1) if count > 1 else 0.0
+        times.extend(round(first + step * i, 6) for i in range(count))
+    return times
+
+
+def _scan_audio_packets(ffprobe_path, path, track):
+    result = _run([
+        ffprobe_path, '-v', 'error', '-select_streams', f'a:{track}',
+        '-show_entries', 'format=start_time:packet=pts_time',
+        '-of', 'csv', path,
+    ])
+    start_time = 0.0
+    times = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if fields[0] == 'format' and len(fields) > 1:
+            start_time = to_float(fields[1], 0.0)
+        elif fields[0] == 'packet' and len(fields) > 1:
+            pts = to_float(fields[1])
+            if pts is not None:
+                times.append(pts)
+    return sorted(round(t - start_time, 6) for t in times)
+
+
+def probe_audio_packets(ffmpeg_path, path, track):
+    """Return the sorted start times (in seconds) of the packets of audio track `track`.
+
+    Needs ffprobe (returns None without it). Stored alongside the file's
+    metadata record as runs of evenly spaced packets, which for constant
+    frame size codecs is a single entry however long the file is.
+    """
+    ffprobe_path = find_ffprobe(ffmpeg_path)
+    if not ffprobe_path:
+        return None
+    probe_media(ffmpeg_path, path)
+    key, record = _load_record(path)
+    if record is None:
+        return _scan_audio_packets(ffprobe_path, path, track)
+    packets = dict(record.get('audio_packets') or {})
+    if str(track) not in packets:
+        packets[str(track)] = _packet_runs(_scan_audio_packets(ffprobe_path, path, track))
+        record = dict(record, audio_packets=packets)
+        _store_record(key, record)
+    return _expand_runs(packets[str(track)])
+
+
+def clear_media_cache():
+    """Forget every cached metadata record and keyframe index"""
+    with _memo_lock:
+        _memo.clear()
+    directory = cache_dir('media')
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,195 @@
+"""Encoding profiles: how much encode time to spend for how many bytes.
+
+The encoders used to run with one fixed setting (libx264 fast/CRF 23, NVENC
+p4 at 10M), which wastes time on drafts and blows short, low-resolution
+clips up to several times their source size. A profile picks the encoder
+speed preset and quality target, and the probed source decides the rest:
+
+- the bitrate is capped relative to the source's own video bitrate (or,
+  when the container doesn't say, to what its resolution and frame rate
+  usually need), adjusted for how efficient the output codec is compared
+  to the source codec;
+- the pixel format keeps the source's bit depth (and, for archival, its
+  chroma subsampling) when the encoder can write it;
+- software encoders get an explicit thread count, so jobs sharing the
+  machine don't each start one thread per core.
+
+Smart render splices re-encoded GOPs between stream-copied ones, so there
+the software encoder instead copies the source's profile, level and pixel
+format (match_source), keeping the parameter sets compatible mid-file.
+"""
+import os
+
+PROFILE_ENV = 'HASHBROWN_PROFILE'
+CODEC_ENV = 'HASHBROWN_CODEC'
+DEFAULT_PROFILE = 'balanced'
+DEFAULT_CODEC = 'h264'
+
+# 'quality' is the CRF-style target per output codec (lower is better),
+# 'speed' picks the encoder preset from SPEED_PRESETS, and 'bitrate_factor'
+# caps the output at that multiple of the (codec-adjusted) source bitrate.
+PROFILES = {
+    'draft': {'label': "Draft (fastest, smaller files)", 'speed': 'fastest',
+              'quality': {'h264': 28, 'hevc': 30, 'av1': 42}, 'bitrate_factor': 1.0, 'keep_chroma': False},
+    'balanced': {'label': "Balanced", 'speed': 'fast',
+                 'quality': {'h264': 23, 'hevc': 25, 'av1': 35}, 'bitrate_factor': 1.25, 'keep_chroma': False},
+    'archival': {'label': "Archival (slow, best quality)", 'speed': 'slow',
+                 'quality': {'h264': 18, 'hevc': 20, 'av1': 28}, 'bitrate_factor': 2.5, 'keep_chroma': True},
+}
+
+# Encoder presets per profile speed, by encoder name or encoder family
+SPEED_PRESETS = {
+    'libx264': {'fastest': 'ultrafast', 'fast': 'veryfast', 'slow': 'slow'},
+    'libx265': {'fastest': 'ultrafast', 'fast': 'fast', 'slow': 'slow'},
+    'libsvtav1': {'fastest': '12', 'fast': '8', 'slow': '4'},
+    'nvenc': {'fastest': 'p1', 'fast': 'p4', 'slow': 'p7'},
+    'qsv': {'fastest': 'veryfast', 'fast': 'faster', 'slow': 'slower'},
+    'amf': {'fastest': 'speed', 'fast': 'balanced', 'slow': 'quality'},
+}
+
+# Bits the codecs need for the same picture, relative to H.264
+CODEC_EFFICIENCY = {'h264': 1.0, 'mpeg4': 1.4, 'mpeg2video': 2.0, 'hevc': 0.65, 'vp9': 0.65, 'av1': 0.5}
+# Bits per pixel per frame an H.264 encode of typical footage needs, for sources without a bitrate
+H264_BITS_PER_PIXEL = 0.1
+# Never cap below this, or short talking-head clips turn to mush
+MIN_BITRATE = 300_000
+
+# Pixel formats each software encoder can write; hardware encoders pick their own
+SOFTWARE_PIX_FMTS = {
+    'libx264': ('yuv420p', 'yuvj420p', 'yuv422p', 'yuv444p', 'yuv420p10le', 'yuv422p10le', 'yuv444p10le'),
+    'libx265': ('yuv420p', 'yuv422p', 'yuv444p', 'yuv420p10le', 'yuv422p10le', 'yuv444p10le'),
+    'libsvtav1': ('yuv420p', 'yuv420p10le'),
+}
+# ffprobe's profile names as the software encoders' -profile:v values
+SOURCE_PROFILES = {
+    'libx264': {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high',
+                'High 10': 'high10', 'High 4:2:2': 'high422', 'High 4:4:4 Predictive': 'high444'},
+    'libx265': {'Main': 'main', 'Main 10': 'main10', 'Main Still Picture': 'mainstillpicture'},
+}
+# ffprobe reports the level as the codec's level_idc: 10x the level for H.264, 30x for HEVC
+LEVEL_SCALE = {'libx264': 10, 'libx265': 30}
+
+# Encoders to fall back on when no hardware encoder for the codec works
+SOFTWARE_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'av1': 'libsvtav1'}
+
+
+def resolve_profile(name=None):
+    """Profile name from the argument, HASHBROWN_PROFILE or the default"""
+    name = name or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile {name!r} (choose from {', '.join(PROFILES)})")
+    return name
+
+
+def resolve_codec(name=None):
+    """Output codec from the argument, HASHBROWN_CODEC or the default"""
+    name = name or os.environ.get(CODEC_ENV) or DEFAULT_CODEC
+    if name not in SOFTWARE_ENCODERS:
+        raise ValueError(f"Unknown output codec {name!r} (choose from {', '.join(SOFTWARE_ENCODERS)})")
+    return name
+
+
+def source_bitrate(info):
+    """Video bitrate of the probed source in bits/s, estimated from its size if it isn't stated"""
+    video = info.get('video') or {}
+    if video.get('bit_rate'):
+        return video['bit_rate']
+    if info.get('bit_rate'):
+        audio = sum(stream.get('bit_rate') or 0 for stream in info.get('audio') or [])
+        if info['bit_rate'] > audio:
+            return info['bit_rate'] - audio
+    if video.get('width') and video.get('height'):
+        efficiency = CODEC_EFFICIENCY.get(video.get('codec_name'), 1.0)
+        return int(video['width'] * video['height'] * (video.get('fps') or 30) * H264_BITS_PER_PIXEL * efficiency)
+    return None
+
+
+def target_maxrate(info, codec, profile):
+    """Bitrate cap for the output in bits/s, or None if nothing is known about the source"""
+    bitrate = source_bitrate(info)
+    if not bitrate:
+        return None
+    source_codec = (info.get('video') or {}).get('codec_name')
+    scale = CODEC_EFFICIENCY[codec] / CODEC_EFFICIENCY.get(source_codec, 1.0)
+    return max(MIN_BITRATE, int(bitrate * scale * PROFILES[profile]['bitrate_factor']))
+
+
+def output_pix_fmt(encoder, profile, source_pix_fmt):
+    """Pixel format for a software encoder: the source's when possible, else 4:2:0 at its bit depth"""
+    supported = SOFTWARE_PIX_FMTS.get(encoder)
+    if not supported:
+        return None
+    if source_pix_fmt in supported and (PROFILES[profile]['keep_chroma'] or '420' in source_pix_fmt):
+        return source_pix_fmt
+    ten_bit = bool(source_pix_fmt) and source_pix_fmt.endswith(('10le', '10be', '12le', '12be'))
+    if ten_bit and 'yuv420p10le' in supported:
+        return 'yuv420p10le'
+    return 'yuv420p'
+
+
+def thread_args(encoder, threads, x265_params=()):
+    """Thread settings for a software encoder that has `threads` cores to itself.
+
+    x265_params are more key=value settings for libx265, which only takes one -x265-params.
+    """
+    threads = max(1, threads or os.cpu_count() or 1)
+    if encoder == 'libx264':
+        # x264's default lookahead share (threads/6) starves it on many-core machines
+        lookahead = max(1, min(8, threads // 4))
+        return ['-x264-params', f'threads={threads}:lookahead-threads={lookahead}']
+    if encoder == 'libx265':
+        return ['-x265-params', ':'.join([f'pools={threads}'] + list(x265_params))]
+    if encoder == 'libsvtav1':
+        return ['-svtav1-params', f'lp={threads}']
+    return []
+
+
+def can_match_source(encoder, video):
+    """Whether the software encoder can write the source video's pixel format, as match_source needs"""
+    return bool(video) and video.get('pix_fmt') in SOFTWARE_PIX_FMTS.get(encoder, ())
+
+
+def profile_args(encoder, family, codec, profile, info=None, threads=None, match_source=False):
+    """Output options after -c:v for the encoder, tuned by profile to the probed source.
+
+    match_source (software encoders only, see can_match_source) also gives
+    the output the source's profile, level and pixel format.
+    """
+    settings = PROFILES[profile]
+    quality = settings['quality'][codec]
+    preset = (SPEED_PRESETS.get(encoder) or SPEED_PRESETS.get(family) or {}).get(settings['speed'])
+    maxrate = target_maxrate(info, codec, profile) if info else None
+    args = []
+
+    if family == 'software':
+        args += ['-preset', preset, '-crf', str(quality)]
+        if maxrate:
+            args += ['-maxrate', str(maxrate), '-bufsize', str(2 * maxrate)]
+        video = (info.get('video') or {}) if info else {}
+        x265_params = []
+        if match_source:
+            args += ['-pix_fmt', video['pix_fmt']]
+            source_profile = SOURCE_PROFILES.get(encoder, {}).get(video.get('profile'))
+            if source_profile:
+                args += ['-profile:v', source_profile]
+            level = video.get('level')
+            if level and level > 0 and encoder == 'libx264':
+                args += ['-level', f'{level / LEVEL_SCALE[encoder]:g}']
+            elif level and level > 0 and encoder == 'libx265':
+                x265_params.append(f'level-idc={level / LEVEL_SCALE[encoder]:g}')
+        else:
+            pix_fmt = output_pix_fmt(encoder, profile, video.get('pix_fmt'))
+            if pix_fmt:
+                args += ['-pix_fmt', pix_fmt]
+        args += thread_args(encoder, threads, x265_params)
+    elif family == 'nvenc':
+        args += ['-preset', preset, '-rc:v', 'vbr', '-cq:v', str(quality)]
+        if maxrate:
+            args += ['-b:v', str(maxrate * 2 // 3), '-maxrate:v', str(maxrate), '-bufsize:v', str(2 * maxrate)]
+    elif family == 'qsv':
+        args += ['-preset', preset, '-global_quality', str(quality)]
+    elif family == 'amf':
+        args += ['-quality', preset, '-rc', 'cqp', '-qp_i', str(quality), '-qp_p', str(quality)]
+    elif family == 'vaapi':
+        args += ['-qp', str(quality)]
+    return args
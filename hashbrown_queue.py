@@ -0,0 +1,266 @@
+"""Multi-file job queue and the pipelined scheduler that works through it.
+
+The scheduler runs two stages at once: a prober reads the metadata (and,
+for smart and chunked mode, the keyframe index) of the next videos while
+earlier ones are still encoding, so the encoders never wait on the disk.
+How many videos encode at the same time is bounded by CPU cores and, for
+NVENC, by the driver's session limit, each job being charged against the
+one its own encoder uses. JobQueue keeps the GUI's queue on
+disk after every change, so jobs interrupted by a crash are picked up again
+on the next start.
+"""
+import collections
+import os
+import queue
+import threading
+import uuid
+
+from hashbrown_cache import cache_dir, load_json, save_json
+from hashbrown_capabilities import ENCODERS, is_hardware_encoder, select_encoder
+from hashbrown_engine import NVENC_SESSION_LIMIT, JobControl, RedactionCancelled, smart_encoder
+from hashbrown_probe import ProbeError, probe_keyframes, probe_media
+from hashbrown_profiles import DEFAULT_CODEC, SOFTWARE_ENCODERS, resolve_codec
+
+# Videos probed ahead of the encoders; each one means reading a file early
+PROBE_AHEAD = 2
+# Threads a single libx264 encode can keep busy before scaling flattens out
+SOFTWARE_ENCODE_THREADS = 8
+# Statuses a crash can leave behind; they go back to 'pending' on load
+INTERRUPTED_STATUSES = ('probing', 'queued', 'running')
+
+
+class JobQueue:
+    """The GUI's list of videos to redact, saved to disk on every change.
+
+    Each job is a dict with 'id', 'input', 'segments' ([start, end] pairs),
+    'mode', 'profile', 'codec', 'status' ('pending', 'probing', 'queued', 'running', 'done',
+    'failed' or 'cancelled'), 'output' and 'error'.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), 'queue.json')
+        self._lock = threading.Lock()
+        self.jobs = load_json(self.path, [])
+        for job in self.jobs:
+            if job.get('status') in INTERRUPTED_STATUSES:
+                job['status'] = 'pending'
+
+    def save(self):
+        with self._lock:
+            jobs = [dict(job) for job in self.jobs]
+        try:
+            save_json(self.path, jobs)
+        except OSError:
+            pass  # Losing the crash-recovery copy must not stop the work itself
+
+    def add(self, input_path, segments=(), mode=None):
+        job = {
+            'id': uuid.uuid4().hex,
+            'input': input_path,
+            'segments': [list(segment) for segment in segments],
+            'regions': [],
+            'mode': mode,
+            'profile': None,
+            'codec': None,
+            'status': 'pending',
+            'output': None,
+            'error': None,
+        }
+        with self._lock:
+            self.jobs.append(job)
+        self.save()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return next((job for job in self.jobs if job['id'] == job_id), None)
+
+    def remove(self, job_id):
+        with self._lock:
+            self.jobs = [job for job in self.jobs if job['id'] != job_id]
+        self.save()
+
+    def update(self, job_id, **changes):
+        with self._lock:
+            for job in self.jobs:
+                if job['id'] == job_id:
+                    job.update(changes)
+        self.save()
+
+    def pending(self):
+        with self._lock:
+            return [job for job in self.jobs if job['status'] in ('pending', 'failed', 'cancelled')]
+
+
+class _Capacity:
+    """First-come, first-served semaphore where each job takes as many units as it needs"""
+
+    def __init__(self, units):
+        self.units = units
+        self._free = units
+        self._waiting = collections.deque()
+        self._condition = threading.Condition()
+
+    def acquire(self, units, cancelled):
+        units = min(units, self.units)
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                # Waiting in line keeps small jobs from starving a big one
+                while self._waiting[0] is not ticket or self._free < units:
+                    if cancelled.is_set():
+                        raise RedactionCancelled("Processing was cancelled.")
+                    self._condition.wait(timeout=0.5)
+                self._free -= units
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+        return units
+
+    def release(self, units):
+        with self._condition:
+            self._free += units
+            self._condition.notify_all()
+
+
+class BatchScheduler:
+    """Probe, queue and encode a list of jobs as a pipeline.
+
+    runner(job, control) does the actual redaction and returns its result;
+    on_event(job, event, payload) is called from worker threads with
+    event 'probing', 'queued', 'running', 'progress' (payload: the
+    JobControl progress dict), 'done' (payload: the runner's result),
+    'failed' (payload: the error message) or 'cancelled'.
+    """
+
+    def __init__(self, ffmpeg_path, runner, max_jobs=2, workers=None, probe_ahead=PROBE_AHEAD,
+                 on_event=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.runner = runner
+        self.max_jobs = max(1, max_jobs)
+        self.workers = workers
+        self.probe_ahead = max(1, probe_ahead)
+        self.on_event = on_event
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._controls = set()
+        self._threads = []
+
+    def _emit(self, job, event, payload=None):
+        if self.on_event is not None:
+            self.on_event(job, event, payload)
+
+    def cancel(self):
+        """Stop probing, drop the queued jobs and cancel the running ones"""
+        self._cancelled.set()
+        with self._lock:
+            controls = list(self._controls)
+        for control in controls:
+            control.cancel()
+
+    def wait(self):
+        """Block until the prober and the encode workers of the last run have stopped"""
+        for thread in self._threads:
+            thread.join()
+
+    def _pool(self, encoder):
+        """The capacity a job on this encoder draws from: NVENC sessions, or CPU cores for the rest"""
+        return 'nvenc' if ENCODERS.get(encoder, {}).get('family') == 'nvenc' else 'cpu'
+
+    def _job_encoder(self, job, info):
+        """The encoder redact_video will pick for the job, or None for audio-only jobs"""
+        mode = job.get('mode') or 'full'
+        if mode == 'audio':
+            return None
+        if mode == 'smart' and info.get('video'):
+            # Smart mode re-encodes with the source codec's software encoder (or falls back to a full encode)
+            encoder = smart_encoder(self.ffmpeg_path, info['video'])
+            if encoder:
+                return encoder
+        try:
+            codec = resolve_codec(job.get('codec'))
+        except ValueError:
+            codec = DEFAULT_CODEC  # redact_video will fail the job; any capacity will do
+        return select_encoder(self.ffmpeg_path, codec) or SOFTWARE_ENCODERS[codec]
+
+    def _cost(self, job, encoder, capacity):
+        """Units of the capacity (NVENC sessions or CPU cores) one job occupies"""
+        mode = job.get('mode') or 'full'
+        if mode == 'audio':
+            return 1
+        if mode == 'chunked':
+            return min(self.workers or capacity, capacity)
+        if is_hardware_encoder(encoder):
+            return 1
+        return min(SOFTWARE_ENCODE_THREADS, capacity)
+
+    def _probe_all(self, jobs, ready):
+        for job in jobs:
+            if self._cancelled.is_set():
+                self._emit(job, 'cancelled')
+                continue
+            self._emit(job, 'probing')
+            try:
+                info = probe_media(self.ffmpeg_path, job['input'])
+                if job.get('mode') in ('smart', 'chunked'):
+                    # Reads the whole file, which also warms the OS cache for the encoder
+                    probe_keyframes(self.ffmpeg_path, job['input'])
+                encoder = self._job_encoder(job, info)
+            except (OSError, ProbeError) as e:
+                self._emit(job, 'failed', str(e))
+                continue
+            self._emit(job, 'queued')
+            while True:
+                if self._cancelled.is_set():
+                    self._emit(job, 'cancelled')
+                    break
+                try:
+                    ready.put((job, encoder), timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+        for _ in range(self.max_jobs):
+            ready.put(None)
+
+    def _encode_worker(self, ready, capacities):
+        while True:
+            item = ready.get()
+            if item is None:
+                return
+            job, encoder = item
+            capacity = capacities[self._pool(encoder)]
+            if self._cancelled.is_set():
+                self._emit(job, 'cancelled')
+                continue
+            control = JobControl(on_progress=lambda info, job=job: self._emit(job, 'progress', info))
+            with self._lock:
+                self._controls.add(control)
+            units = 0
+            try:
+                units = capacity.acquire(self._cost(job, encoder, capacity.units), self._cancelled)
+                self._emit(job, 'running')
+                result = self.runner(job, control)
+                self._emit(job, 'done', result)
+            except RedactionCancelled:
+                self._emit(job, 'cancelled')
+            except Exception as e:
+                self._emit(job, 'failed', str(e))
+            finally:
+                if units:
+                    capacity.release(units)
+                with self._lock:
+                    self._controls.discard(control)
+
+    def run(self, jobs):
+        """Process the jobs and return once every one of them has finished"""
+        capacities = {'nvenc': _Capacity(NVENC_SESSION_LIMIT), 'cpu': _Capacity(os.cpu_count() or 1)}
+        # Bounded, so probing only runs a few videos ahead of the encoders
+        ready = queue.Queue(maxsize=self.probe_ahead)
+        prober = threading.Thread(target=self._probe_all, args=(jobs, ready), daemon=True)
+        workers = [threading.Thread(target=self._encode_worker, args=(ready, capacities), daemon=True)
+                   for _ in range(self.max_jobs)]
+        self._threads = [prober] + workers
+        for thread in self._threads:
+            thread.start()
+        self.wait()
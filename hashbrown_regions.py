@@ -0,0 +1,112 @@
+"""Rectangular regions blurred, pixelated or boxed out of the picture.
+
+Faces, screens and licence plates used to need a second full encode in
+another tool after Hashbrown had muted the audio. Instead each region
+becomes a branch of the same filter graph that overlays the mute icon: the
+region is cropped out of the frame, blurred or pixelated, and laid back on
+top while its segment is on screen (a solid box is drawn in place). The
+video is still decoded and encoded once, whatever the number of regions.
+
+A region is a dict with 'start' and 'end' in seconds, 'x', 'y', 'w' and 'h'
+in pixels of the source picture, and a 'style' from REGION_STYLES.
+"""
+import math
+
+REGION_STYLES = ('blur', 'pixelate', 'box')
+DEFAULT_REGION_STYLE = 'blur'
+# Blur radius as a share of the region's shorter side; three box blur passes come close to a Gaussian
+BLUR_RADIUS_FRACTION = 0.1
+BLUR_PASSES = 3
+# Pixelated regions are this many blocks across their shorter side
+PIXELATE_BLOCKS = 8
+BOX_COLOR = 'black'
+# Smaller regions can't be blurred (boxblur's radius has to fit the chroma planes)
+MIN_REGION_SIZE = 8
+
+
+def normalize_region(region):
+    """A region dict with float times, even pixel coordinates and a known style; raises ValueError"""
+    style = region.get('style') or DEFAULT_REGION_STYLE
+    if style not in REGION_STYLES:
+        raise ValueError(f"unknown style {style!r} (choose from {', '.join(REGION_STYLES)})")
+    start, end = float(region['start']), float(region['end'])
+    x, y, w, h = (float(region[name]) for name in ('x', 'y', 'w', 'h'))
+    if x < 0 or y < 0 or w <= 0 or h <= 0:
+        raise ValueError("x and y must not be negative, and w and h must be positive")
+    # Even coordinates keep the crop on the chroma grid of 4:2:0 video; the
+    # region only ever grows, so none of the picture meant to be hidden shows
+    left, top = int(x) // 2 * 2, int(y) // 2 * 2
+    w = math.ceil((x + w - left) / 2) * 2
+    h = math.ceil((y + h - top) / 2) * 2
+    x, y = left, top
+    return {'start': start, 'end': end, 'x': x, 'y': y, 'w': w, 'h': h, 'style': style}
+
+
+def validate_regions(regions, duration=None, width=None, height=None):
+    """Check the regions and return them normalized, clipped to the frame and sorted by start.
+
+    Raises ValueError describing the first problem found.
+    """
+    checked = []
+    for i, region in enumerate(regions):
+        try:
+            region = normalize_region(region)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Region {i + 1}: {e}")
+        if region['start'] >= region['end']:
+            raise ValueError(f"Region {i + 1}: Start time must be before end time.")
+        if duration is not None and region['end'] > duration:
+            raise ValueError(f"Region {i + 1}: End time exceeds video duration.")
+        if width and height:
+            if region['x'] >= width or region['y'] >= height:
+                raise ValueError(f"Region {i + 1}: Lies outside the {width}x{height} picture.")
+            region['w'] = min(region['w'], width // 2 * 2 - region['x'])
+            region['h'] = min(region['h'], height // 2 * 2 - region['y'])
+        if region['style'] != 'box' and min(region['w'], region['h']) < MIN_REGION_SIZE:
+            raise ValueError(f"Region {i + 1}: Too small to {region['style']} "
+                             f"(at least {MIN_REGION_SIZE}x{MIN_REGION_SIZE} pixels).")
+        checked.append(region)
+    return sorted(checked, key=lambda region: (region['start'], region['end']))
+
+
+def regions_between(regions, range_start, range_end):
+    """The regions on screen in [range_start, range_end), shifted into range-local time"""
+    return [dict(region, start=round(max(region['start'], range_start) - range_start, 6),
+                 end=round(min(region['end'], range_end) - range_start, 6))
+            for region in regions if region['start'] < range_end and region['end'] > range_start]
+
+
+def region_spans(regions):
+    """(start, end) of every region, for deciding which parts of the video get re-encoded"""
+    return [(region['start'], region['end']) for region in regions]
+
+
+def _effect(region, enable):
+    short_side = min(region['w'], region['h'])
+    if region['style'] == 'blur':
+        radius = max(1, int(short_side * BLUR_RADIUS_FRACTION))
+        # The chroma planes are half the size, and boxblur needs the radius to fit in half of each
+        chroma_radius = max(1, min(radius, short_side // 4))
+        return (f"boxblur=luma_radius={radius}:luma_power={BLUR_PASSES}:"
+                f"chroma_radius={chroma_radius}:chroma_power={BLUR_PASSES}:enable='{enable}'")
+    block = max(1, short_side // PIXELATE_BLOCKS)
+    return (f"scale={max(1, region['w'] // block)}:{max(1, region['h'] // block)}:flags=area,"
+            f"scale={region['w']}:{region['h']}:flags=neighbor")
+
+
+def region_filter(regions, source, output):
+    """Filter graph that redacts the regions of the `source` pad and writes them to the `output` pad"""
+    steps = []
+    current = source
+    for i, region in enumerate(regions):
+        target = output if i == len(regions) - 1 else f'[region{i}]'
+        enable = f"between(t,{region['start']},{region['end']})"
+        x, y, w, h = region['x'], region['y'], region['w'], region['h']
+        if region['style'] == 'box':
+            steps.append(f"{current}drawbox=x={x}:y={y}:w={w}:h={h}:color={BOX_COLOR}:t=fill:enable='{enable}'{target}")
+        else:
+            steps.append(f"{current}split[base{i}][crop{i}];"
+                         f"[crop{i}]crop={w}:{h}:{x}:{y},{_effect(region, enable)}[redacted{i}];"
+                         f"[base{i}][redacted{i}]overlay={x}:{y}:enable='{enable}'{target}")
+        current = target
+    return ';'.join(steps)
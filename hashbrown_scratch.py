@@ -0,0 +1,104 @@
+"""Per-job scratch directories and the up-front free disk space check.
+
+Every job gets its own directory under HASHBROWN_SCRATCH_DIR (the system
+temp dir by default; point it at a fast local disk or a tmpfs), so jobs in
+parallel, or in two Hashbrown windows, never share a file. The directory is
+removed when the job ends, however it ends. A process that was killed
+can't clean up after itself, so directories whose owning process is gone
+are swept before each new job starts.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+SCRATCH_DIR_ENV = 'HASHBROWN_SCRATCH_DIR'
+SCRATCH_PREFIX = 'hashbrown-job-'
+# Where the owner can't be checked (Windows), older directories count as abandoned
+SCRATCH_STALE_AGE = 24 * 3600
+# Fixed-name temp files written by versions before per-job directories
+LEGACY_TEMP_FILES = ('hashbrown-temp-muted-audio.m4a', 'hashbrown-temp_resized_icon.png')
+
+
+def scratch_root():
+    """Return (and create) the directory the per-job scratch directories go in"""
+    root = os.environ.get(SCRATCH_DIR_ENV) or tempfile.gettempdir()
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _owner_alive(pid):
+    if os.name == 'nt':
+        return None  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists, but belongs to someone else
+    return True
+
+
+def clean_stale_scratch(root=None):
+    """Remove scratch directories left behind by killed Hashbrown processes"""
+    root = root or scratch_root()
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(root, name)
+        if name in LEGACY_TEMP_FILES:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            continue
+        if not name.startswith(SCRATCH_PREFIX):
+            continue
+        try:
+            pid = int(name[len(SCRATCH_PREFIX):].split('-', 1)[0])
+            alive = _owner_alive(pid) if pid != os.getpid() else True
+            if alive is None:
+                alive = time.time() - os.path.getmtime(path) < SCRATCH_STALE_AGE
+        except (ValueError, OSError):
+            continue
+        if not alive:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def job_scratch_dir():
+    """A fresh directory for one job's intermediate files, removed when the block ends"""
+    root = scratch_root()
+    clean_stale_scratch(root)
+    # The pid in the name is how clean_stale_scratch() tells abandoned directories apart
+    path = tempfile.mkdtemp(prefix=f'{SCRATCH_PREFIX}{os.getpid()}-', dir=root)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def free_space_shortfalls(needs):
+    """Check estimated disk needs {directory: bytes}; returns [(directory, needed, free)] that don't fit.
+
+    Directories on the same file system are added up, so an output and a
+    scratch dir on one disk are checked against its free space together.
+    """
+    by_device = {}
+    for directory, needed in needs.items():
+        if not needed:
+            continue
+        try:
+            device = os.stat(directory).st_dev
+        except OSError:
+            continue
+        first, total = by_device.get(device, (directory, 0))
+        by_device[device] = (first, total + needed)
+
+    shortfalls = []
+    for directory, needed in by_device.values():
+        free = shutil.disk_usage(directory).free
+        if free < needed:
+            shortfalls.append((directory, needed, free))
+    return shortfalls
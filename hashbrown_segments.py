@@ -0,0 +1,76 @@
+"""Segment arithmetic for Hashbrown: merging, lookups and ffmpeg timelines.
+
+Transcript-driven jobs can have thousands of segments. Everything here
+works on the merged, sorted form, so a lookup is a binary search and the
+ffmpeg enable expression is a balanced decision tree of `if(lt(t,...))`
+tests instead of one `between()` term per segment.
+"""
+import bisect
+import math
+
+# Up to this many segments a plain sum of between() terms is just as cheap
+TREE_LEAF_SIZE = 4
+# Tolerance when deciding which frame a typed time falls on
+SNAP_EPSILON = 1e-6
+
+
+def merge_segments(segments):
+    """Sort the segments and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(segments):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def snap_segments(segments, fps=None, sample_rate=None):
+    """Widen the segments to whole video frames and whole audio samples.
+
+    A segment covers every frame that is on screen at any moment inside it.
+    The boundaries are put halfway between frames, so ffmpeg's floating
+    point frame times never land exactly on them, and then rounded outwards
+    to the audio sample grid. Segments never shrink.
+    """
+    snapped = []
+    for start, end in segments:
+        if fps:
+            first = math.floor(start * fps + SNAP_EPSILON)
+            last = math.floor(end * fps + SNAP_EPSILON)
+            start = max(0.0, (first - 0.5) / fps)
+            end = (last + 0.5) / fps
+        if sample_rate:
+            start = math.floor(start * sample_rate) / sample_rate
+            end = math.ceil(end * sample_rate) / sample_rate
+        snapped.append((round(start, 6), round(end, 6)))
+    return merge_segments(snapped)
+
+
+def segments_between(merged, range_start, range_end):
+    """The merged segments overlapping [range_start, range_end), found by bisection"""
+    ends = [end for _, end in merged]
+    # A segment ending right at range_start only touches the range
+    first = bisect.bisect_right(ends, range_start)
+    last = bisect.bisect_left(merged, (range_end,), lo=first)
+    return merged[first:last]
+
+
+def sample_ranges(segments, sample_rate):
+    """Merged [first, last) sample index ranges covered by the segments"""
+    return merge_segments((math.floor(start * sample_rate), math.ceil(end * sample_rate))
+                          for start, end in segments)
+
+
+def _expr_tree(merged):
+    if len(merged) <= TREE_LEAF_SIZE:
+        return '+'.join(f"between(t,{start},{end})" for start, end in merged) or '0'
+    mid = len(merged) // 2
+    # ffmpeg's if() only evaluates the branch it takes, so each frame costs O(log n)
+    return f"if(lt(t,{merged[mid][0]}),{_expr_tree(merged[:mid])},{_expr_tree(merged[mid:])})"
+
+
+def enable_expr(segments):
+    """ffmpeg expression that is non-zero inside any of the segments"""
+    return _expr_tree(merge_segments(segments))
@@ -0,0 +1,310 @@
+"""Offline speech recognition that proposes segments to redact.
+
+Typing every segment in by hand is the slow part of redacting a long
+interview. With Vosk installed (pip install vosk) and one of its models
+downloaded (https://alphacephei.com/vosk/models), Hashbrown transcribes the
+audio on the CPU, without sending anything anywhere, and proposes a
+segment around every spoken keyword. Point HASHBROWN_SPEECH_MODEL at the
+unpacked model folder.
+
+The audio is decoded once, by one ffmpeg pipe to 16 kHz mono PCM, and cut
+into chunks that reach a couple of seconds into their neighbours on both
+sides, so every word near a cut is heard whole by the chunk it starts in.
+A pool of worker processes, each holding its own copy of the model,
+transcribes the chunks in parallel. A large model takes gigabytes of RAM
+per copy, so there are only as many workers as fit in the free memory (at
+most MAX_SPEECH_WORKERS; HASHBROWN_SPEECH_WORKERS overrides the count).
+The transcript (every word with its start, end and confidence) is cached
+per file and model, so reopening a file or trying other keywords matches
+against the cached words instantly.
+"""
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import importlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+
+from hashbrown_cache import cache_dir, load_json, save_json
+from hashbrown_jobcache import file_fingerprint
+from hashbrown_probe import probe_media
+from hashbrown_segments import merge_segments
+
+SPEECH_MODEL_ENV = 'HASHBROWN_SPEECH_MODEL'
+SPEECH_WORKERS_ENV = 'HASHBROWN_SPEECH_WORKERS'
+# Recognizer processes when neither the caller nor HASHBROWN_SPEECH_WORKERS says otherwise
+MAX_SPEECH_WORKERS = 4
+# A loaded model takes about this multiple of its size on disk, plus the worker's own interpreter
+MODEL_MEMORY_FACTOR = 2
+WORKER_MEMORY_BYTES = 200 * 1024 * 1024
+# Bump when the cached transcript layout or the chunking changes
+SPEECH_CACHE_VERSION = 2
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 30
+# Audio from either side of each chunk the recognizer hears too, so words across a chunk edge come out whole
+CHUNK_OVERLAP_SECONDS = 2
+# PCM handed to the recognizer per call
+FEED_BYTES = 8000
+# Seconds added around each keyword, so its first and last sounds are covered too
+KEYWORD_PAD_SECONDS = 0.2
+STDERR_TAIL_LINES = 40
+
+
+class SpeechError(Exception):
+    """Raised when speech can't be detected (no Vosk, no model, no audio, ffmpeg failure)"""
+
+
+_model = None
+
+
+def _vosk():
+    # Imported on first use: it loads the Kaldi libraries, which the window shouldn't wait for
+    try:
+        return importlib.import_module('vosk')
+    except ImportError:
+        raise SpeechError("Speech detection needs the vosk package (pip install vosk).")
+
+
+def speech_model_path(path=None):
+    """The Vosk model folder from the argument or HASHBROWN_SPEECH_MODEL; raises SpeechError if unusable"""
+    _vosk()
+    path = path or os.environ.get(SPEECH_MODEL_ENV)
+    if not path:
+        raise SpeechError(f"No speech model set. Download a Vosk model and set {SPEECH_MODEL_ENV} to its folder.")
+    if not os.path.isdir(path):
+        raise SpeechError(f"Speech model folder not found: {path}")
+    return path
+
+
+def _available_memory():
+    """Bytes of memory free for new processes, or None where that can't be read"""
+    try:
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _model_size(path):
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def speech_workers(model_path, requested=None):
+    """How many recognizer processes to run: HASHBROWN_SPEECH_WORKERS, else what fits in memory.
+
+    requested (say, the job's worker count) replaces the MAX_SPEECH_WORKERS
+    default but is still cut down to the copies of the model that fit.
+    """
+    try:
+        forced = int(os.environ.get(SPEECH_WORKERS_ENV) or 0)
+    except ValueError:
+        forced = 0
+    if forced > 0:
+        return forced
+    workers = requested or min(os.cpu_count() or 1, MAX_SPEECH_WORKERS)
+    available = _available_memory()
+    if available is not None:
+        per_worker = _model_size(model_path) * MODEL_MEMORY_FACTOR + WORKER_MEMORY_BYTES
+        workers = min(workers, int(available // per_worker))
+    return max(1, workers)
+
+
+def _model_id(path):
+    path = os.path.abspath(path)
+    return f"{os.path.basename(path)}|{os.stat(path).st_mtime_ns}"
+
+
+def _cache_path(fingerprint, model_id, track):
+    key = hashlib.sha1(f"{SPEECH_CACHE_VERSION}|{fingerprint}|{model_id}|{track}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir('speech'), f'{key}.json')
+
+
+def _load_model(path):
+    # Runs once in every worker process; the model is far too big to pickle per chunk
+    global _model
+    vosk = _vosk()
+    vosk.SetLogLevel(-1)
+    _model = vosk.Model(path)
+
+
+def _transcribe_chunk(pcm, offset, keep_from, keep_until):
+    """Words of one chunk of PCM as [word, start, end, confidence], in file time.
+
+    pcm reaches into the neighbouring chunks on both sides. Only words
+    starting in [keep_from, keep_until) are kept: a word starting before the
+    chunk is the previous chunk's, which heard it whole thanks to its
+    trailing overlap, and one starting after it is the next chunk's.
+    """
+    recognizer = _vosk().KaldiRecognizer(_model, SAMPLE_RATE)
+    recognizer.SetWords(True)
+    results = []
+    for i in range(0, len(pcm), FEED_BYTES):
+        if recognizer.AcceptWaveform(pcm[i:i + FEED_BYTES]):
+            results.append(recognizer.Result())
+    results.append(recognizer.FinalResult())
+
+    words = []
+    for result in results:
+        for word in json.loads(result).get('result', []):
+            start = round(word['start'] + offset, 3)
+            if keep_from <= start < keep_until:
+                words.append([word['word'], start, round(word['end'] + offset, 3), round(word.get('conf', 1.0), 3)])
+    return words
+
+
+def _chunks(stdout):
+    """(pcm, offset, keep_from, keep_until, seconds) for each chunk of the PCM read from stdout.
+
+    Each chunk is read ahead by one, so its pcm can carry the first
+    CHUNK_OVERLAP_SECONDS of the next as well as the last of the previous.
+    """
+    chunk_bytes = CHUNK_SECONDS * SAMPLE_RATE * 2
+    overlap_bytes = CHUNK_OVERLAP_SECONDS * SAMPLE_RATE * 2
+    lead = b''
+    current = stdout.read(chunk_bytes)
+    index = 0
+    while current:
+        following = stdout.read(chunk_bytes)
+        start = index * CHUNK_SECONDS
+        yield (lead + current + following[:overlap_bytes], start - len(lead) / (SAMPLE_RATE * 2),
+               start, start + CHUNK_SECONDS, len(current) / (SAMPLE_RATE * 2))
+        lead = current[-overlap_bytes:]
+        current = following
+        index += 1
+
+
+def transcribe(ffmpeg_path, video_path, model_path=None, track=0, workers=None, control=None):
+    """Return the words spoken in an audio track as sorted [word, start, end, confidence] lists.
+
+    Served from the cache when this file was transcribed with this model
+    before. control (a JobControl) gets progress and can cancel; a
+    cancelled run raises RedactionCancelled and caches nothing.
+    """
+    model_path = speech_model_path(model_path)
+    cache_path = _cache_path(file_fingerprint(video_path), _model_id(model_path), track)
+    cached = load_json(cache_path)
+    if cached is not None:
+        return cached['words']
+
+    info = probe_media(ffmpeg_path, video_path)
+    if len(info['audio']) <= track:
+        raise SpeechError(f"{os.path.basename(video_path)} has no audio track {track + 1}.")
+    workers = speech_workers(model_path, workers)
+    if control is not None:
+        control.start_stage('Transcribing speech', info['duration'])
+
+    cmd = [ffmpeg_path, '-hide_banner', '-nostdin', '-i', video_path, '-map', f'0:a:{track}',
+           '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+    try:
+        decoder = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise SpeechError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+    tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    drain = threading.Thread(target=lambda: tail.extend(decoder.stderr), daemon=True)
+    drain.start()
+    if control is not None:
+        control._register(decoder)
+
+    words = []
+    started = time.monotonic()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_load_model,
+                                                    initargs=(model_path,)) as pool:
+            pending = {}
+            done_seconds = 0.0
+            try:
+                for pcm, offset, keep_from, keep_until, seconds in _chunks(decoder.stdout):
+                    future = pool.submit(_transcribe_chunk, pcm, offset, keep_from, keep_until)
+                    pending[future] = seconds
+                    # Decoding runs far ahead of recognition; don't hold the whole file in memory
+                    while len(pending) >= 2 * workers or (pending and control is not None and control.cancelled):
+                        finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in finished:
+                            words.extend(future.result())
+                            done_seconds += pending.pop(future)
+                        if control is not None:
+                            control.check()
+                            control._update(decoder, done_seconds, 0.0,
+                                            done_seconds / max(time.monotonic() - started, 1e-6))
+                for future in concurrent.futures.as_completed(list(pending)):
+                    words.extend(future.result())
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        decoder.wait()
+        drain.join()
+    finally:
+        if decoder.poll() is None:
+            decoder.kill()
+            decoder.wait()
+        if control is not None:
+            control._unregister(decoder)
+
+    if control is not None:
+        control.check()
+    if decoder.returncode != 0:
+        output = b''.join(tail).decode('utf-8', errors='replace')
+        raise SpeechError(f"FFmpeg error while decoding the audio: {output}")
+
+    words.sort(key=lambda word: word[1])
+    try:
+        save_json(cache_path, {'video': video_path, 'model': model_path, 'track': track, 'words': words})
+    except OSError:
+        pass  # A read-only cache only costs the next run the transcription
+    return words
+
+
+def parse_keywords(text):
+    """Keywords and phrases from comma- or newline-separated text; * matches any letters"""
+    return [phrase.strip() for phrase in re.split(r'[,\n]', text or '') if phrase.strip()]
+
+
+def find_keywords(words, keywords, pad=KEYWORD_PAD_SECONDS, min_confidence=0.0, duration=None):
+    """Merged (start, end) segments covering every spoken occurrence of the keywords.
+
+    A keyword may be a phrase of several words, which must be spoken in a
+    row. Matching ignores case, and a * in a keyword stands for any letters
+    (so 'smith*' also finds 'smiths').
+    """
+    phrases = [[token.lower() for token in phrase.split()] for phrase in keywords]
+    spoken = [word for word in words if word[3] >= min_confidence]
+    tokens = [word[0].lower() for word in spoken]
+    segments = []
+    for phrase in phrases:
+        if not phrase:
+            continue
+        for i in range(len(tokens) - len(phrase) + 1):
+            if all(fnmatch.fnmatchcase(tokens[i + j], token) for j, token in enumerate(phrase)):
+                start = max(0.0, spoken[i][1] - pad)
+                end = spoken[i + len(phrase) - 1][2] + pad
+                if duration:
+                    end = min(end, duration)
+                segments.append((round(start, 3), round(end, 3)))
+    return merge_segments(segments)
+
+
+def propose_segments(ffmpeg_path, video_path, keywords, model_path=None, track=0, workers=None,
+                     control=None, pad=KEYWORD_PAD_SECONDS, min_confidence=0.0):
+    """Transcribe the video (or reuse its cached transcript) and return segments around the keywords"""
+    words = transcribe(ffmpeg_path, video_path, model_path, track=track, workers=workers, control=control)
+    duration = probe_media(ffmpeg_path, video_path)['duration']
+    return find_keywords(words, keywords, pad=pad, min_confidence=min_confidence, duration=duration)
@@ -0,0 +1,328 @@
+"""Waveform peaks and keyframe thumbnails for the GUI timeline.
+
+Drawing a waveform straight from the audio means reading every sample on
+every redraw, which on a 3-hour file takes longer than a zoom should.
+Instead the audio is decoded once, through an ffmpeg pipe at a low sample
+rate, into the minimum and maximum of every 10 ms. Each coarser level of
+the pyramid halves the one below it, so any view, from the whole file down
+to a second, is drawn from the level that has one or two bins per pixel
+column. The thumbnails are keyframes decoded by a second streamed ffmpeg,
+spread evenly over the file.
+
+Both are kept in the cache dir under the file's fingerprint, as a small
+JSON record next to the raw int16 peaks and RGB thumbnails, so a file
+opens with its timeline immediately the second time. Nothing here needs
+numpy; the window must start without it.
+"""
+import array
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from hashbrown_cache import cache_dir, load_json, save_json
+from hashbrown_jobcache import file_fingerprint
+from hashbrown_probe import ProbeError, probe_keyframes, probe_media
+
+# Bump when the peak or thumbnail layout changes
+TIMELINE_CACHE_VERSION = 1
+# Rate the waveform is decoded at; an envelope doesn't need more
+PEAK_SAMPLE_RATE = 4000
+# Samples per bin of the finest level (10 ms)
+PEAK_BLOCK = 40
+# Levels stop halving once they are this short
+PEAK_MIN_BINS = 256
+# PCM read from the pipe at a time (a whole number of blocks)
+PEAK_READ_SAMPLES = PEAK_BLOCK * 4096
+THUMB_HEIGHT = 54
+MAX_THUMBNAILS = 400
+# Never closer together than this, so short clips don't get a thumbnail per keyframe
+MIN_THUMB_INTERVAL = 2.0
+STDERR_TAIL_LINES = 40
+
+
+class TimelineError(Exception):
+    """Raised when the waveform or the thumbnails can't be built"""
+
+
+class PeakPyramid:
+    """Min/max peaks of the audio at 10 ms and every coarser power of two"""
+
+    def __init__(self, levels, bin_seconds, duration):
+        # levels[k] is (mins, maxs), int16 arrays with one entry per 2**k bins of the finest level
+        self.levels = levels
+        self.bin_seconds = bin_seconds
+        self.duration = duration
+
+    def columns(self, start, end, count):
+        """(low, high) per pixel column for the view [start, end), scaled to -1..1; None where there is no audio"""
+        seconds_per_column = (end - start) / max(count, 1)
+        level = 0
+        while (level + 1 < len(self.levels)
+               and self.bin_seconds * 2 ** (level + 1) <= seconds_per_column):
+            level += 1
+        mins, maxs = self.levels[level]
+        bin_seconds = self.bin_seconds * 2 ** level
+
+        columns = []
+        for i in range(count):
+            first = int((start + i * seconds_per_column) / bin_seconds)
+            last = max(int((start + (i + 1) * seconds_per_column) / bin_seconds), first + 1)
+            if first < 0 or first >= len(mins):
+                columns.append(None)
+                continue
+            columns.append((min(mins[first:last]) / 32768, max(maxs[first:last]) / 32768))
+        return columns
+
+
+class ThumbnailStrip:
+    """Small RGB frames of the video at evenly spread keyframes"""
+
+    def __init__(self, times, width, height, pixels):
+        self.times = times
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+
+    def ppm(self, index):
+        """Thumbnail `index` as a binary PPM, which tk.PhotoImage reads without PIL"""
+        size = self.width * self.height * 3
+        header = f"P6 {self.width} {self.height} 255\n".encode('ascii')
+        return header + self.pixels[index * size:(index + 1) * size]
+
+    def visible(self, start, end):
+        """Indexes of the thumbnails whose time lies in [start, end)"""
+        return [i for i, t in enumerate(self.times) if start <= t < end]
+
+
+def _cache_base(video_path):
+    key = hashlib.sha1(f"{TIMELINE_CACHE_VERSION}|{file_fingerprint(video_path)}".encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir('timeline'), key)
+
+
+def _write_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _run_pipe(cmd, control, stage, total_seconds, consume):
+    """Run an ffmpeg writing to stdout and hand its output to consume(stdout, report).
+
+    consume calls report(media_seconds) as it goes. Returns the stderr lines;
+    raises TimelineError if ffmpeg fails.
+    """
+    if control is not None:
+        control.check()
+        control.start_stage(stage, total_seconds)
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise TimelineError("FFmpeg not found. Please ensure FFmpeg is installed and in your PATH.")
+    lines = []
+    drain = threading.Thread(target=lambda: lines.extend(process.stderr), daemon=True)
+    drain.start()
+    if control is not None:
+        control._register(process)
+    started = time.monotonic()
+
+    def report(media_seconds):
+        if control is not None:
+            control._update(process, media_seconds, 0.0, media_seconds / max(time.monotonic() - started, 1e-6))
+
+    try:
+        consume(process.stdout, report)
+        process.wait()
+        drain.join()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if control is not None:
+            control._unregister(process)
+    if control is not None:
+        control.check()
+    if process.returncode != 0:
+        output = b''.join(lines[-STDERR_TAIL_LINES:]).decode('utf-8', errors='replace')
+        raise TimelineError(f"FFmpeg error while reading the timeline: {output}")
+    return lines
+
+
+def _halve(mins, maxs):
+    even_mins, odd_mins = mins[0::2], mins[1::2]
+    even_maxs, odd_maxs = maxs[0::2], maxs[1::2]
+    if len(even_mins) > len(odd_mins):
+        odd_mins.append(even_mins[-1])
+        odd_maxs.append(even_maxs[-1])
+    return array.array('h', map(min, even_mins, odd_mins)), array.array('h', map(max, even_maxs, odd_maxs))
+
+
+def _build_peaks(ffmpeg_path, video_path, duration, control):
+    cmd = [ffmpeg_path, '-hide_banner', '-nostdin', '-i', video_path, '-map', '0:a:0',
+           '-ac', '1', '-ar', str(PEAK_SAMPLE_RATE), '-f', 's16le', '-acodec', 'pcm_s16le', '-']
+    mins = array.array('h')
+    maxs = array.array('h')
+
+    def consume(stdout, report):
+        samples = 0
+        leftover = b''
+        while True:
+            data = stdout.read(PEAK_READ_SAMPLES * 2)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % (PEAK_BLOCK * 2)
+            leftover = data[usable:]
+            block = array.array('h', data[:usable])
+            if sys.byteorder == 'big':
+                block.byteswap()
+            for i in range(0, len(block), PEAK_BLOCK):
+                piece = block[i:i + PEAK_BLOCK]
+                mins.append(min(piece))
+                maxs.append(max(piece))
+            samples += len(block)
+            report(samples / PEAK_SAMPLE_RATE)
+        if len(leftover) >= 2:
+            piece = array.array('h', leftover[:len(leftover) - len(leftover) % 2])
+            if sys.byteorder == 'big':
+                piece.byteswap()
+            mins.append(min(piece))
+            maxs.append(max(piece))
+
+    _run_pipe(cmd, control, 'Reading waveform', duration, consume)
+    levels = [(mins, maxs)]
+    while len(levels[-1][0]) > PEAK_MIN_BINS:
+        levels.append(_halve(*levels[-1]))
+    return PeakPyramid(levels, PEAK_BLOCK / PEAK_SAMPLE_RATE, duration)
+
+
+def load_peaks(ffmpeg_path, video_path, control=None):
+    """The waveform peak pyramid of the first audio track, built on first use; None without audio.
+
+    control (a JobControl) gets progress and can cancel the build.
+    """
+    try:
+        info = probe_media(ffmpeg_path, video_path)
+    except ProbeError as e:
+        raise TimelineError(str(e))
+    if not info['audio']:
+        return None
+    base = _cache_base(video_path)
+    record = load_json(base + '.json') or {}
+    peaks = record.get('peaks')
+    if peaks and os.path.exists(base + '.peaks'):
+        data = array.array('h')
+        try:
+            with open(base + '.peaks', 'rb') as f:
+                data.fromfile(f, sum(2 * count for count in peaks['levels']))
+        except (OSError, EOFError):
+            data = None  # Shorter than its record says: build it again
+        if data is not None:
+            if sys.byteorder == 'big':
+                data.byteswap()
+            levels = []
+            position = 0
+            for count in peaks['levels']:
+                levels.append((data[position:position + count], data[position + count:position + 2 * count]))
+                position += 2 * count
+            return PeakPyramid(levels, peaks['bin_seconds'], peaks['duration'])
+
+    pyramid = _build_peaks(ffmpeg_path, video_path, info['duration'], control)
+    data = array.array('h')
+    for mins, maxs in pyramid.levels:
+        data.extend(mins)
+        data.extend(maxs)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    try:
+        _write_atomic(base + '.peaks', data.tobytes())
+        record = load_json(base + '.json') or {}
+        record['peaks'] = {'levels': [len(mins) for mins, _ in pyramid.levels],
+                           'bin_seconds': pyramid.bin_seconds, 'duration': pyramid.duration}
+        save_json(base + '.json', record)
+    except OSError:
+        pass  # Caching is an optimisation only
+    return pyramid
+
+
+def _thumbnail_size(video):
+    height = min(THUMB_HEIGHT, video['height'])
+    width = max(2, round(height * video['width'] / video['height'] / 2) * 2)
+    return width, height
+
+
+def _select_times(keyframes, interval):
+    times = []
+    for t in keyframes:
+        if not times or t - times[-1] >= interval:
+            times.append(t)
+    return times
+
+
+def load_thumbnails(ffmpeg_path, video_path, control=None):
+    """The keyframe thumbnail strip, built on first use; None without video"""
+    try:
+        info = probe_media(ffmpeg_path, video_path)
+    except ProbeError as e:
+        raise TimelineError(str(e))
+    video = info['video']
+    if video is None or not video['width'] or not video['height']:
+        return None
+    base = _cache_base(video_path)
+    record = load_json(base + '.json') or {}
+    thumbs = record.get('thumbnails')
+    if thumbs and os.path.exists(base + '.thumbs'):
+        with open(base + '.thumbs', 'rb') as f:
+            pixels = f.read()
+        return ThumbnailStrip(thumbs['times'], thumbs['width'], thumbs['height'], pixels)
+
+    width, height = _thumbnail_size(video)
+    duration = info['duration'] or 0.0
+    interval = max(duration / MAX_THUMBNAILS, MIN_THUMB_INTERVAL)
+    # Only keyframes are decoded at all; select then keeps one per interval
+    cmd = [ffmpeg_path, '-hide_banner', '-nostdin', '-skip_frame', 'nokey', '-i', video_path,
+           '-map', '0:v:0', '-an',
+           '-vf', f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',"
+                  f"showinfo,scale={width}:{height}",
+           '-vsync', 'vfr', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    frame_bytes = width * height * 3
+    frames = []
+
+    def consume(stdout, report):
+        while True:
+            frame = stdout.read(frame_bytes)
+            if len(frame) < frame_bytes:
+                break
+            frames.append(frame)
+            report(len(frames) * interval)
+
+    lines = _run_pipe(cmd, control, 'Reading thumbnails', duration, consume)
+    times = [float(m) for m in re.findall(rb'pts_time:\s*(-?[\d.]+)', b''.join(lines))]
+    if len(times) < len(frames):
+        # showinfo's output got lost; pick from the keyframe index the way select did
+        try:
+            times = _select_times(probe_keyframes(ffmpeg_path, video_path), interval)
+        except ProbeError as e:
+            raise TimelineError(str(e))
+    count = min(len(times), len(frames))
+    strip = ThumbnailStrip(times[:count], width, height, b''.join(frames[:count]))
+    try:
+        _write_atomic(base + '.thumbs', strip.pixels)
+        record = load_json(base + '.json') or {}
+        record['thumbnails'] = {'times': strip.times, 'width': width, 'height': height}
+        save_json(base + '.json', record)
+    except OSError:
+        pass
+    return strip
+
+
+def clear_timeline_cache():
+    """Forget every cached waveform and thumbnail strip"""
+    directory = cache_dir('timeline')
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.peaks', '.thumbs')):
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,240 @@
+"""Per-stage timing spans, to see where a slow job spends its time.
+
+Set HASHBROWN_TRACE=1 and every job appends one JSON line to trace.jsonl in
+the cache dir (or set it to a file path to log somewhere else). A job is
+split into spans: the probe, the icon render, the encoder check and each
+JobControl stage (decoding, encoding, joining chunks...). Every span has
+its wall time, the CPU time this job used meanwhile, and for ffmpeg stages
+the fps and speed ffmpeg reported.
+
+CPU time is counted per job, not per process, so jobs the batch scheduler
+runs side by side aren't charged for each other: the thread running the
+job, the worker threads it hands work to through in_current_trace(), and
+the ffmpeg processes it reaps through wait_process() add up to the job's.
+
+The variable is read once at import. When it is off, span() hands back one
+shared no-op context manager and JobControl skips its bookkeeping, so the
+instrumented code pays for a function call and nothing more.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+from hashbrown_cache import cache_dir
+
+TRACE_ENV = 'HASHBROWN_TRACE'
+
+
+def _trace_file():
+    value = os.environ.get(TRACE_ENV, '').strip()
+    if value.lower() in ('', '0', 'false', 'no', 'off'):
+        return None
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return os.path.join(cache_dir(), 'trace.jsonl')
+    return value
+
+
+TRACE_FILE = _trace_file()
+TRACE_ENABLED = TRACE_FILE is not None
+
+_NULL_SPAN = contextlib.nullcontext()
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _thread_cpu_seconds():
+    return time.thread_time()
+
+
+class Span:
+    """One timed stage of a job; use end() or the trace's span() context manager"""
+
+    def __init__(self, trace, name, fields):
+        self.trace = trace
+        self.name = name
+        self.fields = fields
+        self.fps = None
+        self.speed = None
+        self._started = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._cpu_started = _thread_cpu_seconds()
+        self._shared_cpu_started = trace.shared_cpu_seconds
+        self.record = None
+
+    def progress(self, fps, speed):
+        """Remember the latest ffmpeg-reported fps and speed (ffmpeg's own running averages)"""
+        if fps:
+            self.fps = fps
+        if speed:
+            self.speed = speed
+
+    def end(self):
+        if self.record is not None:
+            return
+        # Another thread's CPU clock can't be read portably; a span ended elsewhere only gets the shared part
+        own = _thread_cpu_seconds() - self._cpu_started if threading.get_ident() == self._thread else 0.0
+        self.record = {
+            'name': self.name,
+            'start': round(self._started - self.trace._started, 3),
+            'seconds': round(time.perf_counter() - self._started, 3),
+            'cpu_seconds': round(own + self.trace.shared_cpu_seconds - self._shared_cpu_started, 3),
+        }
+        if self.fps is not None:
+            self.record['fps'] = round(self.fps, 1)
+        if self.speed is not None:
+            self.record['speed'] = round(self.speed, 2)
+        self.record.update(self.fields)
+        with self.trace._lock:
+            self.trace._open.discard(self)
+            self.trace.spans.append(self.record)
+
+
+class Trace:
+    """The spans of one job, written to the trace file as one JSON line when it ends"""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.spans = []
+        self.record = None
+        self._lock = threading.Lock()
+        self._open = set()
+        self._started = time.perf_counter()
+        self._cpu_started = _thread_cpu_seconds()
+        self._wall_started = time.time()
+        # CPU time of this job's worker threads and ffmpeg processes, added as each one finishes
+        self.shared_cpu_seconds = 0.0
+
+    def add_cpu(self, seconds):
+        with self._lock:
+            self.shared_cpu_seconds += seconds
+
+    def begin(self, name, **fields):
+        span = Span(self, name, fields)
+        with self._lock:
+            self._open.add(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        span = self.begin(name, **fields)
+        try:
+            yield span
+        finally:
+            span.end()
+
+    def end(self, error=None):
+        with self._lock:
+            still_open = list(self._open)
+        for span in still_open:
+            span.end()
+        self.record = {
+            'name': self.name,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._wall_started)),
+            'seconds': round(time.perf_counter() - self._started, 3),
+            'cpu_seconds': round(_thread_cpu_seconds() - self._cpu_started + self.shared_cpu_seconds, 3),
+            'error': error,
+            'spans': sorted(self.spans, key=lambda span: span['start']),
+        }
+        self.record.update(self.fields)
+        try:
+            with _write_lock:
+                with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(self.record) + '\n')
+        except OSError:
+            pass  # A read-only log location must not fail the job
+
+
+def current_trace():
+    """The trace of the job running on this thread, or None"""
+    return getattr(_local, 'trace', None)
+
+
+@contextlib.contextmanager
+def job_trace(name, **fields):
+    """Trace everything this thread does inside the block; yields the Trace, or None when off"""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    outer = current_trace()
+    trace = Trace(name, fields)
+    _local.trace = trace
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _local.trace = outer
+        trace.end(error)
+
+
+def in_current_trace(function):
+    """Bind function to this thread's job, to run it on a worker thread.
+
+    Its spans then belong to the job, and the worker thread's CPU time is
+    added to the job's. Returns function itself when nothing is traced.
+    """
+    trace = current_trace() if TRACE_ENABLED else None
+    if trace is None:
+        return function
+
+    def run_traced(*args, **kwargs):
+        outer = current_trace()
+        _local.trace = trace
+        started = _thread_cpu_seconds()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            trace.add_cpu(_thread_cpu_seconds() - started)
+            _local.trace = outer
+    return run_traced
+
+
+def wait_process(process):
+    """process.wait(), adding the process's CPU time to the current job when it is traced"""
+    trace = current_trace() if TRACE_ENABLED else None
+    if trace is None or process.returncode is not None or not hasattr(os, 'wait4'):
+        return process.wait()
+    try:
+        # wait4 reports the CPU time of this one child; RUSAGE_CHILDREN would mix in other jobs'
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait()  # Reaped by a poll() on another thread
+    process.returncode = os.waitstatus_to_exitcode(status)
+    trace.add_cpu(usage.ru_utime + usage.ru_stime)
+    return process.returncode
+
+
+def span(name, **fields):
+    """Context manager timing a block as a span of the current job (a no-op when tracing is off)"""
+    if not TRACE_ENABLED:
+        return _NULL_SPAN
+    trace = current_trace()
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name, **fields)
+
+
+def begin_span(name, **fields):
+    """Open a span of the current job that the caller ends; None when tracing is off"""
+    if not TRACE_ENABLED:
+        return None
+    trace = current_trace()
+    return trace.begin(name, **fields) if trace is not None else None
+
+
+def format_trace(record):
+    """Human-readable table of a finished trace, slowest stages easy to spot"""
+    lines = [f"{record['name']}: {record['seconds']:.2f}s wall, {record['cpu_seconds']:.2f}s CPU"]
+    for span in record['spans']:
+        line = f"  {span['start']:8.2f}s  {span['seconds']:8.2f}s  {span['cpu_seconds']:8.2f}s CPU  {span['name']}"
+        if 'fps' in span:
+            line += f"  {span['fps']:.0f} fps"
+        if 'speed' in span:
+            line += f"  {span['speed']:.2f}x"
+        lines.append(line)
+    return "\n".join(lines)
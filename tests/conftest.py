@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules live flat in the project root, next to Hashbrown.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep every cache (probes, chunks, journals) in a fresh directory per test"""
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('HASHBROWN_CACHE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def cached_chunk(cache_dir):
+    """Store a chunk in the chunk cache: cached_chunk(key, data=b'chunk', age=0) returns its path"""
+    from hashbrown_jobcache import reserve_chunk, store_chunk
+
+    def store(key, data=b'chunk', age=0):
+        temp_path = reserve_chunk(key)
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        path = store_chunk(key, temp_path)
+        then = time.time() - age
+        os.utime(path, (then, then))
+        return path
+
+    return store
@@ -0,0 +1,84 @@
+import pytest
+
+import hashbrown_engine
+from hashbrown_audio import plan_track
+from hashbrown_engine import mute_filter
+
+
+def test_mp3_is_reencoded_whole_because_of_its_bit_reservoir():
+    plan = plan_track(0, {'codec_name': 'mp3', 'sample_rate': 44100, 'channels': 2, 'bit_rate': 128000})
+
+    assert plan['method'] == 'reencode'
+    assert ('c', 'libmp3lame') in plan['options']
+
+
+def test_aac_is_spliced():
+    assert plan_track(0, {'codec_name': 'aac', 'sample_rate': 48000, 'channels': 2})['method'] == 'splice'
+
+
+def test_mute_filter_splits_only_at_segment_edges():
+    graph = mute_filter([(2.0, 3.0), (0.0, 1.0)], precision='fixed', label='m')
+
+    assert 'asetnsamples' not in graph
+    assert graph == ("asegment=timestamps=1.000000|2.000000|3.000000[m0][m1][m2][m3];"
+                     "[m0]volume=0:precision=fixed[m0m];[m2]volume=0:precision=fixed[m2m];"
+                     "[m0m][m1][m2m][m3]concat=n=4:v=0:a=1")
+
+
+def test_mute_filter_without_segments_passes_audio_through():
+    assert mute_filter([]) == 'anull'
+
+
+def test_legacy_audio_keeps_the_track_codec_and_bitrate(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(hashbrown_engine, 'audio_encoders', lambda ffmpeg_path: None)
+    monkeypatch.setattr(hashbrown_engine, 'mute_audio_stream', lambda *args, **kwargs: calls.append(args))
+    info = {'duration': 10.0, 'audio': [{'codec_name': 'mp3', 'sample_rate': 44100, 'channels': 2,
+                                         'bit_rate': 128000}]}
+
+    plans = hashbrown_engine.prepare_audio_tracks('ffmpeg', 'in.mp4', info, [(1.0, 2.0)], str(tmp_path),
+                                                  legacy_audio=True)
+
+    assert plans[0]['method'] == 'file'
+    options = calls[0][6]
+    assert ('c', 'libmp3lame') in options
+    assert ('b', '128000') in options
+
+
+def _mute_stream(data, ranges, reads):
+    """Feed data through _zero_ranges in blocks of the given read sizes, like mute_audio_stream"""
+    block = bytearray(max(reads))
+    view = memoryview(block)
+    zeros = memoryview(bytes(len(block)))
+    output = b''
+    position = next_range = 0
+    for size in reads:
+        view[:size] = data[position:position + size]
+        next_range = hashbrown_engine._zero_ranges(view, size, position, ranges, next_range, zeros)
+        output += bytes(view[:size])
+        position += size
+    return output, next_range
+
+
+@pytest.mark.parametrize('reads', [[4, 4, 4], [4, 3, 5], [1, 11]])
+def test_zeroed_range_crosses_a_block_boundary(reads):
+    output, _ = _mute_stream(b'abcdefghijkl', [(2, 10)], reads)
+
+    assert output == b'ab' + bytes(8) + b'kl'
+
+
+def test_range_ending_at_the_block_start_is_skipped():
+    output, next_range = _mute_stream(b'abcdefgh', [(1, 4), (6, 7)], [4, 4])
+
+    assert output == b'a\0\0\0ef\0h'
+    assert next_range == 1
+
+
+def test_short_read_zeroes_only_what_was_read():
+    block = bytearray(b'abcdefgh')
+    view = memoryview(block)
+
+    next_range = hashbrown_engine._zero_ranges(view, 3, 100, [(101, 110)], 0, memoryview(bytes(8)))
+
+    assert block == b'a\0\0defgh'
+    assert next_range == 0  # The range goes on into the next read
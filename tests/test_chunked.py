@@ -0,0 +1,22 @@
+from hashbrown_engine import plan_chunk_bounds
+
+INF = float('inf')
+
+
+def test_sparse_keyframes_make_chunks_longer_than_asked():
+    assert plan_chunk_bounds([0.0, 100.0, 250.0], 60) == [(0.0, 100.0), (100.0, 250.0), (250.0, INF)]
+
+
+def test_short_tail_gets_an_open_ended_chunk():
+    # Keyframes every 2 s of a 130 s video: the last 10 s start a chunk that runs to the end
+    keyframes = [float(t) for t in range(0, 130, 2)]
+
+    assert plan_chunk_bounds(keyframes, 60) == [(0.0, 60.0), (60.0, 120.0), (120.0, INF)]
+
+
+def test_single_keyframe_is_one_chunk():
+    assert plan_chunk_bounds([0.0], 60) == [(0.0, INF)]
+
+
+def test_no_keyframes_is_one_chunk():
+    assert plan_chunk_bounds([], 60) == [(0.0, INF)]
@@ -0,0 +1,79 @@
+import json
+import signal
+import threading
+import time
+
+import pytest
+
+import hashbrown_cli
+import hashbrown_queue
+from hashbrown_engine import RedactionCancelled
+
+SETTINGS = {'mode': 'full', 'profile': None, 'codec': None, 'output_dir': None, 'workers': None,
+            'chunk_seconds': 60, 'legacy_audio': False}
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    source = tmp_path / 'in.mp4'
+    source.write_bytes(b'')
+    monkeypatch.setattr(hashbrown_cli, 'probe_media', lambda ffmpeg_path, path: {'duration': 10.0})
+
+    def cancel(*args, **kwargs):
+        raise RedactionCancelled("Processing was cancelled.")
+
+    monkeypatch.setattr(hashbrown_cli, 'redact_video', cancel)
+    return {'input': str(source), 'segments': [(1.0, 2.0)], 'output': None, 'mode': None, 'profile': None}
+
+
+def test_cancelled_job_is_not_reported_as_failed(job):
+    with pytest.raises(RedactionCancelled):
+        hashbrown_cli.run_job(job, 'ffmpeg', SETTINGS)
+
+
+def test_cancelled_batch_has_its_own_status(job, monkeypatch):
+    monkeypatch.setattr(hashbrown_queue, 'probe_media', lambda ffmpeg_path, path: {'duration': 10.0})
+    monkeypatch.setattr(hashbrown_queue.BatchScheduler, '_job_encoder', lambda self, job, info: 'libx264')
+
+    [result] = hashbrown_cli.run_batch([job], 'ffmpeg', SETTINGS)
+
+    assert result['cancelled'] and not result['ok']
+
+
+def test_ctrl_c_cancels_the_batch_and_exits_with_the_cancelled_status(job, monkeypatch, tmp_path):
+    monkeypatch.setattr(hashbrown_queue, 'probe_media', lambda ffmpeg_path, path: {'duration': 10.0})
+    monkeypatch.setattr(hashbrown_queue.BatchScheduler, '_job_encoder', lambda self, job, info: 'libx264')
+
+    def interrupted(*args, control=None, **kwargs):
+        # A real SIGINT to the main thread, as Ctrl-C in the terminal sends, while the encode runs
+        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+        for _ in range(100):
+            if control.cancelled:
+                break
+            time.sleep(0.05)
+        control.check()
+        return 'out.mp4'
+
+    monkeypatch.setattr(hashbrown_cli, 'redact_video', interrupted)
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps([{'input': job['input'], 'segments': [[1, 2]]},
+                                    {'input': job['input'], 'segments': [[3, 4]]}]))
+    results = tmp_path / 'results.json'
+
+    status = hashbrown_cli.main([str(manifest), '--jobs', '1', '--ffmpeg', 'ffmpeg', '--results', str(results)])
+
+    assert status == hashbrown_cli.EXIT_CANCELLED
+    assert [result['cancelled'] for result in json.loads(results.read_text())] == [True, True]
+
+
+@pytest.mark.parametrize('entry, problem', [
+    ({'input': 'a.mp4', 'segments': [['abc', '00:00:05']]}, 'invalid segments'),
+    ({'input': 'a.mp4', 'regions': [{'start': 0, 'end': 'abc', 'x': 0, 'y': 0, 'w': 10, 'h': 10}]},
+     'invalid regions'),
+])
+def test_bad_timestamp_names_the_manifest_entry(tmp_path, entry, problem):
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps([entry]))
+
+    with pytest.raises(hashbrown_cli.RedactionError, match=f"entry 1 has {problem}.*Invalid timestamp"):
+        hashbrown_cli.load_manifest(str(manifest))
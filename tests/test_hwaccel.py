@@ -0,0 +1,119 @@
+import pytest
+
+import hashbrown_capabilities
+import hashbrown_engine
+from hashbrown_capabilities import encoder_filter, encoder_input_args, gpu_overlay_filter, select_hwaccel
+from hashbrown_engine import RedactionError, overlay_filter, run_with_software_fallback
+
+
+def _capabilities(decode=(), overlay=()):
+    return {'hwaccels': {name: {'compiled': True, 'decode': name in decode, 'overlay': name in overlay,
+                                'probe_seconds': 0.0}
+                         for name in hashbrown_capabilities.HWACCELS}}
+
+
+@pytest.fixture
+def probed(monkeypatch):
+    """Replace the encoder probe with a record saying which hwaccels decode and overlay"""
+    monkeypatch.delenv(hashbrown_capabilities.HWACCEL_ENV, raising=False)
+
+    def use(decode=(), overlay=()):
+        record = _capabilities(decode, overlay)
+        monkeypatch.setattr(hashbrown_capabilities, 'get_encoder_capabilities', lambda *a, **k: record)
+    return use
+
+
+@pytest.mark.parametrize('encoder, expected', [
+    ('h264_nvenc', {'name': 'cuda', 'gpu_overlay': True}),
+    ('hevc_qsv', {'name': 'qsv', 'gpu_overlay': False}),
+    ('av1_vaapi', {'name': 'vaapi', 'gpu_overlay': True}),
+    ('libx264', None),
+    ('h264_amf', None),
+])
+def test_select_hwaccel_matches_the_encoder_family(probed, encoder, expected):
+    probed(decode=('cuda', 'qsv', 'vaapi'), overlay=('cuda', 'vaapi'))
+
+    assert select_hwaccel('ffmpeg', encoder) == expected
+
+
+def test_select_hwaccel_without_a_working_decoder(probed):
+    probed(decode=('qsv',))
+
+    assert select_hwaccel('ffmpeg', 'h264_nvenc') is None
+
+
+def test_select_hwaccel_keeps_the_overlay_on_the_cpu_when_it_must(probed, monkeypatch):
+    probed(decode=('cuda',), overlay=('cuda',))
+
+    assert select_hwaccel('ffmpeg', 'h264_nvenc', pix_fmt='yuv422p10le')['gpu_overlay'] is False
+    assert select_hwaccel('ffmpeg', 'h264_nvenc', gpu_overlay=False)['gpu_overlay'] is False
+    monkeypatch.setenv(hashbrown_capabilities.HWACCEL_ENV, 'decode')
+    assert select_hwaccel('ffmpeg', 'h264_nvenc') == {'name': 'cuda', 'gpu_overlay': False}
+    monkeypatch.setenv(hashbrown_capabilities.HWACCEL_ENV, 'off')
+    assert select_hwaccel('ffmpeg', 'h264_nvenc') is None
+
+
+@pytest.mark.parametrize('encoder, hwaccel, overlay', [
+    ('h264_nvenc', 'cuda', 'overlay_cuda'),
+    ('h264_vaapi', 'vaapi', 'overlay_vaapi'),
+])
+def test_gpu_overlay_keeps_frames_on_the_gpu(encoder, hwaccel, overlay):
+    accel = {'name': hwaccel, 'gpu_overlay': True}
+    args = encoder_input_args(encoder, accel)
+    graph = overlay_filter([(1.0, 2.0)], encoder, hwaccel=accel)
+
+    assert args[args.index('-hwaccel') + 1] == hwaccel
+    assert args[args.index('-hwaccel_output_format') + 1] == hwaccel
+    assert encoder_filter(encoder, accel) is None
+    assert graph == gpu_overlay_filter(hwaccel, '[0:v]', '[1:v]', 'between(t,1.0,2.0)') + '[outv]'
+    assert ',hwupload[icon]' in graph and f'[0:v][icon]{overlay}=' in graph
+
+
+def test_decode_only_hwaccel_overlays_on_the_cpu():
+    accel = {'name': 'vaapi', 'gpu_overlay': False}
+    args = encoder_input_args('h264_vaapi', accel)
+    graph = overlay_filter([(1.0, 2.0)], 'h264_vaapi', hwaccel=accel)
+
+    assert '-hwaccel' in args and '-hwaccel_output_format' not in args
+    assert graph == "[0:v][1:v]overlay=0:0:enable='between(t,1.0,2.0)',format=nv12,hwupload[outv]"
+
+
+def test_software_chain_has_no_gpu_filters():
+    assert encoder_input_args('libx264') == []
+    assert overlay_filter([(1.0, 2.0)], 'libx264') == "[0:v][1:v]overlay=0:0:enable='between(t,1.0,2.0)'[outv]"
+
+
+def test_failed_gpu_run_is_retried_in_software(monkeypatch):
+    runs = []
+
+    def run(cmd, control=None):
+        runs.append(cmd)
+        if '-hwaccel' in cmd:
+            raise RedactionError("FFmpeg error: No decoder surfaces left")
+        return 'done'
+
+    monkeypatch.setattr(hashbrown_engine, 'run_ffmpeg_streamed', run)
+    accel = {'name': 'cuda', 'gpu_overlay': True}
+
+    def build(hwaccel):
+        return (['ffmpeg'] + encoder_input_args('h264_nvenc', hwaccel)
+                + ['-filter_complex', overlay_filter([(1.0, 2.0)], 'h264_nvenc', hwaccel=hwaccel)])
+
+    assert run_with_software_fallback(build, accel) == 'done'
+    assert len(runs) == 2
+    assert 'overlay_cuda' in runs[0][-1]
+    assert '-hwaccel' not in runs[1] and runs[1][-1] == "[0:v][1:v]overlay=0:0:enable='between(t,1.0,2.0)'[outv]"
+
+
+def test_cancelling_a_gpu_run_does_not_retry(monkeypatch):
+    runs = []
+
+    def run(cmd, control=None):
+        runs.append(cmd)
+        raise hashbrown_engine.RedactionCancelled()
+
+    monkeypatch.setattr(hashbrown_engine, 'run_ffmpeg_streamed', run)
+
+    with pytest.raises(hashbrown_engine.RedactionCancelled):
+        run_with_software_fallback(lambda hwaccel: ['ffmpeg'], {'name': 'cuda', 'gpu_overlay': True})
+    assert len(runs) == 1
@@ -0,0 +1,21 @@
+import os
+
+from hashbrown_jobcache import CHUNK_EVICT_MIN_AGE, chunk_key, evict_chunks
+
+
+def test_chunk_key_depends_on_inputs_not_their_order():
+    assert chunk_key(source='a', start=0, end=60) == chunk_key(end=60, start=0, source='a')
+    assert chunk_key(source='a', start=0, end=60) != chunk_key(source='a', start=0, end=61)
+
+
+def test_evict_chunks_spares_kept_and_recent_chunks(monkeypatch, cached_chunk):
+    monkeypatch.setenv('HASHBROWN_CHUNK_CACHE_MB', '0')
+    old = cached_chunk('old', age=2 * CHUNK_EVICT_MIN_AGE)
+    kept = cached_chunk('kept', age=2 * CHUNK_EVICT_MIN_AGE)
+    recent = cached_chunk('recent', age=CHUNK_EVICT_MIN_AGE / 2)
+
+    evict_chunks(keep=[kept])
+
+    assert not os.path.exists(old)
+    assert os.path.exists(kept)
+    assert os.path.exists(recent)
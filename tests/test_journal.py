@@ -0,0 +1,46 @@
+import os
+
+from hashbrown_jobcache import JobJournal
+
+
+def test_journal_reuses_an_intact_chunk(cached_chunk):
+    journal = JobJournal('job')
+    path = cached_chunk('intact', b'0123456789')
+    journal.add('intact', path)
+
+    assert JobJournal('job').verified('intact') == path
+
+
+def test_journal_rejects_a_corrupted_chunk(cached_chunk):
+    journal = JobJournal('job')
+    path = cached_chunk('corrupt', b'0123456789')
+    journal.add('corrupt', path)
+    with open(path, 'wb') as f:
+        f.write(b'9876543210')
+
+    resumed = JobJournal('job')
+    assert resumed.verified('corrupt') is None
+    assert 'corrupt' not in resumed.record['chunks']
+
+
+def test_journal_rejects_a_truncated_chunk(cached_chunk):
+    journal = JobJournal('job')
+    path = cached_chunk('truncated', b'0123456789')
+    journal.add('truncated', path)
+    with open(path, 'r+b') as f:
+        f.truncate(4)
+
+    assert JobJournal('job').verified('truncated') is None
+
+
+def test_finish_removes_the_journal_and_its_chunks():
+    journal = JobJournal('job')
+    path = journal.chunk_path(0)
+    with open(path, 'wb') as f:
+        f.write(b'chunk')
+    journal.add('first', path)
+
+    journal.finish()
+
+    assert not os.path.exists(journal.path)
+    assert not os.path.exists(os.path.dirname(path))
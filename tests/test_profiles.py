@@ -0,0 +1,66 @@
+import pytest
+
+from hashbrown_profiles import MIN_BITRATE, can_match_source, output_pix_fmt, profile_args, target_maxrate
+
+
+def _info(pix_fmt='yuv420p', width=1920, height=1080, bit_rate=None, codec_name='h264'):
+    return {'video': {'codec_name': codec_name, 'pix_fmt': pix_fmt, 'width': width, 'height': height, 'fps': 30,
+                      'bit_rate': bit_rate}}
+
+
+@pytest.mark.parametrize('encoder, profile, source, expected', [
+    ('libx265', 'balanced', 'yuv420p10le', 'yuv420p10le'),
+    ('libsvtav1', 'balanced', 'yuv422p10le', 'yuv420p10le'),
+    ('libx264', 'balanced', 'yuv420p10le', 'yuv420p10le'),
+    ('libx264', 'balanced', 'yuv422p10le', 'yuv420p10le'),
+    ('libx264', 'archival', 'yuv422p10le', 'yuv422p10le'),
+    ('libx264', 'balanced', 'yuv422p', 'yuv420p'),
+    ('libx264', 'archival', 'yuv422p', 'yuv422p'),
+    ('libx265', 'archival', 'yuv422p10le', 'yuv422p10le'),
+    ('libsvtav1', 'archival', 'yuv422p', 'yuv420p'),
+    ('libx264', 'balanced', None, 'yuv420p'),
+    ('h264_nvenc', 'archival', 'yuv420p10le', None),
+])
+def test_output_pix_fmt(encoder, profile, source, expected):
+    assert output_pix_fmt(encoder, profile, source) == expected
+
+
+@pytest.mark.parametrize('info, codec, profile, expected', [
+    (_info(bit_rate=8_000_000), 'h264', 'balanced', 10_000_000),
+    (_info(bit_rate=8_000_000), 'hevc', 'balanced', 6_500_000),
+    (_info(bit_rate=8_000_000), 'h264', 'archival', 20_000_000),
+    # Low-resolution sources are clamped to MIN_BITRATE, stated bitrate or not
+    (_info(bit_rate=100_000), 'h264', 'draft', MIN_BITRATE),
+    (_info(width=320, height=240), 'h264', 'balanced', MIN_BITRATE),
+    (_info(width=None, height=None), 'h264', 'balanced', None),
+])
+def test_target_maxrate(info, codec, profile, expected):
+    assert target_maxrate(info, codec, profile) == expected
+
+
+def test_ten_bit_source_stays_ten_bit_in_software():
+    args = profile_args('libx265', 'software', 'hevc', 'balanced', _info('yuv420p10le', codec_name='hevc'))
+
+    assert args[args.index('-pix_fmt') + 1] == 'yuv420p10le'
+
+
+def test_ten_bit_h264_can_be_matched_in_smart_mode():
+    info = _info('yuv420p10le')
+    info['video'].update(profile='High 10', level=51)
+
+    assert can_match_source('libx264', info['video'])
+    args = profile_args('libx264', 'software', 'h264', 'balanced', info, match_source=True)
+    assert args[args.index('-pix_fmt') + 1] == 'yuv420p10le'
+    assert args[args.index('-profile:v') + 1] == 'high10'
+
+
+@pytest.mark.parametrize('encoder, family, codec', [
+    ('h264_nvenc', 'nvenc', 'h264'),
+    ('hevc_qsv', 'qsv', 'hevc'),
+    ('h264_amf', 'amf', 'h264'),
+    ('av1_vaapi', 'vaapi', 'av1'),
+])
+def test_hardware_families_get_no_pix_fmt(encoder, family, codec):
+    args = profile_args(encoder, family, codec, 'archival', _info('yuv422p10le', bit_rate=8_000_000))
+
+    assert '-pix_fmt' not in args
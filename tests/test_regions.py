@@ -0,0 +1,17 @@
+import pytest
+
+from hashbrown_regions import normalize_region
+
+
+@pytest.mark.parametrize('x, y, w, h, expected', [
+    (100, 50, 20, 10, (100, 50, 20, 10)),
+    (101, 51, 20, 10, (100, 50, 22, 12)),
+    (100, 50, 19, 11, (100, 50, 20, 12)),
+    (100.5, 50, 19.6, 10, (100, 50, 22, 10)),
+])
+def test_snapping_to_even_pixels_never_uncovers_the_region(x, y, w, h, expected):
+    region = normalize_region({'start': 0, 'end': 1, 'x': x, 'y': y, 'w': w, 'h': h})
+
+    assert (region['x'], region['y'], region['w'], region['h']) == expected
+    assert region['x'] <= x and region['x'] + region['w'] >= x + w
+    assert region['y'] <= y and region['y'] + region['h'] >= y + h
@@ -0,0 +1,86 @@
+import pytest
+
+from hashbrown_engine import chunk_segments, validate_segments
+from hashbrown_segments import TREE_LEAF_SIZE, enable_expr, merge_segments, segments_between, snap_segments
+
+
+def _evaluate(expr, t):
+    """Evaluate an enable expression the way ffmpeg does (between() includes both ends)"""
+    functions = {
+        'between': lambda x, start, end: float(start <= x <= end),
+        'lt': lambda a, b: float(a < b),
+        'if_': lambda condition, then, otherwise: then if condition else otherwise,
+    }
+    return eval(expr.replace('if(', 'if_('), {'__builtins__': {}}, dict(functions, t=t))
+
+
+def test_overlapping_and_touching_segments_merge():
+    assert merge_segments([(1.0, 3.0), (2.0, 4.0), (4.0, 5.0), (7.0, 8.0)]) == [(1.0, 5.0), (7.0, 8.0)]
+    assert merge_segments([(1.0, 10.0), (2.0, 3.0)]) == [(1.0, 10.0)]
+
+
+def test_unsorted_segments_come_out_sorted():
+    assert merge_segments([(7.0, 8.0), (1.0, 2.0), (4.0, 5.0), (1.5, 2.5)]) == [(1.0, 2.5), (4.0, 5.0), (7.0, 8.0)]
+
+
+def test_no_segments():
+    assert merge_segments([]) == []
+    assert _evaluate(enable_expr([]), 1.0) == 0
+
+
+def test_enable_expr_is_true_exactly_inside_the_segments():
+    # Enough segments for several levels of if(lt()) above the between() leaves
+    segments = [(10.0 * i + 1, 10.0 * i + 4) for i in range(4 * TREE_LEAF_SIZE + 1)]
+    expr = enable_expr(reversed(segments))
+    assert expr.startswith('if(')
+
+    for start, end in segments:
+        for t in (start, (start + end) / 2, end):
+            assert _evaluate(expr, t), t
+        for t in (start - 0.5, end + 0.5, end + 3):
+            assert not _evaluate(expr, t), t
+
+
+def test_segments_touching_the_range_edges_are_left_out():
+    merged = [(1.0, 2.0), (4.0, 6.0), (8.0, 9.0)]
+
+    assert segments_between(merged, 2.0, 8.0) == [(4.0, 6.0)]
+    assert segments_between(merged, 5.0, 8.5) == [(4.0, 6.0), (8.0, 9.0)]
+
+
+def test_chunk_after_a_segment_gets_no_empty_overlap():
+    assert chunk_segments([(55.0, 60.0)], 60.0, 120.0) == []
+    assert chunk_segments([(55.0, 65.0)], 60.0, 120.0) == [(0.0, 5.0)]
+
+
+def test_millisecond_times_widen_to_whole_frames():
+    # Frames 30 (t=1.0) and 60 (t=2.0) are on screen at 1.01 s and 2.02 s
+    assert snap_segments([(1.01, 2.02)], fps=30) == [(0.983333, 2.016667)]
+    # Region times are snapped to frames only
+    assert snap_segments([(0.0, 0.5)], fps=30) == [(0.0, 0.516667)]
+
+
+@pytest.mark.parametrize('sample_rate, segment, expected', [
+    (48000, (1.00001, 2.00001), (1.0, 2.000021)),
+    (44100, (0.10001, 0.2), (0.1, 0.2)),
+])
+def test_times_round_outwards_to_whole_samples(sample_rate, segment, expected):
+    assert snap_segments([segment], sample_rate=sample_rate) == [expected]
+
+
+@pytest.mark.parametrize('sample_rate', [44100, 48000])
+def test_frame_snap_is_rounded_out_to_the_sample_grid(sample_rate):
+    [(frame_start, frame_end)] = snap_segments([(1.01, 2.02)], fps=30)
+    [(start, end)] = snap_segments([(1.01, 2.02)], fps=30, sample_rate=sample_rate)
+
+    assert start <= frame_start and end >= frame_end
+    assert end - frame_end < 1 / sample_rate + 1e-6
+
+
+def test_snapped_end_may_run_past_the_duration():
+    # Validation sees the typed times; the snap then covers the whole last frame
+    segments = validate_segments([(9.5, 10.0)], duration=10.0)
+
+    [(start, end)] = snap_segments(segments, fps=30, sample_rate=48000)
+
+    assert start <= 9.5 and end > 10.0
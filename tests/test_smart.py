@@ -0,0 +1,36 @@
+from hashbrown_engine import chunk_segments, plan_smart_cuts
+from hashbrown_profiles import profile_args
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+
+def test_segment_on_keyframes_cuts_at_its_start_and_the_next_keyframe():
+    assert plan_smart_cuts(KEYFRAMES, [(2.0, 4.0)]) == [2.0, 6.0]
+
+
+def test_segment_inside_one_gop_cuts_around_that_gop():
+    assert plan_smart_cuts(KEYFRAMES, [(4.5, 5.0)]) == [4.0, 6.0]
+
+
+def test_touching_segments_leave_no_copied_gap_between_them():
+    segments = [(2.5, 3.0), (3.0, 4.5)]
+    cuts = plan_smart_cuts(KEYFRAMES, segments)
+
+    assert cuts == [2.0, 4.0, 6.0]
+    # Every chunk between the outer cuts is re-encoded
+    assert all(chunk_segments(segments, start, end) for start, end in zip(cuts, cuts[1:]))
+
+
+def test_every_gop_affected_leaves_nothing_to_copy():
+    assert plan_smart_cuts(KEYFRAMES, [(0.0, 9.0)]) == []
+
+
+def test_smart_encode_matches_the_source_parameters():
+    info = {'video': {'codec_name': 'h264', 'pix_fmt': 'yuv422p', 'profile': 'High 4:2:2', 'level': 41,
+                      'width': 1920, 'height': 1080, 'fps': 30}}
+
+    args = profile_args('libx264', 'software', 'h264', 'balanced', info, match_source=True)
+
+    assert args[args.index('-pix_fmt') + 1] == 'yuv422p'
+    assert args[args.index('-profile:v') + 1] == 'high422'
+    assert args[args.index('-level') + 1] == '4.1'
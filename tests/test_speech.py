@@ -0,0 +1,76 @@
+import io
+import json
+import types
+
+import hashbrown_speech
+from hashbrown_speech import CHUNK_SECONDS, SAMPLE_RATE, _chunks, _transcribe_chunk
+
+
+class HearsWholeWords:
+    """Stands in for Vosk's recognizer: one word per run of non-silent samples.
+
+    A run that touches either end of the audio it was fed was cut off, and
+    comes out garbled, as a real recognizer would mishear half a word.
+    """
+
+    def __init__(self, model, sample_rate):
+        self.pcm = b''
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        self.pcm += data
+        return False
+
+    def FinalResult(self):
+        samples = len(self.pcm) // 2
+        first = (len(self.pcm) - len(self.pcm.lstrip(b'\0'))) // 2
+        last = (len(self.pcm.rstrip(b'\0')) + 1) // 2
+        if first >= samples:
+            return json.dumps({'result': []})
+        word = 'secret' if first > 0 and last < samples else 'sea'
+        return json.dumps({'result': [{'word': word, 'start': first / SAMPLE_RATE,
+                                       'end': last / SAMPLE_RATE, 'conf': 1.0}]})
+
+
+def _pcm(seconds, spoken):
+    samples = bytearray(seconds * SAMPLE_RATE * 2)
+    start, end = (int(t * SAMPLE_RATE) * 2 for t in spoken)
+    samples[start:end] = b'\x10\x00' * ((end - start) // 2)
+    return bytes(samples)
+
+
+def test_word_across_a_chunk_edge_is_heard_whole_once(monkeypatch):
+    monkeypatch.setattr(hashbrown_speech, '_vosk', lambda: types.SimpleNamespace(KaldiRecognizer=HearsWholeWords))
+    spoken = (CHUNK_SECONDS - 0.5, CHUNK_SECONDS + 0.5)
+    words = []
+    for pcm, offset, keep_from, keep_until, _ in _chunks(io.BytesIO(_pcm(2 * CHUNK_SECONDS + 5, spoken))):
+        words.extend(_transcribe_chunk(pcm, offset, keep_from, keep_until))
+
+    assert words == [['secret', spoken[0], spoken[1], 1.0]]
+
+
+def test_chunks_cover_the_audio_once():
+    seconds = [chunk[4] for chunk in _chunks(io.BytesIO(bytes((2 * CHUNK_SECONDS + 5) * SAMPLE_RATE * 2)))]
+
+    assert seconds == [CHUNK_SECONDS, CHUNK_SECONDS, 5]
+
+
+def test_speech_workers_fit_in_memory(monkeypatch, tmp_path):
+    (tmp_path / 'model.bin').write_bytes(bytes(1024))
+    monkeypatch.delenv(hashbrown_speech.SPEECH_WORKERS_ENV, raising=False)
+    monkeypatch.setattr(hashbrown_speech.os, 'cpu_count', lambda: 16)
+    per_worker = 1024 * hashbrown_speech.MODEL_MEMORY_FACTOR + hashbrown_speech.WORKER_MEMORY_BYTES
+
+    monkeypatch.setattr(hashbrown_speech, '_available_memory', lambda: 100 * per_worker)
+    assert hashbrown_speech.speech_workers(str(tmp_path)) == hashbrown_speech.MAX_SPEECH_WORKERS
+    assert hashbrown_speech.speech_workers(str(tmp_path), requested=8) == 8
+
+    monkeypatch.setattr(hashbrown_speech, '_available_memory', lambda: 2.5 * per_worker)
+    assert hashbrown_speech.speech_workers(str(tmp_path), requested=8) == 2
+    monkeypatch.setattr(hashbrown_speech, '_available_memory', lambda: per_worker / 2)
+    assert hashbrown_speech.speech_workers(str(tmp_path)) == 1
+
+    monkeypatch.setenv(hashbrown_speech.SPEECH_WORKERS_ENV, '6')
+    assert hashbrown_speech.speech_workers(str(tmp_path)) == 6
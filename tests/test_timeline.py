@@ -0,0 +1,49 @@
+import array
+import io
+
+import pytest
+
+import hashbrown_timeline
+from hashbrown_probe import ProbeError
+from hashbrown_timeline import PeakPyramid, TimelineError, load_peaks, load_thumbnails
+
+INFO = {'duration': 10.0, 'audio': [{}], 'video': {'width': 64, 'height': 36}}
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    path = tmp_path / 'in.mp4'
+    path.write_bytes(b'video')
+    monkeypatch.setattr(hashbrown_timeline, 'probe_media', lambda ffmpeg_path, video_path: INFO)
+    return str(path)
+
+
+def test_truncated_peak_cache_is_rebuilt(video, monkeypatch):
+    pyramid = PeakPyramid([(array.array('h', [-1, -2]), array.array('h', [1, 2]))], 0.01, 10.0)
+    builds = []
+    monkeypatch.setattr(hashbrown_timeline, '_build_peaks', lambda *args: builds.append(args) or pyramid)
+    load_peaks('ffmpeg', video)
+    with open(hashbrown_timeline._cache_base(video) + '.peaks', 'r+b') as f:
+        f.truncate(2)
+
+    rebuilt = load_peaks('ffmpeg', video)
+
+    assert len(builds) == 2
+    assert list(rebuilt.levels[0][1]) == [1, 2]
+
+
+def test_failed_keyframe_fallback_is_a_timeline_error(video, monkeypatch):
+    frame = b'\0' * (INFO['video']['width'] * INFO['video']['height'] * 3)
+
+    def run_pipe(cmd, control, stage, total_seconds, consume):
+        consume(io.BytesIO(frame), lambda media_seconds: None)
+        return []  # showinfo's lines got lost
+
+    def probe_keyframes(ffmpeg_path, video_path):
+        raise ProbeError("ffprobe failed")
+
+    monkeypatch.setattr(hashbrown_timeline, '_run_pipe', run_pipe)
+    monkeypatch.setattr(hashbrown_timeline, 'probe_keyframes', probe_keyframes)
+
+    with pytest.raises(TimelineError, match="ffprobe failed"):
+        load_thumbnails('ffmpeg', video)
@@ -0,0 +1,67 @@
+import concurrent.futures
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import hashbrown_trace
+from hashbrown_trace import in_current_trace, job_trace, span, wait_process
+
+
+@pytest.fixture(autouse=True)
+def tracing(monkeypatch, tmp_path):
+    monkeypatch.setattr(hashbrown_trace, 'TRACE_FILE', str(tmp_path / 'trace.jsonl'))
+    monkeypatch.setattr(hashbrown_trace, 'TRACE_ENABLED', True)
+
+
+def _burn(seconds):
+    started = time.thread_time()
+    while time.thread_time() - started < seconds:
+        pass
+
+
+def test_concurrent_jobs_are_not_charged_for_each_other():
+    records = {}
+
+    def job(name, seconds):
+        with job_trace(name) as trace, span('work'):
+            _burn(seconds)
+        records[name] = trace.record
+
+    threads = [threading.Thread(target=job, args=('busy', 0.6)), threading.Thread(target=job, args=('idle', 0.0))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert records['busy']['spans'][0]['cpu_seconds'] >= 0.5
+    assert records['idle']['cpu_seconds'] < 0.2
+
+
+def test_worker_thread_spans_and_cpu_join_the_job():
+    def encode():
+        with span('encode chunk'):
+            _burn(0.3)
+
+    with job_trace('chunked') as trace:
+        with span('encoding'):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+                for future in [pool.submit(in_current_trace(encode)) for _ in range(2)]:
+                    future.result()
+
+    spans = {record['name']: record for record in trace.record['spans']}
+    assert [record['name'] for record in trace.record['spans']].count('encode chunk') == 2
+    assert spans['encoding']['cpu_seconds'] >= 0.5
+    assert trace.record['cpu_seconds'] >= 0.5
+
+
+def test_waited_process_cpu_is_charged_to_the_job():
+    burn = "import time\nt = time.process_time()\nwhile time.process_time() - t < 0.4: pass"
+    with job_trace('ffmpeg') as trace, span('encode'):
+        process = subprocess.Popen([sys.executable, '-c', burn])
+        assert wait_process(process) == 0
+
+    assert process.returncode == 0
+    assert trace.record['spans'][0]['cpu_seconds'] >= 0.3